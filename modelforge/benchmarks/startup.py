@@ -0,0 +1,66 @@
+import json
+import subprocess
+import sys
+import time
+
+import click
+
+# Modules that must not be imported just to start the CLI
+FORBIDDEN_MODULES = ['dask', 'distributed', 'pandas', 'numpy', 'git', 'pyarrow', 'modelforge.core.runner']
+DEFAULT_BUDGET_MS = 150
+
+
+def import_times(module='modelforge.cli'):
+    # Import module in a fresh interpreter with -X importtime, returns {module: cumulative microseconds}
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, check=True)
+    times = dict()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative_us)
+    return times
+
+
+def startup_wall_time(module='modelforge.cli', repeat=5):
+    # Best of repeat wall times of starting an interpreter and importing module, in seconds
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, '-c', f'import {module}'], check=True)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def check_startup(module='modelforge.cli', budget_ms=DEFAULT_BUDGET_MS, repeat=5):
+    times = import_times(module)
+    forbidden = [name for name in times if name.split('.')[0] in FORBIDDEN_MODULES or name in FORBIDDEN_MODULES]
+    import_ms = times.get(module, 0) / 1000
+    report = {
+        'module': module,
+        'import_ms': import_ms,
+        'budget_ms': budget_ms,
+        'wall_ms': startup_wall_time(module, repeat) * 1000,
+        'forbidden_imports': forbidden,
+        'slowest_imports': sorted(times.items(), key=lambda item: -item[1])[:10],
+    }
+    report['ok'] = import_ms <= budget_ms and not forbidden
+    return report
+
+
+@click.command()
+@click.option('--module', '-m', default='modelforge.cli', show_default=True, help='Module whose import time is checked')
+@click.option('--budget-ms', '-b', default=DEFAULT_BUDGET_MS, show_default=True, help='Maximum cumulative import time in milliseconds')
+@click.option('--repeat', '-r', default=5, show_default=True, help='Number of interpreter starts to time')
+def main(module, budget_ms, repeat):
+    # Exits non-zero when the import budget is exceeded or a heavy dependency is imported at startup
+    report = check_startup(module, budget_ms, repeat)
+    print(json.dumps(report, indent=2))
+    if not report['ok']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
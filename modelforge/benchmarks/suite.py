@@ -0,0 +1,316 @@
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from datetime import datetime
+
+import pandas as pd
+
+from modelforge.core.components import MFDatasource, MFModel
+from modelforge.core.runner import MFRunner
+from modelforge.core.sinks import HDFSink, ParquetSink, read_predictions
+from modelforge.utils.database import close_connections
+from modelforge.utils.registry import add_run, add_run_intervals, add_to_db, get_run_status, object_from_registry, read_from_db, update_run_intervals
+from modelforge.utils.store import clear_class_cache
+
+# Benchmarks of the runner, registry and prediction paths on synthetic components, see
+# modelforge.benchmarks.synthetic. Everything runs offline in a scratch directory holding a
+# sqlite registry, a bare git repo standing in for the remote and a clone of it.
+
+SIZES = {
+    'small': {'n_windows': 20, 'train_period': 60, 'eval_period': 5, 'rows_per_day': 50, 'n_features': 10,
+              'registry_rows': 1000, 'prediction_rows': 100000, 'repeat': 5},
+    'medium': {'n_windows': 100, 'train_period': 250, 'eval_period': 5, 'rows_per_day': 200, 'n_features': 20,
+               'registry_rows': 10000, 'prediction_rows': 1000000, 'repeat': 3},
+    'large': {'n_windows': 500, 'train_period': 500, 'eval_period': 5, 'rows_per_day': 1000, 'n_features': 50,
+              'registry_rows': 100000, 'prediction_rows': 10000000, 'repeat': 1},
+}
+BENCHMARKS = ['planning', 'resolution', 'windows', 'registry', 'predictions']
+BENCH_REPO = 'mfbench'
+START_DATE = '2020-01-01'
+
+
+def run_suite(size='small', benchmarks=None, workdir=None, **overrides):
+    # Run the benchmarks (all by default) at one of SIZES, overrides replace single size params.
+    # Returns the JSON-serializable results, every timing is in seconds.
+    if size not in SIZES:
+        raise ValueError(f'Benchmark size "{size}" is not supported, choose one of {list(SIZES)}')
+    benchmarks = benchmarks or BENCHMARKS
+    for name in benchmarks:
+        if name not in BENCHMARKS:
+            raise ValueError(f'Unknown benchmark "{name}", choose from {BENCHMARKS}')
+    params = dict(SIZES[size], **overrides)
+
+    root = tempfile.mkdtemp(prefix='modelforge-bench-', dir=workdir)
+    try:
+        workspace = make_workspace(root)
+        results = dict()
+        for name in benchmarks:
+            print(f'Running benchmark "{name}" ({size})')
+            results[name] = BENCHMARK_FUNCTIONS[name](workspace, params)
+    finally:
+        close_connections()
+        clear_class_cache()
+        shutil.rmtree(root, ignore_errors=True)
+
+    return {
+        'modelforge_version': _version(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'size': size,
+        'params': params,
+        'results': results,
+    }
+
+
+def make_workspace(root):
+    # A local "remote" (bare repo) and a clone tracking it that holds the synthetic components,
+    # both registered in a fresh registry the same way users register their own code
+    import git
+
+    origin_dir = os.path.join(root, BENCH_REPO)
+    clone_dir = os.path.join(root, 'clone')
+    git.Repo.init(origin_dir, bare=True)
+    repo = git.Repo.clone_from(origin_dir, clone_dir)
+
+    # The registered file is resolved as the module <repo name>.synthetic
+    open(os.path.join(clone_dir, '__init__.py'), 'w').close()
+    shutil.copy(os.path.join(os.path.dirname(__file__), 'synthetic.py'), os.path.join(clone_dir, 'synthetic.py'))
+    repo.index.add(['__init__.py', 'synthetic.py'])
+    author = git.Actor('modelforge-bench', 'bench@modelforge.local')
+    repo.index.commit('Add synthetic components', author=author, committer=author)
+    repo.git.push('--set-upstream', 'origin', repo.active_branch.name)
+
+    database_path = os.path.join(root, 'databases')
+    os.makedirs(database_path)
+    module_file = os.path.join(clone_dir, 'synthetic.py')
+    add_to_db(module_file, 'SyntheticModel', 'models', 'bench_model', MFModel, database_path)
+    add_to_db(module_file, 'SyntheticDatasource', 'datasources', 'bench_datasource', MFDatasource, database_path)
+    return {
+        'root': root,
+        'database_path': database_path,
+        'store_path': os.path.join(root, 'store'),
+        'output_dir': os.path.join(root, 'output'),
+    }
+
+
+def rolling_config(workspace, params, name):
+    # Run config of params['n_windows'] daily windows over the synthetic data
+    recalibration_freq = params['eval_period']
+    end_date = pd.Timestamp(START_DATE) + pd.Timedelta(days=params['train_period'] + params['n_windows'] * recalibration_freq)
+    return {
+        'train_mode': 'rolling_window',
+        'model': 'bench_model',
+        'datasource': 'bench_datasource',
+        'model_params': {},
+        'datasource_params': {'n_features': params['n_features'], 'rows_per_day': params['rows_per_day']},
+        'start_date': START_DATE,
+        'end_date': str(end_date.date()),
+        'train_period': params['train_period'],
+        'gap_period': 0,
+        'eval_period': params['eval_period'],
+        'recalibration_freq': recalibration_freq,
+        'output_dir': os.path.join(workspace['output_dir'], name),
+        'database_path': workspace['database_path'],
+        'store_path': workspace['store_path'],
+        'scheduler': {'backend': 'local'},
+    }
+
+
+def bench_planning(workspace, params):
+    # Constructing the runner plans every window
+    config = rolling_config(workspace, params, 'planning')
+    runner = MFRunner(config)
+    elapsed = _best(lambda: MFRunner(config), params['repeat'])
+    return {'windows': len(runner.intervals), 'runner_init': elapsed, 'per_window': elapsed / max(len(runner.intervals), 1)}
+
+
+def bench_resolution(workspace, params):
+    # Cold: mirror the repo and extract the commit into an empty store. Warm: memoized class lookups.
+    db_path = workspace['database_path']
+    store_path = os.path.join(workspace['root'], 'resolution-store')
+
+    clear_class_cache()
+    t0 = time.perf_counter()
+    object_from_registry('bench_model', 'models', db_path, store_path=store_path)
+    cold = time.perf_counter() - t0
+
+    clear_class_cache()
+    t0 = time.perf_counter()
+    object_from_registry('bench_model', 'models', db_path, store_path=store_path)
+    extracted = time.perf_counter() - t0
+
+    n = 1000
+    t0 = time.perf_counter()
+    for _ in range(n):
+        object_from_registry('bench_model', 'models', db_path, store_path=store_path)
+    warm = (time.perf_counter() - t0) / n
+    return {'cold': cold, 'extracted': extracted, 'warm': warm}
+
+
+def bench_windows(workspace, params):
+    # A full local run. Window time not spent in the model's fit and predict is runner
+    # overhead: creating the datasource, writing predictions, saving and the manifest.
+    config = rolling_config(workspace, params, 'windows')
+    config['run_id'] = 'bench-windows'
+    add_run(config['run_id'], {'user_config': config}, workspace['database_path'])
+
+    t0 = time.perf_counter()
+    runner = MFRunner(config)
+    runner.train()
+    total = time.perf_counter() - t0
+
+    walls, fits, predicts = [], [], []
+    for interval in runner.intervals.values():
+        walls.append(interval['wall_time'])
+        fits.append(interval['model'].fit_time)
+        predicts.append(interval['model'].predict_time)
+    n = len(walls)
+    overhead = [w - f - p for w, f, p in zip(walls, fits, predicts)]
+    return {
+        'windows': n,
+        'total': total,
+        'windows_per_second': n / total,
+        'window_mean': sum(walls) / n,
+        'fit_mean': sum(fits) / n,
+        'predict_mean': sum(predicts) / n,
+        'overhead_mean': sum(overhead) / n,
+        'overhead_max': max(overhead),
+    }
+
+
+def bench_registry(workspace, params):
+    # Write and read throughput of run bookkeeping with registry_rows rows
+    db_path = workspace['database_path']
+    n = params['registry_rows']
+    config = rolling_config(workspace, params, 'registry')
+    run_config = {'user_config': config, 'model': 'bench_model', 'datasource': 'bench_datasource'}
+    results = dict()
+
+    n_runs = max(n // 10, 1)
+    t0 = time.perf_counter()
+    for i in range(n_runs):
+        add_run(f'bench-registry-{i}', run_config, db_path)
+    results['add_run_per_second'] = n_runs / (time.perf_counter() - t0)
+
+    fit = (pd.Timestamp(START_DATE), pd.Timestamp(START_DATE) + pd.Timedelta(days=params['train_period']))
+    intervals = {k: {'fit': fit, 'eval': fit} for k in range(n)}
+    t0 = time.perf_counter()
+    add_run_intervals('bench-registry-0', intervals, db_path)
+    results['add_intervals_rows_per_second'] = n / (time.perf_counter() - t0)
+
+    # One update per finished window, as the runner does
+    t0 = time.perf_counter()
+    for k in range(n):
+        update_run_intervals('bench-registry-0', [k], db_path, status='completed', duration=1.0, worker='bench')
+    results['update_interval_per_second'] = n / (time.perf_counter() - t0)
+
+    results['get_run_status'] = _best(lambda: get_run_status('bench-registry-0', db_path), params['repeat'])
+
+    t0 = time.perf_counter()
+    for _ in range(n):
+        read_from_db('models', 'bench_model', db_path)
+    results['read_from_db_per_second'] = n / (time.perf_counter() - t0)
+    return results
+
+
+def bench_predictions(workspace, params):
+    # Write prediction_rows rows split over n_windows windows with each sink, then read them back.
+    # Sinks whose optional dependency is missing are reported as skipped.
+    import numpy as np
+
+    n_windows = params['n_windows']
+    rows = max(params['prediction_rows'] // n_windows, 1)
+    frames = []
+    for k in range(n_windows):
+        index = pd.date_range(START_DATE, periods=rows, freq='min') + pd.Timedelta(days=k)
+        frames.append(pd.DataFrame({'prediction': np.random.default_rng(k).normal(size=rows)}, index=index))
+
+    results = dict()
+    for sink_name in ['hdf', 'parquet']:
+        output_dir = os.path.join(workspace['output_dir'], f'predictions-{sink_name}')
+        try:
+            if sink_name == 'hdf':
+                sink = HDFSink(output_dir)
+                for k in range(n_windows):
+                    os.makedirs(os.path.join(output_dir, f'eval_{k}'), exist_ok=True)
+            else:
+                sink = ParquetSink(output_dir, 'bench')
+
+            t0 = time.perf_counter()
+            for k, frame in enumerate(frames):
+                sink.write(k, frame, metadata={'fit': None, 'eval': None})
+            write = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            if sink_name == 'hdf':
+                read_rows = sum(len(pd.read_hdf(os.path.join(output_dir, f'eval_{k}', 'pred.h5'))) for k in range(n_windows))
+            else:
+                read_rows = len(read_predictions(output_dir, run_id='bench'))
+            read = time.perf_counter() - t0
+        except ImportError as e:
+            results[sink_name] = {'skipped': str(e)}
+            continue
+        results[sink_name] = {'rows': read_rows, 'write': write, 'read': read,
+                              'write_rows_per_second': read_rows / write, 'read_rows_per_second': read_rows / read}
+    return results
+
+
+BENCHMARK_FUNCTIONS = {
+    'planning': bench_planning,
+    'resolution': bench_resolution,
+    'windows': bench_windows,
+    'registry': bench_registry,
+    'predictions': bench_predictions,
+}
+
+
+def compare_results(baseline, current):
+    # Rows of (metric, baseline, current, current / baseline) for every number both results share.
+    # Metrics ending in per_second are throughputs, everything else is a time.
+    base_values, current_values = _flatten(baseline['results']), _flatten(current['results'])
+    rows = []
+    for metric, base_value in base_values.items():
+        value = current_values.get(metric)
+        if value is None or not base_value:
+            continue
+        rows.append((metric, base_value, value, value / base_value))
+    return rows
+
+
+def _flatten(results, prefix=''):
+    values = dict()
+    for key, value in results.items():
+        if isinstance(value, dict):
+            values.update(_flatten(value, f'{prefix}{key}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[f'{prefix}{key}'] = value
+    return values
+
+
+def _best(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _version():
+    try:
+        from importlib.metadata import version
+        return version('modelforge')
+    except Exception:
+        return 'unknown'
+
+
+def write_results(results, output):
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2, default=str)
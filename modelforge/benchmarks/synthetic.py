@@ -0,0 +1,80 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from modelforge.core.components import MFDatasource, MFModel
+
+# Synthetic components used by the benchmark suite. The data of a date is a pure function of
+# the date and the params, so every window and every process sees the same rows.
+
+
+class SyntheticDatasource(MFDatasource):
+    # params: n_features (default 10), rows_per_day (default 100), noise (default 0.1), seed (default 0)
+    def __init__(self, params):
+        self.params = params
+        self.n_features = params.get('n_features', 10)
+        self.rows_per_day = params.get('rows_per_day', 100)
+        self.noise = params.get('noise', 0.1)
+        self.seed = params.get('seed', 0)
+        self.interval = None
+
+    def get_data(self, training=False):
+        start, end = self.interval
+        days = pd.date_range(pd.Timestamp(start).normalize(), pd.Timestamp(end), freq='D')
+        frames = [self._day(day) for day in days]
+        if not frames:
+            return pd.DataFrame(columns=self.features + [self.label_column])
+        data = pd.concat(frames)
+        return data[(data.index >= pd.Timestamp(start)) & (data.index <= pd.Timestamp(end))]
+
+    @property
+    def features(self):
+        return [f'x{i}' for i in range(self.n_features)]
+
+    @property
+    def label_column(self):
+        return 'y'
+
+    @property
+    def label(self):
+        return self.get_data()[self.label_column]
+
+    def _day(self, day):
+        rng = np.random.default_rng([self.seed, day.toordinal()])
+        coef = np.random.default_rng(self.seed).normal(size=self.n_features)
+        x = rng.normal(size=(self.rows_per_day, self.n_features))
+        y = x @ coef + self.noise * rng.normal(size=self.rows_per_day)
+        index = day + pd.to_timedelta(np.arange(self.rows_per_day) * (86400 // self.rows_per_day), unit='s')
+        data = pd.DataFrame(x, index=index, columns=self.features)
+        data[self.label_column] = y
+        return data
+
+
+class SyntheticModel(MFModel):
+    # Ordinary least squares. fit_time and predict_time are kept so the benchmark can separate
+    # the model's own cost from the runner's overhead.
+    def __init__(self, params):
+        self.params = params
+        self.coef = None
+        self.fit_time = 0.0
+        self.predict_time = 0.0
+
+    def train(self, datasource):
+        t0 = time.perf_counter()
+        data = datasource.get_data(training=True)
+        x = data[datasource.features].to_numpy()
+        y = data[datasource.label_column].to_numpy()
+        self.coef = np.linalg.lstsq(x, y, rcond=None)[0]
+        self.fit_time = time.perf_counter() - t0
+
+    def predict_batch(self, datasource):
+        t0 = time.perf_counter()
+        data = datasource.get_data()
+        prediction = pd.DataFrame({'prediction': data[datasource.features].to_numpy() @ self.coef}, index=data.index)
+        self.predict_time = time.perf_counter() - t0
+        return prediction
+
+    def save(self, output_directory):
+        np.save(os.path.join(output_directory, 'coef.npy'), self.coef)
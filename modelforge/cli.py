@@ -1,19 +1,60 @@
+import functools
 import json
 import os
 
 import click
 
+from datetime import datetime
 from pathlib import Path
-from dask.distributed import Client
 
-from modelforge.core.components import MFModel,MFDatasource
-from modelforge.core.runner import MFRunner
-from modelforge.utils.registry import add_run, add_to_db, read_from_db, update_db, list_db
+# Heavy dependencies (dask, pandas, GitPython, the runner) are imported inside the commands
+# that need them so that simple commands start quickly, see modelforge.benchmarks.startup
+
+###################################### CONFIG ######################################
+BASE_PATH = os.path.join(os.path.expanduser('~'), '.modelforge')
+CONFIG_PATH = os.path.join(BASE_PATH,'config.json')
+default_config = {'database_path': os.path.join(BASE_PATH,'databases'),'dask_scheduler_address':None,'output_path':os.path.join(BASE_PATH,'output')}
+
+@functools.lru_cache(maxsize=None)
+def get_config():
+    # Read the config file once per process, creating it with the defaults if needed
+    print(f'Config path: {CONFIG_PATH}')
+    if os.path.isfile(CONFIG_PATH):
+        with open(CONFIG_PATH) as f:
+            config = json.load(f)
+        for k,v in default_config.items():
+            if k not in config:
+                config[k] = v
+    else:
+        print(f'creating base path: {BASE_PATH}')
+        Path(BASE_PATH).mkdir(parents=True, exist_ok=True)
+        print(f'creating database path: {CONFIG_PATH}')
+        with open(CONFIG_PATH, 'w') as f:
+            json.dump(default_config, f)
+        print(f'creating config file: {CONFIG_PATH}')
+        print(f'default config: {default_config}')
+        config = dict(default_config)
+    Path(config['database_path']).mkdir(parents=True, exist_ok=True)
+    return config
+
+def database_path():
+    return get_config()['database_path']
+
+def load_manifest(path):
+    # Registration manifest: a JSON list of {"name", "file", "class_name"}, files relative to the manifest
+    with open(path) as f:
+        entries = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    for entry in entries:
+        missing = [key for key in ['name', 'file', 'class_name'] if key not in entry]
+        if missing:
+            raise click.UsageError(f'Manifest entry {entry} is missing {missing}')
+        entry['file'] = os.path.join(base, entry['file'])
+    return entries
 
 @click.group()
 def modelforge():
     print(f'Welcome to modelforge! We read from {CONFIG_PATH}')
-    pass
 
 ###################################### DATABASE ######################################
 @modelforge.group()
@@ -25,8 +66,7 @@ def database():
 def set(path):
     print(path)
     Path(path).mkdir(parents=True, exist_ok=True)
-    with open(CONFIG_PATH) as f:
-        config = json.load(f)
+    config = dict(get_config())
     config['database_path'] = path
     with open(CONFIG_PATH, 'w') as f:
         json.dump(config, f)
@@ -34,7 +74,7 @@ def set(path):
 
 @database.command()
 def get():
-    print(f'Registry path: {DATABASE_PATH}')
+    print(f'Registry path: {database_path()}')
 
 
 ###################################### MODEL ######################################
@@ -47,14 +87,27 @@ def model():
 @click.option('--file', '-f', required=True, type=click.Path(exists=True), help='Path to Python module containing model class')
 @click.option('--class-name', '-c', required=True, help='Name of the model class in the Python module')
 def add(file, class_name, name):
-    add_to_db(file, class_name, 'models', name, MFModel, DATABASE_PATH)
+    from modelforge.core.components import MFModel
+    from modelforge.utils.registry import add_to_db
+    add_to_db(file, class_name, 'models', name, MFModel, database_path())
 
 @model.command()
 @click.option('--name', '-n', required=True, help='Universal name of the model')
 @click.option('--file', '-f', required=True, type=click.Path(exists=True), help='Path to Python module containing model class')
 @click.option('--class-name', '-c', required=True, help='Name of the model class in the Python module')
 def update(name, file, class_name):
-    update_db(file, class_name, 'models', name, MFModel, DATABASE_PATH)
+    from modelforge.core.components import MFModel
+    from modelforge.utils.registry import update_db
+    update_db(file, class_name, 'models', name, MFModel, database_path())
+
+@model.command(name='add-many')
+@click.option('--manifest', '-m', required=True, type=click.Path(exists=True), help='JSON list of {"name", "file", "class_name"}, files relative to the manifest')
+@click.option('--update', '-u', is_flag=True, default=False, help='Update existing models instead of adding new ones')
+@click.option('--workers', '-w', default=8, show_default=True, help='Number of threads verifying entries')
+def add_many(manifest, update, workers):
+    from modelforge.core.components import MFModel
+    from modelforge.utils.registry import register_many
+    register_many(load_manifest(manifest), 'models', MFModel, database_path(), update=update, max_workers=workers)
 
 ###################################### DATASOURCE ######################################
 @modelforge.group()
@@ -66,69 +119,202 @@ def datasource():
 @click.option('--class-name', '-c', required=True, help='Name of the datasource class in the Python module')
 @click.option('--name', '-n', required=True, help='Universal name of the datasource')
 def add(file, class_name, name):
-    add_to_db(file, class_name, 'datasources', name, MFDatasource, DATABASE_PATH)
+    from modelforge.core.components import MFDatasource
+    from modelforge.utils.registry import add_to_db
+    add_to_db(file, class_name, 'datasources', name, MFDatasource, database_path())
 
 @datasource.command()
 @click.option('--name', '-n', required=True, help='Universal name of the datasource')
 @click.option('--file', '-f', required=True, type=click.Path(exists=True), help='Path to Python module containing datasource class')
 @click.option('--class-name', '-c', required=True, help='Name of the datasource class in the Python module')
 def update(name, file, class_name):
-    update_db(file, class_name, 'datasources', name, MFDatasource, DATABASE_PATH)
+    from modelforge.core.components import MFDatasource
+    from modelforge.utils.registry import update_db
+    update_db(file, class_name, 'datasources', name, MFDatasource, database_path())
+
+@datasource.command(name='add-many')
+@click.option('--manifest', '-m', required=True, type=click.Path(exists=True), help='JSON list of {"name", "file", "class_name"}, files relative to the manifest')
+@click.option('--update', '-u', is_flag=True, default=False, help='Update existing datasources instead of adding new ones')
+@click.option('--workers', '-w', default=8, show_default=True, help='Number of threads verifying entries')
+def add_many(manifest, update, workers):
+    from modelforge.core.components import MFDatasource
+    from modelforge.utils.registry import register_many
+    register_many(load_manifest(manifest), 'datasources', MFDatasource, database_path(), update=update, max_workers=workers)
 
 @datasource.command()
 def list():
-    list_db('datasources', DATABASE_PATH)
+    from modelforge.utils.registry import list_db
+    list_db('datasources', database_path())
 
 ###################################### RUNS ######################################
-@modelforge.group()
-def run():
+@modelforge.group(name='run')
+def run_group():
     pass
 
-@run.command()
-@click.option('--run_name', '-m', required=True, help='Name of the to run')
-@click.option('--model', '-m', required=True, help='Name of the registered model to run')
-@click.option('--datasource', '-p', required=True, help='Name of the registered datasource to use as input')
+@run_group.command()
+@click.option('--run_name', '-m', help='Name of the to run')
+@click.option('--model', '-m', help='Name of the registered model to run')
+@click.option('--datasource', '-p', help='Name of the registered datasource to use as input')
+@click.option('--run_config', '-c', type=click.Path(exists=True), help='Path to run configuration file')
+@click.option('--resume', '-r', default=None, help='Resume an existing run, only windows without complete outputs are rerun')
+@click.option('--wait', '-w', is_flag=True, default=False, help='Run in this process and wait for it to finish instead of submitting it')
+@click.option('--predict-from', default=None, help='Score every window with the models stored by this run instead of training')
+@click.option('--dry-run', is_flag=True, default=False, help='Validate the config, resolve the registry entries and plan the windows without running anything')
+def run(run_name,model, datasource, run_config, resume, wait, predict_from, dry_run):
+    from modelforge.core.config import ConfigError, validate_config
+    from modelforge.core.session import execute_run, submit_run
+    from modelforge.utils.registry import add_run, get_run_config, read_components
+
+    config = get_config()
+    db_path = config['database_path']
+    if resume is not None:
+        # Everything is taken from the registered run
+        run_config_data = get_run_config(resume, db_path)
+        runner_config = dict(run_config_data['user_config'], run_id=resume, model=run_config_data['model'],
+                             datasource=run_config_data['datasource'], database_path=db_path, resume=True)
+    else:
+        for option, value in [('--run_name', run_name), ('--model', model), ('--datasource', datasource), ('--run_config', run_config)]:
+            if value is None:
+                raise click.UsageError(f'Missing option "{option}", required unless --resume is given.')
+
+        run_config_data = dict()
+        # Load the configuration file
+        with open(run_config, 'r') as f:
+            run_config_data['user_config'] = json.load(f)
+        if predict_from is not None:
+            # Windows are matched to the stored models by k unless the config says otherwise
+            run_config_data['user_config'].setdefault('predict_only', dict())['source_run'] = predict_from
+
+        run_config_data['database_path'] = db_path
+        run_config_data['model'] = model
+        run_config_data['datasource'] = datasource
+
+        # The runner reads the registry entries and records its progress under the run name
+        runner_config = dict(run_config_data['user_config'], run_id=run_name, model=model, datasource=datasource, database_path=db_path)
+    # Windows run on the configured cluster, whether the run waits or is submitted
+    if config['dask_scheduler_address'] is not None:
+        runner_config['dask_scheduler_address'] = config['dask_scheduler_address']
+
+    if dry_run:
+        print_dry_run(runner_config)
+        return
+
+    # Every problem of the config is reported before the registry is touched or anything is submitted
+    try:
+        validate_config(runner_config)
+    except ConfigError as e:
+        raise click.ClickException(str(e))
+    if resume is None:
+        components = read_components(model, datasource, db_path)
+        run_config_data['model_url'], run_config_data['model_class_name'] = components['models']
+        run_config_data['datasource_url'], run_config_data['datasource_class_name'] = components['datasources']
+        add_run(run_name, run_config_data, db_path)
+
+    if wait:
+        execute_run(runner_config)
+        return
+    # Returns as soon as the run is handed to the cluster or a background process
+    job = submit_run(runner_config)
+    print(f'Run "{runner_config["run_id"]}" submitted as {job}, follow it with: modelforge run status -r {runner_config["run_id"]}')
+
+def print_dry_run(runner_config):
+    from modelforge.core.config import ConfigError
+    from modelforge.core.runner import MFRunner
+    try:
+        report = MFRunner(runner_config).dry_run()
+    except ConfigError as e:
+        raise click.ClickException(str(e))
+    print(report['plan'].to_string())
+    for table, (url, class_name) in report['components'].items():
+        print(f'{table[:-1]}: {class_name} from {url}')
+    print(f"windows: {report['windows']}, fits: {report['fits']}, tasks: {report['tasks']} on the {report['backend']} backend")
+    if 'chains' in report:
+        print(f"warm start: {report['chains']} tasks if the model supports warm starts, {report['tasks']} is the upper bound")
+    print(f"sessions read: {report['fit_sessions']} for fitting, {report['eval_sessions']} for evaluation, {report['span_sessions']} spanned by the plan")
+    print('Config is valid, nothing was run.')
+
+@run_group.command()
 @click.option('--run_config', '-c', type=click.Path(exists=True), required=True, help='Path to run configuration file')
-def run(run_name,model, datasource, run_config):
-    run_config_data = dict()
-    # Load the configuration file
+@click.option('--output', '-o', type=click.Path(), default=None, help='Write the plan to this csv file')
+def plan(run_config, output):
+    # Show the windows a run config expands to without running anything
+    from modelforge.core.planning import plan_from_config
     with open(run_config, 'r') as f:
-        run_config_data['user_config'] = json.load(f)
+        window_plan = plan_from_config(json.load(f))
+    if output is not None:
+        window_plan.to_csv(output)
+    print(window_plan.to_string())
+    print(f'{len(window_plan)} windows')
 
-    run_config_data['database_path'] = DATABASE_PATH
-    run_config_data['model'] = model
-    run_config_data['datasource'] = datasource
+@run_group.command()
+@click.option('--run-id', '-r', required=True, help='Name of the run')
+@click.option('--slowest', '-s', default=5, show_default=True, help='Number of slowest windows to show')
+def status(run_id, slowest):
+    from modelforge.utils.registry import TIME_FORMAT, get_run_status
+    run_status = get_run_status(run_id, database_path())
+    windows = run_status.pop('intervals')
+    print(json.dumps(run_status))
 
-    run_config_data['datasource_url'],run_config_data['datasource_class_name'] = read_from_db(datasource, 'datasources', DATABASE_PATH)
-    run_config_data['model_url'],run_config_data['model_class_name'] = read_from_db(model, 'models', DATABASE_PATH)
+    counts = dict()
+    for window in windows:
+        counts[window['status']] = counts.get(window['status'], 0) + 1
+    print(f'windows: {len(windows)} ' + ' '.join(f'{k}={v}' for k, v in sorted(counts.items())))
 
-    # Run the model on the datasource using the MFRunner class
-    runner = MFRunner(run_config_data['user_config'])
-    add_run(run_name, run_config_data, DATABASE_PATH)
+    durations = [w['duration'] for w in windows if w['duration'] is not None]
+    if durations:
+        print(f'window time: mean {sum(durations) / len(durations):.2f}s, total {sum(durations):.2f}s')
+        # TIME_FORMAT is day first, so times are only ordered once parsed
+        finished = sorted(datetime.strptime(w['end_time'], TIME_FORMAT) for w in windows if w['end_time'] is not None)
+        elapsed = (finished[-1] - datetime.strptime(run_status['start_time'], TIME_FORMAT)).total_seconds()
+        if elapsed > 0:
+            print(f'throughput: {len(finished) / elapsed * 3600:.1f} windows/hour')
+        for window in sorted((w for w in windows if w['duration'] is not None), key=lambda w: -w['duration'])[:slowest]:
+            print(f"slow window {window['k']}: {window['duration']:.2f}s on {window['worker']} (fit {window['fit_start']} - {window['fit_end']})")
+            if window['timings']:
+                # Wall and cpu seconds per phase of instrumented runs
+                print('    ' + ', '.join(f"{name} {span['wall']:.2f}s (cpu {span['cpu']:.2f}s)" for name, span in window['timings'].items()))
+            if window['peak_memory'] is not None:
+                print(f"    peak memory {window['peak_memory'] / 2**20:.0f} MiB")
+    for window in windows:
+        if window['status'] == 'failed':
+            print(f"failed window {window['k']} on {window['worker']}:\n{window['error']}")
 
-    client = Client(config['dask_scheduler_address'])
-    client.submit(runner.train) # does not block
+@run_group.command(name='list')
+@click.option('--status', '-s', default=None, help='Only list runs with this status')
+def list_runs_command(status):
+    from modelforge.utils.registry import list_runs
+    for run_summary in list_runs(database_path(), status=status):
+        print(run_summary)
 
-###################################### CONFIG ######################################
-BASE_PATH = os.path.join(os.path.expanduser('~'), '.modelforge')
-CONFIG_PATH = os.path.join(BASE_PATH,'config.json')
-DATABASE_PATH = os.path.join(BASE_PATH,'databases')
-default_config = {'database_path': DATABASE_PATH,'dask_scheduler_address':None,'output_path':os.path.join(BASE_PATH,'output')}
-print(f'Config path: {CONFIG_PATH}')
-if os.path.isfile(CONFIG_PATH):
-    with open(CONFIG_PATH) as f:
-        config = json.load(f)
-    DATABASE_PATH = config['database_path']
-    for k,v in default_config.items():
-        if k not in config:
-            config[k] = v
-else:
-    print(f'creating base path: {BASE_PATH}')
-    Path(BASE_PATH).mkdir(parents=True, exist_ok=True)
-    print(f'creating database path: {CONFIG_PATH}')
-    with open(CONFIG_PATH, 'w') as f:
-        json.dump(default_config, f)
-    print(f'creating config file: {CONFIG_PATH}')
-    print(f'default config: {default_config}')
-Path(DATABASE_PATH).mkdir(parents=True, exist_ok=True)
-modelforge()
\ No newline at end of file
+###################################### BENCHMARKS ######################################
+@modelforge.group()
+def bench():
+    pass
+
+@bench.command(name='run')
+@click.option('--size', '-s', type=click.Choice(['small', 'medium', 'large']), default='small', show_default=True, help='Size of the synthetic workload')
+@click.option('--benchmark', '-b', multiple=True, help='Only run these benchmarks, can be repeated')
+@click.option('--output', '-o', type=click.Path(), default=None, help='Write the results to this json file')
+def bench_run(size, benchmark, output):
+    # Runs offline in a scratch directory, the configured registry is not touched
+    from modelforge.benchmarks.suite import run_suite, write_results
+    results = run_suite(size, benchmarks=list(benchmark) or None)
+    if output is not None:
+        write_results(results, output)
+    print(json.dumps(results, indent=2, default=str))
+
+@bench.command()
+@click.argument('baseline', type=click.Path(exists=True))
+@click.argument('current', type=click.Path(exists=True))
+def compare(baseline, current):
+    from modelforge.benchmarks.suite import compare_results
+    with open(baseline) as f:
+        baseline_results = json.load(f)
+    with open(current) as f:
+        current_results = json.load(f)
+    print(f"baseline {baseline_results['modelforge_version']} ({baseline_results['timestamp']}), current {current_results['modelforge_version']} ({current_results['timestamp']})")
+    for metric, base_value, value, ratio in compare_results(baseline_results, current_results):
+        print(f'{metric}: {base_value:.6g} -> {value:.6g} ({ratio:.2f}x)')
+
+if __name__ == '__main__':
+    modelforge()
@@ -0,0 +1,128 @@
+import io
+import os
+import pickle
+import tempfile
+import types
+
+import pandas as pd
+
+from modelforge.core.manifest import file_checksum
+
+# Runner-managed store of fitted models, enabled by the 'artifacts' key of a run config:
+#   "artifacts": true
+#   "artifacts": {"path": "/shared/artifacts"}
+# Models are written with joblib, which stores NumPy arrays so they can be memory-mapped on load,
+# falling back to cloudpickle for objects joblib cannot pickle. Classes and functions of modules
+# registered with cloudpickle.register_pickle_by_value, as the code store does for registered code
+# (see modelforge.utils.store), are stored by value, so artifacts load without that code.
+# With a store the model is only saved there, model.save is not called. Files are named by the
+# sha256 of their content, so identical fits are stored once:
+#   <path>/<digest[:2]>/<digest>.joblib | .pkl
+# The default path is <output_dir>/artifacts, point several runs at one path to share it.
+# Predict-only runs load the models memory-mapped unless their config sets "predict_only": {"mmap": false}.
+
+ARTIFACT_DIR = 'artifacts'
+FORMATS = {'joblib': '.joblib', 'cloudpickle': '.pkl'}
+MATCH_MODES = ['window', 'fit', 'asof']
+
+
+def artifact_store(config):
+    # The artifact directory of a run config, None when artifacts are disabled
+    artifacts = config.get('artifacts')
+    if not artifacts:
+        return None
+    path = artifacts.get('path') if isinstance(artifacts, dict) else None
+    return path or os.path.join(config['output_dir'], ARTIFACT_DIR)
+
+
+def save_artifact(model, store_path):
+    # Returns {'digest', 'path', 'format', 'bytes'} of the stored model
+    os.makedirs(store_path, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=store_path, prefix='.artifact-')
+    os.close(fd)
+    try:
+        artifact_format = _dump(model, tmp_path)
+        digest = file_checksum(tmp_path)
+        path = os.path.join(store_path, digest[:2], digest + FORMATS[artifact_format])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.isfile(path):
+            # Identical content is already stored
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return {'digest': digest, 'path': path, 'format': artifact_format, 'bytes': os.path.getsize(path)}
+
+
+def load_artifact(path, mmap=True):
+    # Loads a stored model, with mmap its NumPy arrays are read-only memory maps of the file
+    if path.endswith(FORMATS['joblib']):
+        import joblib
+        return joblib.load(path, mmap_mode='r' if mmap else None)
+    import cloudpickle
+    with open(path, 'rb') as f:
+        return cloudpickle.load(f)
+
+
+def match_artifacts(intervals, source_intervals, match='window'):
+    # Pick a stored model for every window of intervals from the window records of a source run
+    # (see modelforge.utils.registry.get_run_status):
+    #   'window' the source window with the same k
+    #   'fit'    the source window with the same fit bounds
+    #   'asof'   the source window with the latest fit end on or before the window's eval start
+    # Returns {k: {'digest', 'path', 'source_k'}}, raises ValueError naming every window without a model.
+    if match not in MATCH_MODES:
+        raise ValueError(f'Artifact match "{match}" is not supported, choose one of {MATCH_MODES}')
+    stored = [w for w in source_intervals if w.get('artifact')]
+    by_k = {w['k']: w for w in stored}
+    by_fit = {(pd.Timestamp(w['fit_start']), pd.Timestamp(w['fit_end'])): w for w in stored}
+    by_fit_end = sorted(stored, key=lambda w: pd.Timestamp(w['fit_end']))
+    fit_ends = pd.DatetimeIndex([pd.Timestamp(w['fit_end']) for w in by_fit_end])
+
+    matched, missing = dict(), []
+    for k, interval in intervals.items():
+        if match == 'window':
+            source = by_k.get(k)
+        elif match == 'fit':
+            source = by_fit.get((pd.Timestamp(interval['fit'][0]), pd.Timestamp(interval['fit'][1])))
+        else:
+            position = fit_ends.searchsorted(pd.Timestamp(interval['eval'][0]), side='right') - 1
+            source = by_fit_end[position] if position >= 0 else None
+        if source is None:
+            missing.append(k)
+        else:
+            matched[k] = {'digest': source['artifact'], 'path': source['artifact_path'], 'source_k': source['k']}
+    if missing:
+        raise ValueError(f'No stored model matches windows {missing} (match="{match}")')
+    return matched
+
+
+def _dump(model, path):
+    try:
+        _joblib_dump(model, path)
+        return 'joblib'
+    except ImportError:
+        pass
+    except (pickle.PicklingError, TypeError, AttributeError) as e:
+        # e.g. lambdas, local classes or classes that cannot be found by name on this worker
+        print(f'joblib could not pickle {type(model).__name__} ({e}), falling back to cloudpickle')
+    import cloudpickle
+    with open(path, 'wb') as f:
+        cloudpickle.dump(model, f)
+    return 'cloudpickle'
+
+
+def _joblib_dump(model, path):
+    # joblib.dump, with classes and functions pickled by value where cloudpickle would
+    import cloudpickle
+    from joblib.numpy_pickle import NumpyPickler
+
+    by_value = cloudpickle.CloudPickler(io.BytesIO())
+    with open(path, 'wb') as f:
+        pickler = NumpyPickler(f)
+        pickler.dispatch_table = cloudpickle.CloudPickler.dispatch_table
+        pickler.reducer_override = lambda obj: by_value.reducer_override(obj) if isinstance(obj, (type, types.FunctionType)) else NotImplemented
+        pickler.dump(model)
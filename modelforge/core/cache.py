@@ -0,0 +1,191 @@
+import json
+import threading
+
+from collections import OrderedDict
+
+import pandas as pd
+
+from modelforge.core.components import MFDatasource
+
+# One cache per cache config per process, shared by every window trained in that process
+_CACHES = dict()
+_CACHES_LOCK = threading.Lock()
+
+
+class MFDataCache:
+    # Interval-aware LRU cache of datasource data.
+    # Data is loaded and stored in date chunks of chunk_freq (a pandas offset alias, e.g. 'MS' or '7D')
+    # and each requested interval is served by slicing the cached chunks, so overlapping windows only
+    # read the chunks they do not share. With chunk_freq=None whole intervals are memoized as-is.
+    # Chunks are evicted least recently used first once max_bytes is exceeded.
+    # Threads of one worker share the cache, a chunk missed by several of them is loaded once.
+    def __init__(self, chunk_freq='MS', max_bytes=None, date_column=None):
+        self.chunk_freq = chunk_freq
+        self.max_bytes = max_bytes
+        self.date_column = date_column
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._chunks = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = dict()
+
+    def chunk_bounds(self, start, end):
+        # Half-open [chunk_start, chunk_end) chunks covering the closed interval [start, end]
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        if self.chunk_freq is None:
+            return [(start, end)]
+        offset = pd.tseries.frequencies.to_offset(self.chunk_freq)
+        # Edges lie on one grid for every request so overlapping intervals share chunks.
+        # Tick offsets ('D', '7D', 'H') have no anchor of their own and are floored from the epoch.
+        if isinstance(offset, pd.offsets.Tick):
+            first = start.floor(offset)
+        else:
+            first = offset.rollback(start.normalize())
+        edges = pd.date_range(first, end, freq=offset)
+        edges = edges.append(pd.DatetimeIndex([edges[-1] + offset]))
+        return list(zip(edges[:-1], edges[1:]))
+
+    def get(self, datasource, key, start, end, training=False):
+        # Returns the data of datasource for the closed interval [start, end]. The data is never
+        # the cached object itself, so models may modify their input in place.
+        frames = [self._get_chunk(datasource, key, chunk_start, chunk_end, training)
+                  for chunk_start, chunk_end in self.chunk_bounds(start, end)]
+        if self.chunk_freq is None:
+            return frames[0].copy()
+        data = pd.concat(frames) if len(frames) > 1 else frames[0]
+        dates = self._dates(data)
+        return data[(dates >= pd.Timestamp(start)) & (dates <= pd.Timestamp(end))]
+
+    def iter_chunks(self, datasource, key, start, end, training=False):
+        # Yields the interval chunk by chunk, only ever holding one chunk beyond the cache itself
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        for chunk_start, chunk_end in self.chunk_bounds(start, end):
+            data = self._get_chunk(datasource, key, chunk_start, chunk_end, training)
+            if self.chunk_freq is not None and (chunk_start < start or chunk_end > end):
+                dates = self._dates(data)
+                data = data[(dates >= start) & (dates <= end)]
+            else:
+                data = data.copy()
+            yield data
+
+    def clear(self):
+        with self._lock:
+            self._chunks.clear()
+            self.nbytes = 0
+
+    def _get_chunk(self, datasource, key, chunk_start, chunk_end, training):
+        chunk_key = (key, training, chunk_start, chunk_end)
+        with self._lock:
+            if chunk_key in self._chunks:
+                return self._hit(chunk_key)
+            loading = self._loading.setdefault(chunk_key, threading.Lock())
+        with loading:
+            with self._lock:
+                # Loaded by another thread while this one waited
+                if chunk_key in self._chunks:
+                    return self._hit(chunk_key)
+                self.misses += 1
+            datasource.set_interval(chunk_start, chunk_end)
+            data = datasource.get_data(training=training)
+            if not isinstance(data, (pd.DataFrame, pd.Series)):
+                raise TypeError(f'Cached datasources must return a pandas DataFrame or Series, got {type(data).__name__}')
+            if self.chunk_freq is not None:
+                # Chunks are half-open so rows on a boundary are only stored once
+                dates = self._dates(data)
+                data = data[(dates >= chunk_start) & (dates < chunk_end)]
+
+            size = int(data.memory_usage(deep=True).sum()) if isinstance(data, pd.DataFrame) else int(data.memory_usage(deep=True))
+            with self._lock:
+                if chunk_key in self._chunks:
+                    self.nbytes -= self._chunks[chunk_key][1]
+                self._chunks[chunk_key] = (data, size)
+                self.nbytes += size
+                self._evict()
+                self._loading.pop(chunk_key, None)
+            return data
+
+    def _hit(self, chunk_key):
+        # Called with the lock held
+        self.hits += 1
+        self._chunks.move_to_end(chunk_key)
+        return self._chunks[chunk_key][0]
+
+    def _evict(self):
+        # Called with the lock held
+        if self.max_bytes is None:
+            return
+        # Always keep the most recent chunk, even when it alone exceeds the budget
+        while self.nbytes > self.max_bytes and len(self._chunks) > 1:
+            _, (_, size) = self._chunks.popitem(last=False)
+            self.nbytes -= size
+
+    def _dates(self, data):
+        if self.date_column is not None:
+            return pd.DatetimeIndex(data[self.date_column])
+        if not isinstance(data.index, pd.DatetimeIndex):
+            raise TypeError('Cached datasources must be indexed by date, or set "date_column" in the cache config')
+        return data.index
+
+
+class CachedDatasource(MFDatasource):
+    # Wraps a datasource so get_data is served from an MFDataCache.
+    # Anything other than the data itself (label, features, custom attributes) is delegated.
+    # key identifies the datasource class and params, see datasource_key.
+    def __init__(self, datasource, cache, key):
+        self.datasource = datasource
+        self.cache = cache
+        self.key = key
+        self.interval = getattr(datasource, 'interval', None)
+
+    def set_interval(self, start, end):
+        self.interval = (start, end)
+        self.datasource.set_interval(start, end)
+
+    def get_data(self, training=False):
+        try:
+            return self.cache.get(self.datasource, self.key, *self.interval, training=training)
+        finally:
+            self.datasource.set_interval(*self.interval)
+
+    def iter_data(self, training=False, chunk_size=None):
+        # Streams the cached chunks instead of concatenating the whole interval
+        chunk_size = chunk_size or self.chunk_size
+        try:
+            for data in self.cache.iter_chunks(self.datasource, self.key, *self.interval, training=training):
+                if chunk_size is None:
+                    yield data
+                    continue
+                for i in range(0, len(data), chunk_size):
+                    yield data.iloc[i:i + chunk_size]
+        finally:
+            self.datasource.set_interval(*self.interval)
+
+    @property
+    def label(self):
+        return self.datasource.label
+
+    @property
+    def features(self):
+        return self.datasource.features
+
+    def __getattr__(self, name):
+        # Only called for attributes not found on the wrapper itself
+        if name == 'datasource':
+            raise AttributeError(name)
+        return getattr(self.datasource, name)
+
+
+def datasource_key(datasource_class, params):
+    return f'{datasource_class.__module__}.{datasource_class.__qualname__}:{json.dumps(params, sort_keys=True, default=str)}'
+
+
+def get_cache(cache_config):
+    # Returns the process-wide cache for the given settings, creating it on first use
+    key = json.dumps(cache_config, sort_keys=True, default=str)
+    with _CACHES_LOCK:
+        if key not in _CACHES:
+            _CACHES[key] = MFDataCache(chunk_freq=cache_config.get('chunk_freq', 'MS'),
+                                       max_bytes=cache_config.get('max_bytes'),
+                                       date_column=cache_config.get('date_column'))
+        return _CACHES[key]
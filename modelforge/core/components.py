@@ -11,11 +11,45 @@ class MFModel(ABC):
     def save(self,output_directory):
         pass
 
+    # Models that can continue from the previous rolling window set this to True
+    # and implement train_from, e.g. with sklearn warm_start or partial_fit
+    supports_warm_start = False
+
+    def train_from(self,previous,datasource,new_interval):
+        # previous is the fitted model of the previous window, datasource is set to the
+        # full fit interval and new_interval is the (start, end) of the data added since
+        # the previous fit. Train on either, starting from the state of previous.
+        raise NotImplementedError("Subclass must implement 'train_from' to support warm starts")
+
+    def predict_stream(self,datasource,chunk_size=None):
+        # Yields predictions chunk by chunk. The default calls predict_batch on one chunk of
+        # datasource.iter_data(chunk_size=chunk_size) at a time. Models whose predictions need the
+        # whole interval at once should override this and yield predict_batch(datasource).
+        for chunk in datasource.iter_data(chunk_size=chunk_size):
+            yield self.predict_batch(_ChunkDatasource(datasource,chunk))
+
 class MFDatasource(ABC):
+    # Default batch size in rows for iter_data, set by the runner when streaming
+    chunk_size = None
+
     @abstractmethod
     def get_data(self,training=False):
         pass
 
+    def iter_data(self,training=False,chunk_size=None):
+        # Yields the interval in pandas or NumPy batches of at most chunk_size rows.
+        # Datasources that can read incrementally should override this, the default
+        # loads get_data in full and slices it.
+        chunk_size = chunk_size or self.chunk_size
+        data = self.get_data(training=training)
+        if chunk_size is None:
+            yield data
+            return
+        for i in range(0, len(data), chunk_size):
+            yield data.iloc[i:i+chunk_size] if hasattr(data,'iloc') else data[i:i+chunk_size]
+
+    # Datasources that stream may also set label_column, the label's column in the data chunks,
+    # so streamed windows are scored chunk by chunk (see modelforge.core.metrics)
     @property
     def label(self):
         raise NotImplementedError("Subclass must implement the 'label' property")
@@ -26,3 +60,33 @@ class MFDatasource(ABC):
 
     def set_interval(self,start,end):
         self.interval = (start,end)
+
+
+class _ChunkDatasource(MFDatasource):
+    # A single chunk of a datasource's interval, anything other than the data is delegated
+    def __init__(self,datasource,chunk):
+        self.datasource = datasource
+        self.chunk = chunk
+        self.interval = getattr(datasource,'interval',None)
+
+    def get_data(self,training=False):
+        return self.chunk
+
+    def iter_data(self,training=False,chunk_size=None):
+        yield self.chunk
+
+    @property
+    def label(self):
+        column = getattr(self.datasource,'label_column',None)
+        if column is not None and hasattr(self.chunk,'columns') and column in self.chunk.columns:
+            return self.chunk[column]
+        return self.datasource.label
+
+    @property
+    def features(self):
+        return self.datasource.features
+
+    def __getattr__(self,name):
+        if name == 'datasource':
+            raise AttributeError(name)
+        return getattr(self.datasource,name)
@@ -0,0 +1,190 @@
+import pandas as pd
+
+from modelforge.core.artifacts import MATCH_MODES
+from modelforge.core.instrument import MEMORY_MODES, PROFILERS
+from modelforge.core.metrics import BUILTIN_METRICS
+from modelforge.core.planning import CALENDARS, WINDOW_TYPES, plan_from_config
+from modelforge.core.scheduler import BACKENDS
+from modelforge.core.sinks import SINKS
+from modelforge.core.sweep import expand_sweep
+
+# Declared schema of a run config. Each field has the accepted types and optionally:
+#   required - True, or the train modes it is required in
+#   choices  - the accepted values
+#   min      - the smallest accepted number
+#   fields   - the schema of a nested dict
+#   items    - the accepted type of every item of a list
+# validate_config checks everything in one pass and reports every problem at once.
+
+TRAIN_MODES = ['single_window', 'rolling_window']
+DATE = 'date'
+ROLLING = ['rolling_window']
+SINGLE = ['single_window']
+
+SCHEMA = {
+    'train_mode': {'type': str, 'required': True, 'choices': TRAIN_MODES},
+    'model': {'type': str, 'required': True},
+    'datasource': {'type': str, 'required': True},
+    'model_params': {'type': dict, 'required': True},
+    'datasource_params': {'type': dict},
+    'output_dir': {'type': str, 'required': True},
+
+    'start_date': {'type': DATE, 'required': ROLLING},
+    'end_date': {'type': DATE, 'required': ROLLING},
+    'train_period': {'type': int, 'required': ROLLING, 'min': 0},
+    'gap_period': {'type': int, 'required': ROLLING, 'min': 0},
+    'eval_period': {'type': int, 'required': ROLLING, 'min': 0},
+    'recalibration_freq': {'type': int, 'required': ROLLING, 'min': 1},
+    'calendar': {'type': str, 'choices': CALENDARS},
+    'holidays': {'type': list, 'items': DATE},
+    'window_type': {'type': str, 'choices': WINDOW_TYPES},
+    'min_eval_length': {'type': int, 'min': 0},
+    'truncate_eval': {'type': bool},
+
+    'train_start_date': {'type': DATE, 'required': SINGLE},
+    'train_end_date': {'type': DATE, 'required': SINGLE},
+    'eval_start_date': {'type': DATE, 'required': SINGLE},
+    'eval_end_date': {'type': DATE, 'required': SINGLE},
+
+    'scheduler': {'type': dict, 'fields': {
+        'backend': {'type': str, 'choices': BACKENDS},
+        'max_workers': {'type': int, 'min': 1},
+        'max_in_flight': {'type': int, 'min': 1},
+        'retries': {'type': int, 'min': 0},
+    }},
+    'dask_scheduler_address': {'type': (str, type(None))},
+    'sweep': {'type': dict, 'fields': {
+        'method': {'type': str},
+        'params': {'type': dict, 'required': True},
+        'n_iter': {'type': int, 'min': 1},
+        'seed': {'type': int},
+        'batch_size': {'type': int, 'min': 1},
+    }},
+    'warm_start': {'type': (bool, dict), 'fields': {
+        'chain_length': {'type': int, 'min': 1},
+    }},
+    'data_cache': {'type': dict, 'fields': {
+        'chunk_freq': {'type': (str, type(None))},
+        'max_bytes': {'type': int, 'min': 0},
+        'date_column': {'type': str},
+    }},
+    'stream_chunk_size': {'type': int, 'min': 1},
+    'prediction_sink': {'type': str, 'choices': SINKS},
+    'prediction_date_column': {'type': str},
+    'instrument': {'type': (bool, dict), 'fields': {
+        'memory': {'type': (str, bool), 'choices': MEMORY_MODES + [False]},
+        'profile': {'type': dict, 'fields': {
+            'windows': {'type': list},
+            'profiler': {'type': str, 'choices': PROFILERS},
+        }},
+        'log': {'type': bool},
+    }},
+    'artifacts': {'type': (bool, dict), 'fields': {
+        'path': {'type': str},
+    }},
+    'predict_only': {'type': dict, 'fields': {
+        'source_run': {'type': str, 'required': True},
+        'match': {'type': str, 'choices': MATCH_MODES},
+        'mmap': {'type': bool},
+    }},
+    'metrics': {'type': list},
+
+    'run_id': {'type': str},
+    'database_path': {'type': str, 'required': True},
+    'store_path': {'type': str},
+    'resume': {'type': bool},
+}
+
+
+class ConfigError(ValueError):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('Invalid run config:\n' + '\n'.join(f'  - {error}' for error in errors))
+
+
+def validate_config(config):
+    # Raises ConfigError listing every problem of the run config, unknown fields included.
+    # Returns the window plan, which the checks build anyway.
+    if not isinstance(config, dict):
+        raise ConfigError([f'run config must be a JSON object, got {type(config).__name__}'])
+    errors = []
+    mode = config.get('train_mode')
+    _check_fields(config, SCHEMA, mode, '', errors)
+    plan = None
+    if not errors:
+        plan = _check_consistency(config, mode, errors)
+    if errors:
+        raise ConfigError(errors)
+    return plan
+
+
+def _check_fields(config, schema, mode, prefix, errors):
+    for name, spec in schema.items():
+        required = spec.get('required')
+        if name not in config:
+            if required is True or (isinstance(required, list) and mode in required):
+                errors.append(f'missing required field "{prefix}{name}"' + (f' (required for {mode})' if required is not True else ''))
+            continue
+        _check_value(config[name], spec, mode, prefix + name, errors)
+    for name in config:
+        if name not in schema:
+            errors.append(f'unknown field "{prefix}{name}"')
+
+
+def _check_value(value, spec, mode, name, errors):
+    expected = spec['type']
+    if expected == DATE:
+        try:
+            valid = not pd.isna(pd.Timestamp(value))
+        except (ValueError, TypeError):
+            valid = False
+        if not valid:
+            errors.append(f'"{name}" must be a date, got {value!r}')
+        return
+    types = expected if isinstance(expected, tuple) else (expected,)
+    # bool is an int in Python but never a valid count
+    if not isinstance(value, types) or (isinstance(value, bool) and bool not in types):
+        names = ' or '.join(t.__name__ for t in types)
+        errors.append(f'"{name}" must be of type {names}, got {type(value).__name__}')
+        return
+    if 'choices' in spec and value not in spec['choices']:
+        errors.append(f'"{name}" must be one of {spec["choices"]}, got {value!r}')
+    if 'min' in spec and not isinstance(value, bool) and value < spec['min']:
+        errors.append(f'"{name}" must be at least {spec["min"]}, got {value}')
+    if 'fields' in spec and isinstance(value, dict):
+        _check_fields(value, spec['fields'], mode, f'{name}.', errors)
+    if 'items' in spec:
+        for i, item in enumerate(value):
+            _check_value(item, {'type': spec['items']}, mode, f'{name}[{i}]', errors)
+
+
+def _check_consistency(config, mode, errors):
+    # Checks across fields, once every field has a valid type. Returns the window plan.
+    plan = None
+    if mode == 'rolling_window':
+        if pd.Timestamp(config['end_date']) <= pd.Timestamp(config['start_date']):
+            errors.append('"end_date" must be after "start_date"')
+    else:
+        if pd.Timestamp(config['train_end_date']) < pd.Timestamp(config['train_start_date']):
+            errors.append('"train_end_date" must not be before "train_start_date"')
+        if pd.Timestamp(config['eval_end_date']) < pd.Timestamp(config['eval_start_date']):
+            errors.append('"eval_end_date" must not be before "eval_start_date"')
+    if not errors:
+        try:
+            plan = plan_from_config(config)
+            if plan.empty:
+                errors.append('the config plans no windows: no window evaluates between "start_date" and "end_date" '
+                              'after train_period + gap_period sessions (and min_eval_length, if set)')
+        except ValueError as e:
+            errors.append(f'the windows can not be planned: {e}')
+    if config.get('sweep'):
+        try:
+            expand_sweep(config['model_params'], config['sweep'])
+        except (ValueError, KeyError, TypeError) as e:
+            errors.append(f'invalid "sweep": {e}')
+    if config.get('predict_only') and (config.get('sweep') or config.get('warm_start')):
+        errors.append('"predict_only" can not be combined with "sweep" or "warm_start"')
+    for metric in config.get('metrics', []):
+        if not isinstance(metric, str) or (metric not in BUILTIN_METRICS and ':' not in metric):
+            errors.append(f'metric {metric!r} must be one of {BUILTIN_METRICS} or "module:function"')
+    return plan
@@ -0,0 +1,225 @@
+import contextlib
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+from modelforge.core.components import MFDatasource
+
+# Per-window instrumentation, enabled by the 'instrument' key of a run config:
+#   "instrument": true
+#   "instrument": {"memory": "tracemalloc" | "rss" | false,
+#                  "profile": {"windows": [0, 12], "profiler": "cprofile" | "pyinstrument"},
+#                  "log": true}
+# Spans accumulate wall and cpu seconds per phase of a window. cpu is the time of the window's
+# own thread, so windows sharing a dask worker do not count each other. A span's cpu time close
+# to its wall time means the phase is CPU-bound, a much smaller one that it waits on I/O, or on
+# threads the model starts itself (e.g. BLAS), which are not counted. get_data is timed on every
+# call and also counted inside the train and predict spans that call it.
+# Memory:
+#   rss          the process's peak resident set size when the window ends (the default). It never
+#                goes down, so it is the high-water mark of everything run in that process so far,
+#                not of the window, but it has no overhead and includes memory allocated outside Python.
+#   tracemalloc  peak bytes allocated by Python during the window. Tracing slows down every
+#                allocation and the peak is process-wide, so it needs windows that run one at a
+#                time per process (the local and process backends). Windows that overlap another
+#                traced window in the same process report no peak.
+# Disabled runs get NULL_INSTRUMENT, whose spans are a shared no-op context.
+
+MEMORY_MODES = ['rss', 'tracemalloc']
+PROFILERS = ['cprofile', 'pyinstrument']
+LOG_FILE = 'instrument.jsonl'
+PROFILE_DIR = 'profiles'
+
+_NULL_SPAN = contextlib.nullcontext()
+
+# Windows traced by tracemalloc in this process, tracing stops when the last one ends
+_TRACE_LOCK = threading.Lock()
+_TRACE_STATE = {'windows': set(), 'started': False}
+
+
+class MFInstrument:
+    enabled = True
+
+    def __init__(self, config, k, output_dir):
+        config = config if isinstance(config, dict) else dict()
+        self.k = k
+        self.output_dir = output_dir
+        self.memory = config.get('memory', 'rss')
+        if self.memory and self.memory not in MEMORY_MODES:
+            raise ValueError(f'Memory mode "{self.memory}" is not supported, choose one of {MEMORY_MODES}')
+        profile = config.get('profile') or dict()
+        self.profiler = profile.get('profiler', 'cprofile') if k in profile.get('windows', []) else None
+        if self.profiler and self.profiler not in PROFILERS:
+            raise ValueError(f'Profiler "{self.profiler}" is not supported, choose one of {PROFILERS}')
+        self.log = config.get('log', True)
+        self.spans = dict()
+        self.peak_memory = None
+        self.profile_path = None
+        self._overlapped = False
+
+    @contextlib.contextmanager
+    def span(self, name):
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            span = self.spans.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+            span['wall'] += time.perf_counter() - wall
+            span['cpu'] += time.thread_time() - cpu
+            span['calls'] += 1
+
+    @contextlib.contextmanager
+    def window(self):
+        # Wraps the whole window: total span, memory high-water mark and the optional profile
+        self._start_memory()
+        profiler = self._start_profiler()
+        try:
+            with self.span('window'):
+                yield self
+        finally:
+            if profiler is not None:
+                self._stop_profiler(profiler)
+            self.peak_memory = self._stop_memory()
+            if self.log:
+                self.write_log()
+
+    def metrics(self):
+        return {'spans': self.spans, 'peak_memory': self.peak_memory, 'profile': self.profile_path}
+
+    def write_log(self):
+        # One JSON line per window, a single write so concurrent workers do not interleave lines
+        record = dict(self.metrics(), k=self.k, worker=f'{socket.gethostname()}:{os.getpid()}', time=time.time())
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(os.path.join(self.output_dir, LOG_FILE), 'a') as f:
+            f.write(json.dumps(record, default=str) + '\n')
+
+    def _start_memory(self):
+        if self.memory == 'tracemalloc':
+            import tracemalloc
+            with _TRACE_LOCK:
+                windows = _TRACE_STATE['windows']
+                if not windows:
+                    # Tracing started by someone else is left running
+                    _TRACE_STATE['started'] = not tracemalloc.is_tracing()
+                    if _TRACE_STATE['started']:
+                        tracemalloc.start()
+                    tracemalloc.reset_peak()
+                else:
+                    # The peak is shared, neither window can tell its own
+                    print(f'Window {self.k} overlaps other traced windows in this process, their memory peaks are not reported')
+                    for instrument in windows | {self}:
+                        instrument._overlapped = True
+                windows.add(self)
+
+    def _stop_memory(self):
+        if self.memory == 'tracemalloc':
+            import tracemalloc
+            with _TRACE_LOCK:
+                peak = tracemalloc.get_traced_memory()[1]
+                _TRACE_STATE['windows'].discard(self)
+                if not _TRACE_STATE['windows'] and _TRACE_STATE['started']:
+                    tracemalloc.stop()
+            return None if self._overlapped else peak
+        if self.memory == 'rss':
+            try:
+                import resource
+            except ImportError:
+                return None
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # Reported in bytes on macOS and in kilobytes on Linux
+            return maxrss if sys.platform == 'darwin' else maxrss * 1024
+        return None
+
+    def _start_profiler(self):
+        if self.profiler is None:
+            return None
+        if self.profiler == 'pyinstrument':
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+        else:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+        return profiler
+
+    def _stop_profiler(self, profiler):
+        profile_dir = os.path.join(self.output_dir, PROFILE_DIR)
+        os.makedirs(profile_dir, exist_ok=True)
+        if self.profiler == 'pyinstrument':
+            profiler.stop()
+            self.profile_path = os.path.join(profile_dir, f'window_{self.k}.html')
+            with open(self.profile_path, 'w') as f:
+                f.write(profiler.output_html())
+        else:
+            profiler.disable()
+            self.profile_path = os.path.join(profile_dir, f'window_{self.k}.prof')
+            profiler.dump_stats(self.profile_path)
+        print(f'Profile of window {self.k} written to {self.profile_path}')
+
+
+class _NullInstrument:
+    enabled = False
+
+    def span(self, name):
+        return _NULL_SPAN
+
+    def window(self):
+        return contextlib.nullcontext(self)
+
+    def metrics(self):
+        return None
+
+
+NULL_INSTRUMENT = _NullInstrument()
+
+
+def get_instrument(config, k):
+    # The instrument of window k of a run, NULL_INSTRUMENT unless the run config enables it
+    instrument_config = config.get('instrument')
+    if not instrument_config:
+        return NULL_INSTRUMENT
+    return MFInstrument(instrument_config, k, config['output_dir'])
+
+
+class InstrumentedDatasource(MFDatasource):
+    # Wraps a datasource so every get_data and iter_data call is timed under the 'get_data' span.
+    # Everything else is delegated, as in CachedDatasource.
+    def __init__(self, datasource, instrument):
+        self.datasource = datasource
+        self.instrument = instrument
+        self.interval = getattr(datasource, 'interval', None)
+        self.chunk_size = getattr(datasource, 'chunk_size', None)
+
+    def set_interval(self, start, end):
+        self.interval = (start, end)
+        self.datasource.set_interval(start, end)
+
+    def get_data(self, training=False):
+        with self.instrument.span('get_data'):
+            return self.datasource.get_data(training=training)
+
+    def iter_data(self, training=False, chunk_size=None):
+        chunks = self.datasource.iter_data(training=training, chunk_size=chunk_size or self.chunk_size)
+        while True:
+            with self.instrument.span('get_data'):
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+
+    @property
+    def label(self):
+        return self.datasource.label
+
+    @property
+    def features(self):
+        return self.datasource.features
+
+    def __getattr__(self, name):
+        if name == 'datasource':
+            raise AttributeError(name)
+        return getattr(self.datasource, name)
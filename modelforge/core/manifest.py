@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+
+# Written last into each eval_k directory, a window only counts as done when it is present and valid
+MANIFEST_FILE = '_SUCCESS.json'
+
+# Config keys that change a window's outputs. Everything else (the run's date range and plan
+# settings, caching, streaming, scheduling) only decides which windows run and how, a window's
+# own bounds are part of its fingerprint.
+OUTPUT_CONFIG_KEYS = ['model', 'model_params', 'datasource', 'datasource_params', 'warm_start', 'metrics',
+                      'artifacts', 'prediction_sink', 'prediction_date_column']
+
+
+def window_fingerprint(config, interval, model_url, datasource_url, artifact=None):
+    # Identifies the output of a window: the output settings of the run config, the registered
+    # code versions (the urls include the commit), the window bounds and, for predict-only
+    # windows, the digest of the stored model they are scored with
+    run_config = {k: config[k] for k in OUTPUT_CONFIG_KEYS if k in config}
+    data = {
+        'config': run_config,
+        'model_url': model_url,
+        'datasource_url': datasource_url,
+        'fit': [str(t) for t in interval['fit']],
+        'eval': [str(t) for t in interval['eval']],
+    }
+    if artifact is not None:
+        data['artifact'] = artifact
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def file_checksum(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def output_files(outpath):
+    files = []
+    for root, _, names in os.walk(outpath):
+        for name in names:
+            if name != MANIFEST_FILE:
+                files.append(os.path.relpath(os.path.join(root, name), outpath).replace('\\', '/'))
+    return sorted(files)
+
+
+def write_manifest(outpath, fingerprint, extra_files=()):
+    # Checksum every output of the window, written atomically so a crash never leaves a partial manifest.
+    # extra_files are outputs written outside outpath, e.g. by a prediction sink.
+    names = set(output_files(outpath))
+    names.update(os.path.relpath(path, outpath).replace('\\', '/') for path in extra_files)
+    manifest = {
+        'fingerprint': fingerprint,
+        'files': {name: file_checksum(os.path.join(outpath, name)) for name in sorted(names)},
+    }
+    tmp_path = os.path.join(outpath, f'.{MANIFEST_FILE}.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(outpath, MANIFEST_FILE))
+
+
+def remove_manifest(outpath):
+    try:
+        os.remove(os.path.join(outpath, MANIFEST_FILE))
+    except FileNotFoundError:
+        pass
+
+
+def is_complete(outpath, fingerprint):
+    # True if the window was written by an identical configuration and no output changed since
+    try:
+        with open(os.path.join(outpath, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return False
+    if manifest.get('fingerprint') != fingerprint:
+        return False
+    for name, checksum in manifest['files'].items():
+        path = os.path.join(outpath, name)
+        if not os.path.isfile(path) or file_checksum(path) != checksum:
+            return False
+    return True
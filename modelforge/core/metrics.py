@@ -0,0 +1,258 @@
+import importlib
+
+import numpy as np
+import pandas as pd
+
+from modelforge.core.components import MFDatasource
+
+# Evaluation metrics computed by the runner right after each window is predicted, enabled by
+# the 'metrics' key of a run config, e.g. "metrics": ["rmse", "ic", "hit_rate", "mypackage.metrics:sharpe"].
+#   rmse, mae  errors of the prediction against datasource.label
+#   ic         Pearson correlation of prediction and label
+#   rank_ic    Spearman (rank) correlation of prediction and label
+#   hit_rate   share of rows where prediction and label have the same sign
+#   module:fn  fn(y_true, y_pred) on aligned NumPy arrays, returning a float
+# rmse, mae, ic and hit_rate are kept as sums (sufficient statistics), so run-level values are
+# exact over all windows without a second pass. rank_ic and custom metrics are combined into
+# the run-level value as the row-weighted mean of their window values.
+# ic and rank_ic are pooled: one correlation over all rows of the window (ic over all rows of the
+# run at run level), not the mean over dates of per-date cross-sectional correlations.
+# The label is taken from the data the model reads, each chunk of a streamed window or the frame
+# returned by get_data, so the eval data is not loaded a second time for scoring. That needs the
+# label's column: datasource.label_column, or a datasource.label that is a column name. A label
+# given as the data itself is used as is.
+
+BUILTIN_METRICS = ['rmse', 'mae', 'ic', 'rank_ic', 'hit_rate']
+DECOMPOSABLE_METRICS = ['rmse', 'mae', 'ic', 'hit_rate']
+STAT_KEYS = ['n', 'sum_sq_err', 'sum_abs_err', 'sum_pred', 'sum_label', 'sum_pred2', 'sum_label2', 'sum_cross', 'hits']
+PREDICTION_COLUMN = 'prediction'
+
+
+def resolve_metrics(names):
+    # {name: None for builtins, the function for 'module:function' metrics}
+    metrics = dict()
+    for name in names:
+        if name in BUILTIN_METRICS:
+            metrics[name] = None
+        elif ':' in name:
+            module_name, function_name = name.split(':', 1)
+            try:
+                metrics[name] = getattr(importlib.import_module(module_name), function_name)
+            except (ImportError, AttributeError) as e:
+                raise ValueError(f'Metric "{name}" could not be imported: {e}')
+        else:
+            raise ValueError(f'Metric "{name}" is not supported, choose from {BUILTIN_METRICS} or give "module:function"')
+    return metrics
+
+
+class MFWindowMetrics:
+    # Metrics of one window. update takes the predictions as a whole or chunk by chunk, scored
+    # against label, or against the label chunks collected by label_tap when label is None.
+    def __init__(self, names, label=None):
+        self.metrics = resolve_metrics(names)
+        self.label = label
+        self.stats = dict.fromkeys(STAT_KEYS, 0.0)
+        # rank_ic and custom metrics need the aligned values, they are only kept when requested
+        self._keep_values = any(name not in DECOMPOSABLE_METRICS for name in self.metrics)
+        self._values = []
+        self._offset = 0
+        self._datasource = None
+        self._pending = []
+
+    def label_tap(self, datasource):
+        # Returns datasource wrapped so the label of the data read through get_data, or of every
+        # chunk read through iter_data, is kept until the predictions are scored
+        self._datasource = datasource
+        column = getattr(datasource, 'label_column', None)
+        if column is None:
+            label = datasource.label
+            if not isinstance(label, str):
+                self.label = label
+                return datasource
+            column = label
+        return _LabelTap(datasource, self, column)
+
+    def add_labels(self, label):
+        self._pending.append(label)
+
+    def update(self, predictions):
+        y_pred, y_true = align(predictions, self._labels_for(predictions))
+        valid = np.isfinite(y_pred) & np.isfinite(y_true)
+        y_pred, y_true = y_pred[valid], y_true[valid]
+        error = y_pred - y_true
+        self.stats['n'] += len(y_pred)
+        self.stats['sum_sq_err'] += float(error @ error)
+        self.stats['sum_abs_err'] += float(np.abs(error).sum())
+        self.stats['sum_pred'] += float(y_pred.sum())
+        self.stats['sum_label'] += float(y_true.sum())
+        self.stats['sum_pred2'] += float(y_pred @ y_pred)
+        self.stats['sum_label2'] += float(y_true @ y_true)
+        self.stats['sum_cross'] += float(y_pred @ y_true)
+        self.stats['hits'] += float((np.sign(y_pred) == np.sign(y_true)).sum())
+        if self._keep_values:
+            self._values.append((y_pred, y_true))
+
+    def tap(self, chunks):
+        # Passes streamed prediction chunks through, updating the metrics on the way
+        for chunk in chunks:
+            self.update(chunk)
+            yield chunk
+
+    def _labels_for(self, predictions):
+        if self.label is None and not self._pending:
+            # The model read no eval data through the tap
+            self.label = window_label(self._datasource)
+        if self.label is not None:
+            label = self.label
+            if not isinstance(label, (pd.Series, pd.DataFrame)):
+                # Unindexed chunks follow each other through the label
+                label = np.asarray(label)[self._offset:self._offset + len(predictions)]
+                self._offset += len(predictions)
+            return label
+        pending = pd.concat(self._pending) if len(self._pending) > 1 else self._pending[0]
+        if isinstance(predictions, (pd.Series, pd.DataFrame)) and isinstance(pending, (pd.Series, pd.DataFrame)):
+            # Matched on the index, rows before the last match were skipped by the model
+            matched = np.flatnonzero(pending.index.isin(predictions.index))
+            label = pending.iloc[matched]
+            rest = pending.iloc[matched[-1] + 1:] if len(matched) else pending
+        else:
+            label, rest = pending[:len(predictions)], pending[len(predictions):]
+        self._pending = [rest] if len(rest) else []
+        return label
+
+    def result(self):
+        # {'values': {name: value}, 'stats': sufficient statistics}
+        values = metrics_from_stats(self.stats, [name for name in self.metrics if name in DECOMPOSABLE_METRICS])
+        if self._keep_values:
+            y_pred = np.concatenate([p for p, _ in self._values]) if self._values else np.empty(0)
+            y_true = np.concatenate([t for _, t in self._values]) if self._values else np.empty(0)
+            for name, function in self.metrics.items():
+                if name == 'rank_ic':
+                    values[name] = _correlation(pd.Series(y_pred).rank().to_numpy(), pd.Series(y_true).rank().to_numpy())
+                elif function is not None:
+                    values[name] = float(function(y_true, y_pred)) if len(y_pred) else float('nan')
+        return {'values': values, 'stats': dict(self.stats)}
+
+
+class MFRunMetrics:
+    # Run-level metrics, combined incrementally from window results as they complete
+    def __init__(self, names):
+        self.metrics = resolve_metrics(names)
+        self.stats = dict.fromkeys(STAT_KEYS, 0.0)
+        self.windows = 0
+        self._weighted = dict()
+
+    def add(self, window_result):
+        stats = window_result['stats']
+        for key in STAT_KEYS:
+            self.stats[key] += stats.get(key, 0.0)
+        self.windows += 1
+        for name, value in window_result['values'].items():
+            if name in DECOMPOSABLE_METRICS or value is None or not np.isfinite(value):
+                continue
+            total, weight = self._weighted.get(name, (0.0, 0.0))
+            self._weighted[name] = (total + value * stats['n'], weight + stats['n'])
+
+    def result(self):
+        values = metrics_from_stats(self.stats, [name for name in self.metrics if name in DECOMPOSABLE_METRICS])
+        for name in self.metrics:
+            if name not in DECOMPOSABLE_METRICS:
+                total, weight = self._weighted.get(name, (0.0, 0.0))
+                values[name] = total / weight if weight else float('nan')
+        return {'values': values, 'stats': dict(self.stats), 'windows': self.windows}
+
+
+def metrics_from_stats(stats, names):
+    n = stats['n']
+    values = dict()
+    for name in names:
+        if not n:
+            values[name] = float('nan')
+        elif name == 'rmse':
+            values[name] = float(np.sqrt(stats['sum_sq_err'] / n))
+        elif name == 'mae':
+            values[name] = stats['sum_abs_err'] / n
+        elif name == 'hit_rate':
+            values[name] = stats['hits'] / n
+        elif name == 'ic':
+            covariance = stats['sum_cross'] - stats['sum_pred'] * stats['sum_label'] / n
+            variance_pred = stats['sum_pred2'] - stats['sum_pred'] ** 2 / n
+            variance_label = stats['sum_label2'] - stats['sum_label'] ** 2 / n
+            denominator = np.sqrt(variance_pred * variance_label)
+            values[name] = float(covariance / denominator) if denominator > 0 else float('nan')
+    return values
+
+
+def align(predictions, label):
+    # Aligned float arrays (y_pred, y_true). pandas inputs are matched on the index,
+    # anything else by position.
+    if isinstance(predictions, pd.DataFrame):
+        if PREDICTION_COLUMN in predictions.columns:
+            predictions = predictions[PREDICTION_COLUMN]
+        elif predictions.shape[1] == 1:
+            predictions = predictions.iloc[:, 0]
+        else:
+            raise ValueError(f'Predictions have several columns, name the predicted one "{PREDICTION_COLUMN}" to compute metrics')
+    if isinstance(label, pd.DataFrame):
+        label = label.iloc[:, 0]
+    if isinstance(predictions, pd.Series) and isinstance(label, pd.Series):
+        if not predictions.index.equals(label.index):
+            label = label.reindex(predictions.index)
+        return predictions.to_numpy(dtype=float), label.to_numpy(dtype=float)
+    y_pred, y_true = np.asarray(predictions, dtype=float).ravel(), np.asarray(label, dtype=float).ravel()
+    if len(y_pred) != len(y_true):
+        raise ValueError(f'Cannot align {len(y_pred)} predictions with {len(y_true)} labels')
+    return y_pred, y_true
+
+
+def window_label(datasource):
+    # The label of the datasource's current interval, datasources may return it or its column name
+    label = datasource.label
+    if isinstance(label, str):
+        label = datasource.get_data()[label]
+    return label
+
+
+class _LabelTap(MFDatasource):
+    # Collects the label column of the data the model reads, everything else is delegated
+    def __init__(self, datasource, metrics, column):
+        self.datasource = datasource
+        self.metrics = metrics
+        self.column = column
+        self.interval = getattr(datasource, 'interval', None)
+        self.chunk_size = getattr(datasource, 'chunk_size', None)
+
+    def set_interval(self, start, end):
+        self.interval = (start, end)
+        self.datasource.set_interval(start, end)
+
+    def get_data(self, training=False):
+        data = self.datasource.get_data(training=training)
+        if not training:
+            self.metrics.label = data[self.column]
+        return data
+
+    def iter_data(self, training=False, chunk_size=None):
+        for chunk in self.datasource.iter_data(training=training, chunk_size=chunk_size or self.chunk_size):
+            if not training:
+                self.metrics.add_labels(chunk[self.column])
+            yield chunk
+
+    @property
+    def label(self):
+        return self.datasource.label
+
+    @property
+    def features(self):
+        return self.datasource.features
+
+    def __getattr__(self, name):
+        if name == 'datasource':
+            raise AttributeError(name)
+        return getattr(self.datasource, name)
+
+
+def _correlation(x, y):
+    if len(x) < 2 or np.std(x) == 0 or np.std(y) == 0:
+        return float('nan')
+    return float(np.corrcoef(x, y)[0, 1])
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+
+CALENDARS = ['D', 'B', 'C']
+WINDOW_TYPES = ['sliding', 'expanding']
+
+
+def make_calendar(calendar='D', holidays=None):
+    # 'D' counts calendar days, 'B' business days and 'C' business days excluding holidays
+    if calendar not in CALENDARS:
+        raise ValueError(f'Calendar "{calendar}" is not supported, choose one of {CALENDARS}')
+    if calendar == 'D':
+        return pd.offsets.Day()
+    if calendar == 'B' and not holidays:
+        return pd.offsets.BDay()
+    return pd.offsets.CustomBusinessDay(holidays=holidays or [])
+
+
+def next_session(date, calendar='D', holidays=None):
+    # The first session of the calendar after date
+    return pd.Timestamp(date) + make_calendar(calendar, holidays)
+
+
+def plan_windows(start_date, end_date, train_period, gap_period, eval_period, recalibration_freq,
+                 calendar='D', holidays=None, window_type='sliding', min_eval_length=0, truncate_eval=True):
+    # Plan every rolling window at once. Periods are counted in sessions of the calendar.
+    # Window k fits on [fit_start, fit_end] and evaluates on [eval_start, eval_end], where
+    #   fit_start  = start + k * recalibration_freq (sliding) or start (expanding)
+    #   fit_end    = start + k * recalibration_freq + train_period
+    #   eval_start = fit_end + gap_period
+    #   eval_end   = eval_start + eval_period, cut at end_date when truncate_eval
+    # Windows are generated until one evaluates up to end_date. eval_length is the number of sessions
+    # in the closed eval interval, as in session_counts, windows with an eval_length below
+    # min_eval_length are dropped. Returns a DataFrame indexed by k.
+    if window_type not in WINDOW_TYPES:
+        raise ValueError(f'Window type "{window_type}" is not supported, choose one of {WINDOW_TYPES}')
+    for name, value in [('train_period', train_period), ('gap_period', gap_period), ('eval_period', eval_period)]:
+        if value < 0:
+            raise ValueError(f'{name} must not be negative')
+    if recalibration_freq < 1:
+        raise ValueError('recalibration_freq must be at least 1')
+
+    offset = make_calendar(calendar, holidays)
+    start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    if end <= start:
+        raise ValueError(f'end_date {end.date()} must be after start_date {start.date()}')
+
+    # Position of the first session on or after end_date
+    to_end = pd.date_range(start, end, freq=offset)
+    end_pos = len(to_end) - 1 if len(to_end) and to_end[-1] == end else len(to_end)
+
+    # Number of windows: the last one is the first whose eval interval reaches end_date
+    horizon = train_period + gap_period + eval_period
+    n_windows = max(0, -(-(end_pos - horizon) // recalibration_freq)) + 1
+    sessions = pd.date_range(start, periods=max((n_windows - 1) * recalibration_freq + horizon, end_pos) + 1, freq=offset)
+
+    k = np.arange(n_windows)
+    shift = k * recalibration_freq
+    fit_start_pos = np.zeros_like(shift) if window_type == 'expanding' else shift
+    fit_end_pos = shift + train_period
+    eval_start_pos = fit_end_pos + gap_period
+    eval_end_pos = eval_start_pos + eval_period
+
+    eval_end = sessions[eval_end_pos]
+    if truncate_eval:
+        eval_end = eval_end.where(eval_end <= end, end)
+
+    plan = pd.DataFrame({
+        'fit_start': sessions[fit_start_pos],
+        'fit_end': sessions[fit_end_pos],
+        'eval_start': sessions[eval_start_pos],
+        'eval_end': eval_end,
+        'eval_length': sessions.searchsorted(eval_end, side='right') - eval_start_pos,
+    }, index=pd.Index(k, name='k'))
+
+    # Windows whose eval interval starts past end_date are empty
+    valid = (plan['eval_start'] <= plan['eval_end']) & (plan['eval_length'] >= min_eval_length)
+    plan = plan[valid.to_numpy()]
+    return plan.reset_index(drop=True).rename_axis('k')
+
+
+def plan_from_config(config):
+    # Window plan of a run config, for both single_window and rolling_window modes
+    if config['train_mode'] == 'single_window':
+        eval_start, eval_end = pd.to_datetime(config['eval_start_date']), pd.to_datetime(config['eval_end_date'])
+        sessions = pd.date_range(eval_start, eval_end, freq=make_calendar(config.get('calendar', 'D'), config.get('holidays')))
+        return pd.DataFrame({
+            'fit_start': [pd.to_datetime(config['train_start_date'])],
+            'fit_end': [pd.to_datetime(config['train_end_date'])],
+            'eval_start': [eval_start],
+            'eval_end': [eval_end],
+            'eval_length': [len(sessions)],
+        }, index=pd.Index([0], name='k'))
+
+    return plan_windows(config['start_date'], config['end_date'], config['train_period'], config['gap_period'],
+                        config['eval_period'], config['recalibration_freq'],
+                        calendar=config.get('calendar', 'D'), holidays=config.get('holidays'),
+                        window_type=config.get('window_type', 'sliding'), min_eval_length=config.get('min_eval_length', 0),
+                        truncate_eval=config.get('truncate_eval', True))
+
+
+def plan_to_intervals(plan):
+    # The runner's intervals dict: k -> {'fit': (start, end), 'eval': (start, end)}
+    return {int(k): {'fit': (row.fit_start, row.fit_end), 'eval': (row.eval_start, row.eval_end)}
+            for k, row in zip(plan.index, plan.itertuples(index=False))}
+
+
+def session_counts(plan, calendar='D', holidays=None):
+    # Sessions in the fit and eval interval of every window, and the sessions spanned by the whole plan
+    if plan.empty:
+        return pd.DataFrame({'fit_sessions': [], 'eval_sessions': []}, index=plan.index, dtype=int), 0
+    sessions = pd.date_range(plan['fit_start'].min(), plan['eval_end'].max(), freq=make_calendar(calendar, holidays))
+    counts = pd.DataFrame({
+        'fit_sessions': sessions.searchsorted(plan['fit_end'], side='right') - sessions.searchsorted(plan['fit_start']),
+        'eval_sessions': sessions.searchsorted(plan['eval_end'], side='right') - sessions.searchsorted(plan['eval_start']),
+    }, index=plan.index)
+    return counts, len(sessions)
@@ -1,102 +1,491 @@
+import json
 import os
-import pandas as pd
+import time
+import traceback
 
-from modelforge.utils.registry import object_from_registry
-from dask.distributed import Client
+from datetime import datetime
+
+from modelforge.core.artifacts import artifact_store, load_artifact, match_artifacts, save_artifact
+from modelforge.core.cache import CachedDatasource, MFDataCache, datasource_key, get_cache
+from modelforge.core.config import validate_config
+from modelforge.core.instrument import InstrumentedDatasource, get_instrument
+from modelforge.core.manifest import is_complete, remove_manifest, window_fingerprint, write_manifest
+from modelforge.core.metrics import MFRunMetrics, MFWindowMetrics
+from modelforge.core.planning import next_session, plan_to_intervals, session_counts
+from modelforge.core.scheduler import MFScheduler
+from modelforge.core.session import get_client
+from modelforge.core.sinks import get_sink
+from modelforge.core.sweep import combo_fingerprint, expand_sweep
+from modelforge.utils.registry import TIME_FORMAT, add_run_intervals, add_sweep_results, class_from_url, get_run_status, read_components, set_run_metrics, update_run_intervals, update_run_status
 
 class MFRunner:
     def __init__(self, config, distributed=False, dask_scheduler=None):
         self.config = config
-        # Make sure the json has all the required fields
-        required_fields = ['train_mode', 'model', 'model_params', 'output_dir']
-        for field in required_fields:
-            if field not in self.config:
-                raise ValueError(f'config file is missing required field {field}')
+        # Every problem of the config is reported at once, before anything is read.
+        # All windows are planned up front while checking it, see modelforge.core.planning
+        self.plan = validate_config(self.config)
 
-        #TODO - figure out how this works
+        # distributed runs windows on dask, on the cluster at dask_scheduler when one is given
         self.distributed = distributed
-        self.dask_scheduler = dask_scheduler
+        # The configured cluster, without one the dask backend starts a LocalCluster
+        self.dask_scheduler = dask_scheduler or self.config.get('dask_scheduler_address')
         self.intervals = dict()
 
-        #TODO - figure out how this works
-        # If distributed, create a dask client
-        if self.distributed:
-            self.client = Client(dask_scheduler)
-        
-        # Raise error if mode is not supported
-        if self.config['train_mode'] not in ['single_window', 'rolling_window']:
-            raise ValueError(f'Mode {self.config["train_mode"]} is not supported')
-        
-        if self.config['train_mode'] == 'rolling_window':
-            # Make sure the json has all the required fields
-            required_rolling_fields = ['start_date', 'end_date', 'train_period', 'gap_period', 'eval_period', 'recalibration_freq']
-            for field in required_rolling_fields:
-                if field not in self.config:
-                    raise ValueError(f'config file is missing required field {field} - required for rolling tests')
-
-            current_start = pd.to_datetime(self.config['start_date'])
-            total_end = pd.to_datetime(self.config['end_date'])
-
-            k = 0
-            while True:
-                train_start = current_start
-                train_end = train_start + pd.to_timedelta(days=self.config['train_period'])
-                test_start = train_end + pd.to_timedelta(days=self.config['gap_period'])
-                test_end = test_start + pd.to_timedelta(days=self.config['eval_period'])
-
-                test_end_cut = min(test_end, total_end)
-
-                train_interval = (train_start, train_end)
-                test_interval = (test_start, test_end_cut)
-
-                self.intervals[k] = {'fit': train_interval, 'eval': test_interval}
-
-                k += 1
-                current_start = current_start + pd.to_timedelta(days=self.config['recalibration_freq'])
-
-                if test_end >= total_end:
-                    break
-        else:
-            # Make sure the json has all the required fields
-            required_single_fields = ['train_start_date', 'train_end_date', 'eval_start_date', 'eval_end_date']
-            for field in required_single_fields:
-                if field not in self.config:
-                    raise ValueError(f'config file is missing required field {field} - required for rolling tests')
-                
-            train_interval = (pd.to_datetime(self.config['train_start_date']), pd.to_datetime(self.config['train_end_date']))
-            test_interval = (pd.to_datetime(self.config['eval_start_date']), pd.to_datetime(self.config['eval_end_date']))
-            self.intervals[0] = {'fit': train_interval, 'eval': test_interval}
-        
-        self.train()
+        # Scheduler settings: backend is one of 'local', 'process' or 'dask', runs on a cluster use dask
+        scheduler_config = self.config.get('scheduler', {})
+        self.backend = scheduler_config.get('backend', 'dask' if self.distributed or self.dask_scheduler else 'local')
+        self.max_workers = scheduler_config.get('max_workers')
+        self.max_in_flight = scheduler_config.get('max_in_flight')
+        self.retries = scheduler_config.get('retries', 0)
+        instrument = self.config.get('instrument')
+        if isinstance(instrument, dict) and instrument.get('memory') == 'tracemalloc' and self.backend == 'dask':
+            # dask workers run several windows at once in one process, see modelforge.core.instrument
+            raise ValueError('Instrument memory "tracemalloc" needs windows that run one at a time per process, '
+                             'use the local or process backend or memory "rss"')
+
+        # The dask client is shared per process and only connected when training starts
+        self.client = None
+        self.intervals = plan_to_intervals(self.plan)
     
     # TODO - needs to run in the runners folder
     def train(self):
-        self.datasource_class = object_from_registry(self.config['datasource'],os.path.join(self.config['database_path'],'registry.db'))
-        self.model_class = object_from_registry(self.config['datasource'],os.path.join(self.config['database_path'],'registry.db'))
+        # Both registry entries are read at once, registered code is extracted into the code
+        # store, ~/.modelforge/store unless store_path is set
+        components = read_components(self.config['model'], self.config['datasource'], self.config['database_path'])
+        model_url, model_class_name = components['models']
+        datasource_url, datasource_class_name = components['datasources']
+        store_path = self.config.get('store_path')
+        self.datasource_class = class_from_url(datasource_url, datasource_class_name, store_path=store_path)
+        self.model_class = class_from_url(model_url, model_class_name, store_path=store_path)
 
-        for k in self.intervals:
+        # Fingerprint every window by config, code version and bounds, on resume the
+        # windows whose outputs are complete and unchanged are skipped
+        self.param_sets = expand_sweep(self.config['model_params'], self.config['sweep']) if self.config.get('sweep') else None
+        if self.config.get('predict_only'):
+            self._attach_artifacts()
+        self.pending = []
+        skipped = []
+        for k in sorted(self.intervals):
             interval = self.intervals[k]
-            if self.distributed:
-                self.client.submit(self._train_interval, interval,k) #TODO - fix this
+            artifact = interval.get('artifact')
+            interval['fingerprint'] = window_fingerprint(self.config, interval, model_url, datasource_url,
+                                                         artifact=artifact['digest'] if artifact else None)
+            outpath = os.path.join(self.config['output_dir'],f'eval_{k}')
+            # Sweeps are resumed per parameter set, see _schedule_sweep
+            if self.config.get('resume') and self.param_sets is None and is_complete(outpath, interval['fingerprint']):
+                interval['model'] = None
+                interval['skipped'] = True
+                skipped.append(k)
             else:
-                trained_model = self._train_interval(interval,k)
-                self.intervals[k]['model'] = trained_model
+                self.pending.append(k)
+        if skipped:
+            print(f'Resuming: skipping {len(skipped)} completed windows, {len(self.pending)} left to run')
+
+        # Progress is written to the registry when the run is registered there
+        self.run_id = self.config.get('run_id')
+        if self.run_id is not None:
+            add_run_intervals(self.run_id, self.intervals, self.config['database_path'], keep=skipped)
+            update_run_intervals(self.run_id, skipped, self.config['database_path'], status='skipped')
+            update_run_status(self.run_id, 'running', self.config['database_path'])
+
+        # Window metrics are combined into run-level metrics as windows complete
+        self.run_metrics = MFRunMetrics(self.config['metrics']) if self.config.get('metrics') else None
+        try:
+            results = self._schedule()
+        except Exception:
+            if self.run_id is not None:
+                update_run_status(self.run_id, 'failed', self.config['database_path'])
+            raise
+
+        # Counted per window, a warm-start chain can fail part way through
+        failed = [k for k in self.pending if self.intervals[k].get('error') is not None]
+        if self.run_metrics is not None and self.param_sets is None:
+            self._finish_metrics(skipped)
+        if self.run_id is not None:
+            update_run_status(self.run_id, 'failed' if failed else 'completed', self.config['database_path'])
+        if failed:
+            raise RuntimeError(f'{len(failed)} of {len(self.pending)} windows failed after {self.retries + 1} attempts: {failed}')
+
+    def dry_run(self):
+        # What train would do, without extracting code or training: the registry entries, the
+        # window plan, the number of tasks and the data each window reads
+        report = {'components': read_components(self.config['model'], self.config['datasource'], self.config['database_path'])}
+        counts, span_sessions = session_counts(self.plan, self.config.get('calendar', 'D'), self.config.get('holidays'))
+        plan = self.plan.join(counts)
+        windows = len(plan)
+        report['plan'] = plan
+        report['windows'] = windows
+
+        if self.config.get('predict_only'):
+            self._attach_artifacts()
+            report['fits'], report['tasks'] = 0, windows
+        elif self.config.get('sweep'):
+            param_sets = len(expand_sweep(self.config['model_params'], self.config['sweep']))
+            batch_size = self.config['sweep'].get('batch_size') or param_sets
+            report['fits'], report['tasks'] = windows * param_sets, windows * -(-param_sets // batch_size)
+        elif self.config.get('warm_start'):
+            # Whether the model supports warm starts is only known once its code is loaded, without
+            # support every window is a task, so tasks is an upper bound and chains the lower one
+            self.pending = sorted(self.intervals)
+            report['fits'], report['tasks'] = windows, windows
+            report['chains'] = len(self._chains())
+        else:
+            report['fits'], report['tasks'] = windows, windows
+
+        # Sessions read per window, summed they are the sessions read without a data cache,
+        # span_sessions the sessions read at best with one, shared by overlapping windows
+        report['fit_sessions'] = int(counts['fit_sessions'].sum())
+        report['eval_sessions'] = int(counts['eval_sessions'].sum())
+        report['span_sessions'] = span_sessions
+        report['backend'] = self.backend
+        return report
+
+    def _finish_metrics(self, skipped):
+        # Windows skipped on resume count with the metrics they were stored with
+        if skipped and self.run_id is not None:
+            stored = get_run_status(self.run_id, self.config['database_path'])['intervals']
+            for window in stored:
+                if window['k'] in skipped and window['metrics'] is not None:
+                    self.run_metrics.add(window['metrics'])
+        self.metrics = self.run_metrics.result()
+        values = ', '.join(f'{name}={value:.6g}' for name, value in self.metrics['values'].items())
+        print(f'Run metrics over {self.metrics["windows"]} windows: {values}')
+        if self.run_id is not None:
+            set_run_metrics(self.run_id, self.metrics, self.config['database_path'])
+
+    def _schedule(self):
+        if self.backend == 'dask':
+            self.client = get_client(self.dask_scheduler)
+        scheduler = MFScheduler(backend=self.backend, client=self.client, max_workers=self.max_workers,
+                                max_in_flight=self.max_in_flight, retries=self.retries)
+        if self.config.get('predict_only'):
+            tasks = {k: (self.config, self.datasource_class, self.model_class, self.intervals[k], k) for k in self.pending}
+            return scheduler.run(predict_interval, tasks, on_submit=self._on_window_submit, on_complete=self._on_window_complete)
+        if self.param_sets is not None:
+            return self._schedule_sweep(scheduler)
+        if self._warm_start():
+            # Windows within a chain train one after another from the previous fit,
+            # separate chains still run in parallel
+            tasks = dict()
+            for chain in self._chains():
+                windows = [(k, self.intervals[k]) for k in chain]
+                tasks[chain[0]] = (self.config, self.datasource_class, self.model_class, windows)
+            return scheduler.run(train_chain, tasks, on_submit=self._on_chain_submit, on_complete=self._on_chain_complete)
+
+        tasks = {k: (self.config, self.datasource_class, self.model_class, self.intervals[k], k) for k in self.pending}
+        return scheduler.run(train_interval, tasks, on_submit=self._on_window_submit, on_complete=self._on_window_complete)
+
+    def _schedule_sweep(self, scheduler):
+        # Every (params, window) pair is one fit. The pairs of a window are batched into tasks of
+        # sweep.batch_size (all parameter sets by default) so the window's data is loaded once per task.
+        print(f'Sweeping {len(self.param_sets)} parameter sets over {len(self.pending)} windows')
+        batch_size = self.config['sweep'].get('batch_size') or len(self.param_sets)
+        self.sweep_results = dict()
+        self._sweep_batches = dict()
+        self._sweep_errors = dict()
+        self._sweep_tasks = dict()
+        tasks = dict()
+        for k in self.pending:
+            interval = self.intervals[k]
+            combos = []
+            for i, params in enumerate(self.param_sets):
+                fingerprint = combo_fingerprint(interval['fingerprint'], params)
+                outpath = os.path.join(sweep_output_dir(self.config, i), f'eval_{k}')
+                if self.config.get('resume') and is_complete(outpath, fingerprint):
+                    continue
+                combos.append((i, params, fingerprint))
+            batches = [combos[b:b + batch_size] for b in range(0, len(combos), batch_size)]
+            self._sweep_batches[k] = len(batches)
+            for b, batch in enumerate(batches):
+                tasks[(k, b)] = (self.config, self.datasource_class, self.model_class, interval, k, batch)
+                self._sweep_tasks[(k, b)] = batch
+            if not batches:
+                interval['skipped'] = True
+                if self.run_id is not None:
+                    update_run_intervals(self.run_id, [k], self.config['database_path'], status='skipped')
+        return scheduler.run(train_sweep_window, tasks, on_submit=self._on_sweep_submit, on_complete=self._on_sweep_complete)
+
+    def _on_sweep_submit(self, key, attempt):
+        self._on_window_submit(key[0], attempt)
+
+    def _on_sweep_complete(self, key, record):
+        k, b = key
+        if record['error'] is None:
+            results = record['result']
+        else:
+            print(f'Sweep batch {b} of window {k} failed after {record["attempts"]} attempts:\n{record["error"]}')
+            results = [(i, None, None) for i, _, _ in self._sweep_tasks[key]]
+        status = 'completed' if record['error'] is None else 'failed'
+        rows = []
+        for i, wall_time, metrics in results:
+            self.sweep_results[(i, k)] = {'params': self.param_sets[i], 'status': status, 'wall_time': wall_time, 'metrics': metrics}
+            rows.append((i, k, self.param_sets[i], status, wall_time, record['worker'], sweep_output_dir(self.config, i), record['error'], metrics))
+        if self.run_id is not None:
+            # Results are written to the registry as soon as each batch finishes
+            add_sweep_results(self.run_id, rows, self.config['database_path'])
+
+        # A window is done once all of its batches are, and failed if any of them failed
+        self._sweep_batches[k] -= 1
+        if record['error'] is not None:
+            self._sweep_errors.setdefault(k, record)
+        if self._sweep_batches[k] == 0:
+            self._on_window_complete(k, dict(self._sweep_errors.get(k, record), result=None))
+
+    def _attach_artifacts(self):
+        # Predict-only runs score each window with a model stored by a source run instead of training,
+        # predict_only is {'source_run': run_id, 'match': 'window' | 'fit' | 'asof', 'mmap': true}
+        predict_only = self.config['predict_only']
+        if 'source_run' not in predict_only:
+            raise ValueError('predict_only config is missing required field source_run')
+        if self.config.get('sweep') or self.config.get('warm_start'):
+            raise ValueError('predict_only runs can not be combined with sweep or warm_start')
+        source = get_run_status(predict_only['source_run'], self.config['database_path'])
+        matched = match_artifacts(self.intervals, source['intervals'], predict_only.get('match', 'window'))
+        for k, artifact in matched.items():
+            self.intervals[k]['artifact'] = artifact
+        print(f'Scoring {len(matched)} windows with models stored by run "{predict_only["source_run"]}"')
+
+    def _warm_start(self):
+        if not self.config.get('warm_start'):
+            return False
+        if not self.model_class.supports_warm_start:
+            print(f'Model {self.config["model"]} does not support warm starts, training every window from scratch')
+            return False
+        return True
+
+    def _chains(self):
+        # 'warm_start' is either true (one chain over all windows) or {'chain_length': n}
+        ks = self.pending
+        chain_length = len(ks)
+        if isinstance(self.config['warm_start'], dict):
+            chain_length = self.config['warm_start'].get('chain_length') or len(ks)
+        return [ks[i:i + chain_length] for i in range(0, len(ks), chain_length)]
+
+    def _on_window_submit(self, k, attempt):
+        if self.run_id is None:
+            return
+        # In-process windows start as soon as they are submitted, otherwise they queue on the backend
+        status = 'running' if self.backend == 'local' else 'submitted'
+        update_run_intervals(self.run_id, [k], self.config['database_path'], status=status,
+                             start_time=datetime.now().strftime(TIME_FORMAT), error=None)
+
+    def _on_window_complete(self, k, record):
+        result = record['result'] or dict()
+        self.intervals[k]['model'] = result.get('model')
+        if result.get('artifact') is not None:
+            self.intervals[k]['artifact'] = result['artifact']
+        self.intervals[k]['metrics'] = result.get('metrics')
+        if result.get('metrics') is not None:
+            self.run_metrics.add(result['metrics'])
+        self.intervals[k]['instrumentation'] = result.get('instrumentation')
+        self.intervals[k]['wall_time'] = record['wall_time']
+        self.intervals[k]['attempts'] = record['attempts']
+        self.intervals[k]['error'] = record['error']
+        if record['error'] is None:
+            print(f'Window {k} finished in {record["wall_time"]:.2f}s on {record["worker"]}')
+        else:
+            print(f'Window {k} failed after {record["attempts"]} attempts:\n{record["error"]}')
+
+        if self.run_id is not None:
+            fields = dict(status='completed' if record['error'] is None else 'failed', end_time=_format_time(record['end_time']),
+                          duration=record['wall_time'], worker=record['worker'], error=record['error'])
+            if record['start_time'] is not None:
+                fields['start_time'] = _format_time(record['start_time'])
+            instrumentation = result.get('instrumentation')
+            if instrumentation is not None:
+                fields.update(timings=json.dumps(instrumentation['spans']), peak_memory=instrumentation['peak_memory'],
+                              profile_path=instrumentation['profile'])
+            if result.get('artifact') is not None:
+                fields.update(artifact=result['artifact']['digest'], artifact_path=result['artifact']['path'])
+            if result.get('metrics') is not None:
+                fields['metrics'] = json.dumps(result['metrics'])
+            update_run_intervals(self.run_id, [k], self.config['database_path'], **fields)
+
+    def _on_chain_submit(self, first_k, attempt):
+        for k in self._chain_of(first_k):
+            self._on_window_submit(k, attempt)
+
+    def _on_chain_complete(self, first_k, record):
+        # A chain stops at its first failed window, the windows before it keep their results
+        windows = record['result'] or dict()
+        failed = None
+        for k in self._chain_of(first_k):
+            if k in windows:
+                self._on_window_complete(k, dict(record, **windows[k]))
+                if windows[k]['error'] is not None:
+                    failed = k
+            else:
+                error = record['error'] or f'Not trained: window {failed} of its warm-start chain failed'
+                self._on_window_complete(k, dict(record, result=None, error=error))
+
+    def _chain_of(self, first_k):
+        return next(chain for chain in self._chains() if chain[0] == first_k)
 
     def _train_interval(self,interval,k):
-            outpath = os.path.join(self.config['output_dir'],f'eval_{k}')
+        return train_interval(self.config, self.datasource_class, self.model_class, interval, k)
+
+
+def _format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime(TIME_FORMAT)
+
+
+def sweep_output_dir(config, i):
+    return os.path.join(config['output_dir'], f'sweep_{i}')
+
+
+def train_sweep_window(config, datasource_class, model_class, interval, k, batch):
+    # Fit every (i, params, fingerprint) of batch on one window. All fits share one datasource
+    # whose train and eval data are loaded once.
+    datasource = make_datasource(config, datasource_class)
+    if not isinstance(datasource, CachedDatasource):
+        datasource = CachedDatasource(datasource, MFDataCache(chunk_freq=None), datasource_key(datasource_class, config.get('datasource_params',{})))
+    results = []
+    for i, params, fingerprint in batch:
+        t0 = time.perf_counter()
+        combo_config = dict(config, model_params=params, output_dir=sweep_output_dir(config, i))
+        result = train_interval(combo_config, datasource_class, model_class, dict(interval, fingerprint=fingerprint), k, datasource=datasource)
+        results.append((i, time.perf_counter() - t0, result['metrics']))
+    return results
+
+
+def train_chain(config, datasource_class, model_class, windows):
+    # Train consecutive windows, each one warm started from the previous window's model.
+    # A failing window is retried like a task, once it fails for good the chain stops there as
+    # the windows after it have no model to start from.
+    # Returns {k: {'result', 'wall_time', 'attempts', 'error'}} of the windows that were trained.
+    retries = config.get('scheduler', {}).get('retries', 0)
+    results = dict()
+    previous = None
+    for k, interval in windows:
+        for attempt in range(1, retries + 2):
+            t0 = time.perf_counter()
+            try:
+                model_instance, result = _train_window(config, datasource_class, model_class, interval, k, previous, None)
+                error = None
+                break
+            except Exception:
+                model_instance, result, error = None, None, traceback.format_exc()
+        results[k] = {'result': result, 'wall_time': time.perf_counter() - t0, 'attempts': attempt, 'error': error}
+        if error is not None:
+            break
+        previous = (model_instance, interval)
+    return results
+
+
+def make_datasource(config, datasource_class):
+    datasource_params = config.get('datasource_params',{})
+    datasource = datasource_class(params=datasource_params)
+    if config.get('data_cache'):
+        # Overlapping windows trained in the same process share loaded chunks
+        datasource = CachedDatasource(datasource, get_cache(config['data_cache']), datasource_key(datasource_class, datasource_params))
+    datasource.chunk_size = config.get('stream_chunk_size')
+    return datasource
+
 
-            train_start, train_end = interval['fit']
-            eval_start, eval_end = interval['eval']
+def train_interval(config, datasource_class, model_class, interval, k, previous=None, datasource=None):
+    # Train and evaluate a single window. Module level so it can be shipped to workers.
+    # previous is an optional (model, interval) pair of the preceding window to warm start from,
+    # datasource an optional datasource to reuse instead of creating one.
+    # Returns {'model', 'artifact', 'metrics', 'instrumentation'}. With an artifact store the model is only
+    # stored, not returned, so fitted models are not held in memory for the whole run.
+    return _train_window(config, datasource_class, model_class, interval, k, previous, datasource)[1]
 
-            datasource = self.datasource_class(params=self.config.get('datasource_params',{}))
-            datasource.set_interval(train_start, train_end)
 
-            model_instance = self.model_class(params=self.config['model_params'])
-            model_instance.train(datasource)
+def predict_interval(config, datasource_class, model_class, interval, k):
+    # Score window k with the stored model interval['artifact'] instead of training one
+    predict_only = config['predict_only']
+    instrument = get_instrument(config, k)
+    with instrument.window():
+        outpath = _prepare_output(config, k)
+        with instrument.span('load'):
+            model_instance = load_artifact(interval['artifact']['path'], mmap=predict_only.get('mmap', True))
+        datasource = _window_datasource(config, datasource_class, None, instrument)
+        written, metrics = _predict_window(config, model_instance, datasource, interval, k, instrument)
+        if 'fingerprint' in interval:
+            write_manifest(outpath, interval['fingerprint'], written)
+    return {'model': None, 'artifact': interval['artifact'], 'metrics': metrics, 'instrumentation': instrument.metrics()}
 
-            datasource.set_interval(eval_start, eval_end)
-            test_pred = model_instance.predict_batch(datasource)
-            test_pred.to_hdf(os.path.join(outpath,'pred.h5'), key='data', mode='w')
 
-            model_instance.save(outpath)
-            return model_instance
+def _train_window(config, datasource_class, model_class, interval, k, previous, datasource):
+    # Returns (model, result), chains keep the model to warm start the next window from
+    instrument = get_instrument(config, k)
+    store_path = artifact_store(config)
+    with instrument.window():
+        outpath = _prepare_output(config, k)
+        datasource = _window_datasource(config, datasource_class, datasource, instrument)
+        datasource.set_interval(*interval['fit'])
+
+        model_instance = model_class(params=config['model_params'])
+        with instrument.span('train'):
+            if previous is None:
+                model_instance.train(datasource)
+            else:
+                previous_model, previous_interval = previous
+                # Both bounds are inclusive, the new data starts one session after the previous fit
+                new_start = next_session(previous_interval['fit'][1], config.get('calendar', 'D'), config.get('holidays'))
+                new_interval = (max(new_start, interval['fit'][0]), interval['fit'][1])
+                model_instance.train_from(previous_model, datasource, new_interval)
+
+        written, metrics = _predict_window(config, model_instance, datasource, interval, k, instrument)
+
+        # With an artifact store the model is saved once, there
+        artifact = None
+        if store_path is None:
+            with instrument.span('save'):
+                model_instance.save(outpath)
+        else:
+            with instrument.span('artifact'):
+                artifact = save_artifact(model_instance, store_path)
+            written = written + [artifact['path']]
+        if 'fingerprint' in interval:
+            write_manifest(outpath, interval['fingerprint'], written)
+    result = {'model': model_instance if artifact is None else None, 'artifact': artifact, 'metrics': metrics,
+              'instrumentation': instrument.metrics()}
+    return model_instance, result
+
+
+def _prepare_output(config, k):
+    outpath = os.path.join(config['output_dir'],f'eval_{k}')
+    os.makedirs(outpath, exist_ok=True)
+    # The window only counts as complete again once all its outputs are rewritten
+    remove_manifest(outpath)
+    return outpath
+
+
+def _window_datasource(config, datasource_class, datasource, instrument):
+    if datasource is None:
+        with instrument.span('datasource'):
+            datasource = make_datasource(config, datasource_class)
+    if instrument.enabled:
+        datasource = InstrumentedDatasource(datasource, instrument)
+    return datasource
+
+
+def _predict_window(config, model_instance, datasource, interval, k, instrument):
+    # Predict the eval interval, score it and write it to the run's sink.
+    # Returns the written paths and the window's metrics (None without 'metrics' in the config).
+    datasource.set_interval(*interval['eval'])
+    chunk_size = config.get('stream_chunk_size')
+    window_metrics = None
+    if config.get('metrics'):
+        # Labels are taken from the data the model reads, streamed windows never hold the whole interval
+        window_metrics = MFWindowMetrics(config['metrics'])
+        datasource = window_metrics.label_tap(datasource)
+    with instrument.span('predict'):
+        if chunk_size:
+            # Predictions are written as they arrive so memory is bounded by the chunk size,
+            # the chunks are only computed inside the write span
+            predictions = model_instance.predict_stream(datasource, chunk_size=chunk_size)
+        else:
+            predictions = model_instance.predict_batch(datasource)
+
+    if config.get('metrics'):
+        # Scored while the predictions are in memory, streamed chunks are scored as they pass to the sink
+        with instrument.span('metrics'):
+            if chunk_size:
+                predictions = window_metrics.tap(predictions)
+            else:
+                window_metrics.update(predictions)
+    with instrument.span('write'):
+        written = get_sink(config).write(k, predictions, metadata={'fit': interval['fit'], 'eval': interval['eval']})
+    return written, None if window_metrics is None else window_metrics.result()
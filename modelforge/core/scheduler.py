@@ -0,0 +1,132 @@
+import os
+import socket
+import time
+import traceback
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+BACKENDS = ['local', 'process', 'dask']
+
+
+def timed_call(fn, *args):
+    # Runs on the worker: returns the result together with timing and worker info
+    start = time.time()
+    t0 = time.perf_counter()
+    result = fn(*args)
+    wall_time = time.perf_counter() - t0
+    return {
+        'result': result,
+        'start_time': start,
+        'end_time': time.time(),
+        'wall_time': wall_time,
+        'worker': f'{socket.gethostname()}:{os.getpid()}',
+    }
+
+
+class MFScheduler:
+    # Fans out independent window tasks to a backend and gathers them as they complete.
+    #   backend       - 'local' (in-process), 'process' (concurrent.futures pool) or 'dask'
+    #   client        - dask client, required for the 'dask' backend
+    #   max_workers   - size of the process pool (defaults to os.cpu_count())
+    #   max_in_flight - cap on the number of submitted but unfinished tasks
+    #   retries       - number of times a failed task is resubmitted
+    def __init__(self, backend='local', client=None, max_workers=None, max_in_flight=None, retries=0):
+        if backend not in BACKENDS:
+            raise ValueError(f'Scheduler backend "{backend}" is not supported, choose one of {BACKENDS}')
+        if backend == 'dask' and client is None:
+            raise ValueError('The dask backend requires a dask client')
+        self.backend = backend
+        self.client = client
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight
+        self.retries = retries
+
+    def _in_flight_limit(self):
+        if self.max_in_flight is not None:
+            return max(1, self.max_in_flight)
+        if self.backend == 'dask':
+            # Keep every worker thread busy with one task queued behind it
+            n_threads = sum(self.client.nthreads().values()) or 1
+            return 2 * n_threads
+        return 2 * self.max_workers
+
+    def run(self, fn, tasks, on_submit=None, on_complete=None):
+        # tasks is a dict of key -> args tuple, fn(*args) is called once per key.
+        # Returns a dict of key -> record with 'result', 'wall_time', 'start_time',
+        # 'end_time', 'worker', 'attempts' and 'error' (None on success).
+        # on_submit(key, attempt) and on_complete(key, record) are called on the caller's side.
+        if self.backend == 'local':
+            return self._run_local(fn, tasks, on_submit, on_complete)
+        if self.backend == 'process':
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                return self._run_pool(fn, tasks, executor.submit, _wait_futures, on_submit, on_complete)
+        return self._run_pool(fn, tasks, self._dask_submit, _wait_dask, on_submit, on_complete)
+
+    def _dask_submit(self, wrapper, fn, *args):
+        return self.client.submit(wrapper, fn, *args, pure=False)
+
+    def _run_local(self, fn, tasks, on_submit, on_complete):
+        results = dict()
+        for key, args in tasks.items():
+            for attempt in range(1, self.retries + 2):
+                if on_submit is not None:
+                    on_submit(key, attempt)
+                try:
+                    record = timed_call(fn, *args)
+                    record['error'] = None
+                except Exception:
+                    record = _failed_record(traceback.format_exc())
+                record['attempts'] = attempt
+                if record['error'] is None or attempt > self.retries:
+                    break
+                print(f'Task {key} failed (attempt {attempt}), retrying')
+            results[key] = record
+            if on_complete is not None:
+                on_complete(key, record)
+        return results
+
+    def _run_pool(self, fn, tasks, submit, wait_first, on_submit, on_complete):
+        results = dict()
+        queue = [(key, 1) for key in tasks]
+        queue.reverse()
+        pending = dict()
+        limit = self._in_flight_limit()
+
+        while queue or pending:
+            while queue and len(pending) < limit:
+                key, attempt = queue.pop()
+                if on_submit is not None:
+                    on_submit(key, attempt)
+                pending[submit(timed_call, fn, *tasks[key])] = (key, attempt)
+
+            for future in wait_first(list(pending)):
+                key, attempt = pending.pop(future)
+                try:
+                    record = future.result()
+                    record['error'] = None
+                except Exception:
+                    record = _failed_record(traceback.format_exc())
+                record['attempts'] = attempt
+                if record['error'] is not None and attempt <= self.retries:
+                    print(f'Task {key} failed (attempt {attempt}), retrying')
+                    queue.append((key, attempt + 1))
+                    continue
+                results[key] = record
+                if on_complete is not None:
+                    on_complete(key, record)
+        return results
+
+
+def _failed_record(error):
+    return {'result': None, 'start_time': None, 'end_time': time.time(), 'wall_time': None, 'worker': None, 'error': error}
+
+
+def _wait_futures(futures):
+    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+    return done
+
+
+def _wait_dask(futures):
+    from dask.distributed import wait as dask_wait
+    done, _ = dask_wait(futures, return_when='FIRST_COMPLETED')
+    return done
@@ -0,0 +1,131 @@
+import json
+import os
+import subprocess
+import sys
+import traceback
+import uuid
+
+from modelforge.utils.registry import set_run_job, update_run_status
+
+# One dask client per scheduler address per process, None is a LocalCluster started on first use
+_CLIENTS = dict()
+
+
+def get_client(address=None, **cluster_kwargs):
+    # Inside a dask task reuse the worker's own client instead of connecting again
+    if _on_worker():
+        from distributed import get_client as worker_client
+        return worker_client()
+
+    client = _CLIENTS.get(address)
+    if client is not None and client.status == 'running':
+        return client
+
+    from dask.distributed import Client, LocalCluster
+    if address is None:
+        print('No dask scheduler address configured, starting a LocalCluster')
+        client = Client(LocalCluster(**cluster_kwargs))
+    else:
+        client = Client(address)
+    _CLIENTS[address] = client
+    return client
+
+
+def close_clients():
+    for client in _CLIENTS.values():
+        cluster = client.cluster
+        client.close()
+        if cluster is not None:
+            cluster.close()
+    _CLIENTS.clear()
+
+
+def execute_run(runner_config):
+    # Entry point of a submitted run, either as a dask task or in a background process.
+    # The runner records its own progress, failures before it starts are recorded here.
+    from modelforge.core.runner import MFRunner
+
+    run_id = runner_config['run_id']
+    on_worker = _on_worker()
+    if on_worker:
+        # The runner waits on its own window tasks, so give this task's slot back to the worker
+        from distributed import rejoin, secede
+        secede()
+    try:
+        MFRunner(runner_config).train()
+    except Exception:
+        update_run_status(run_id, 'failed', runner_config['database_path'])
+        traceback.print_exc()
+        raise
+    finally:
+        if on_worker:
+            rejoin()
+    return run_id
+
+
+def submit_run(runner_config, address=None):
+    # Start a run without waiting for it. With a scheduler address (the argument or the config's
+    # dask_scheduler_address) the run is a named, published dask future that keeps running after
+    # this process exits and schedules its windows on the same cluster, otherwise it is a detached
+    # background process. Returns the job identifier, which is also stored on the run.
+    address = address or runner_config.get('dask_scheduler_address')
+    if address is not None:
+        runner_config = dict(runner_config, dask_scheduler_address=address)
+    run_id = runner_config['run_id']
+    db_path = runner_config['database_path']
+    # Marked before launching so the run's own status updates are never overwritten
+    update_run_status(run_id, 'submitted', db_path)
+    if address is None:
+        job = launch_background(runner_config)
+    else:
+        from dask.distributed import fire_and_forget
+        client = get_client(address)
+        # Every submission is a new task, the scheduler would hand back the result of an earlier
+        # attempt of the run (e.g. a failed one being resumed) under the same key
+        future = client.submit(execute_run, runner_config, key=f'{run_key(run_id)}-{uuid.uuid4().hex[:8]}', pure=False)
+        # Published futures are held by the scheduler, so the run survives this client disconnecting.
+        # The latest submission replaces the previous one under the run's name.
+        client.publish_dataset(future, name=run_key(run_id), override=True)
+        fire_and_forget(future)
+        job = f'dask:{future.key}@{address}'
+    set_run_job(run_id, job, db_path)
+    return job
+
+
+def launch_background(runner_config):
+    # Run in a new session so the run keeps going when the submitting shell exits.
+    # The config and the log are kept next to the run's outputs.
+    output_dir = runner_config['output_dir']
+    os.makedirs(output_dir, exist_ok=True)
+    config_path = os.path.join(output_dir, 'run_config.json')
+    with open(config_path, 'w') as f:
+        json.dump(runner_config, f, default=str)
+    log = open(os.path.join(output_dir, 'run.log'), 'a')
+    kwargs = {'start_new_session': True} if os.name == 'posix' else {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    process = subprocess.Popen([sys.executable, '-m', 'modelforge.core.session', config_path],
+                               stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, **kwargs)
+    log.close()
+    return f'pid:{process.pid}'
+
+
+def get_run_future(run_id, address):
+    # The published future of a run submitted to a dask scheduler
+    return get_client(address).get_dataset(run_key(run_id))
+
+
+def run_key(run_id):
+    return f'modelforge-run-{run_id}'
+
+
+def _on_worker():
+    try:
+        from distributed import get_worker
+        get_worker()
+        return True
+    except (ImportError, ValueError):
+        return False
+
+
+if __name__ == '__main__':
+    with open(sys.argv[1]) as f:
+        execute_run(json.load(f))
@@ -0,0 +1,165 @@
+import json
+import os
+import shutil
+
+from abc import ABC, abstractmethod
+
+import pandas as pd
+
+SINKS = ['hdf', 'parquet']
+
+
+class MFPredictionSink(ABC):
+    # Destination for the predictions of each window. write is called on the worker with either a
+    # single frame or an iterable of chunks, and returns the paths of the files it wrote.
+    @abstractmethod
+    def write(self, k, predictions, metadata):
+        pass
+
+
+class HDFSink(MFPredictionSink):
+    # One HDF5 file per window at <output_dir>/eval_<k>/pred.h5
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+
+    def write(self, k, predictions, metadata):
+        path = os.path.join(self.output_dir, f'eval_{k}', 'pred.h5')
+        if isinstance(predictions, (pd.DataFrame, pd.Series)):
+            predictions.to_hdf(path, key='data', mode='w')
+            return [path]
+        # Chunks are appended to a single table as they arrive
+        with pd.HDFStore(path, mode='w') as store:
+            for chunk in predictions:
+                store.append('data', _to_pandas(chunk))
+            if 'data' not in store:
+                # No chunks, readers still find the key
+                store.put('data', pd.DataFrame())
+        return [path]
+
+
+class ParquetSink(MFPredictionSink):
+    # Hive-partitioned Parquet dataset shared by every window of every run:
+    #   <output_dir>/predictions/run_id=<run_id>/window=<k>/part-<n>.parquet
+    #   <output_dir>/predictions/_windows/run_id=<run_id>/window=<k>.json
+    # Windows write to their own partition so workers never share a file. The date index is
+    # stored as the date_column column so readers can filter on it.
+    def __init__(self, output_dir, run_id, date_column='date'):
+        self.root = os.path.join(output_dir, 'predictions')
+        self.run_id = run_id
+        self.date_column = date_column
+
+    def write(self, k, predictions, metadata):
+        _require_pyarrow()
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        partition = os.path.join(self.root, f'run_id={self.run_id}', f'window={k}')
+        # A retried or resumed window replaces its previous partition
+        shutil.rmtree(partition, ignore_errors=True)
+        os.makedirs(partition)
+
+        if isinstance(predictions, (pd.DataFrame, pd.Series)):
+            predictions = [predictions]
+        paths = []
+        for i, chunk in enumerate(predictions):
+            table = pa.Table.from_pandas(self._to_frame(chunk), preserve_index=False)
+            path = os.path.join(partition, f'part-{i:05d}.parquet')
+            pq.write_table(table, path)
+            paths.append(path)
+
+        metadata_path = os.path.join(self.root, '_windows', f'run_id={self.run_id}', f'window={k}.json')
+        os.makedirs(os.path.dirname(metadata_path), exist_ok=True)
+        with open(metadata_path, 'w') as f:
+            json.dump(dict(metadata, k=k, run_id=self.run_id, files=[os.path.relpath(p, self.root) for p in paths]), f, default=str)
+        return paths + [metadata_path]
+
+    def _to_frame(self, chunk):
+        frame = _to_pandas(chunk)
+        if isinstance(frame, pd.Series):
+            frame = frame.to_frame(frame.name if frame.name is not None else 'prediction')
+        if isinstance(frame.index, pd.DatetimeIndex) or frame.index.name is not None:
+            frame = frame.rename_axis(frame.index.name or self.date_column).reset_index()
+        return frame
+
+
+def get_sink(config):
+    sink = config.get('prediction_sink', 'hdf')
+    if sink == 'hdf':
+        return HDFSink(config['output_dir'])
+    if sink == 'parquet':
+        return ParquetSink(config['output_dir'], config.get('run_id', 'default'), config.get('prediction_date_column', 'date'))
+    raise ValueError(f'Prediction sink "{sink}" is not supported, choose one of {SINKS}')
+
+
+def read_predictions(output_dir, run_id=None, windows=None, start=None, end=None, date_column='date', engine='pandas'):
+    # Read a Parquet prediction dataset as one frame. Run, window and date filters are pushed
+    # down to the scan so only matching partitions and row groups are read. engine='dask'
+    # returns a lazy dask dataframe.
+    root = os.path.join(output_dir, 'predictions')
+    filters = []
+    if run_id is not None:
+        filters.append(('run_id', '==', str(run_id)))
+    if windows is not None:
+        filters.append(('window', 'in', [int(k) for k in windows]))
+    if start is not None:
+        filters.append((date_column, '>=', pd.Timestamp(start)))
+    if end is not None:
+        filters.append((date_column, '<=', pd.Timestamp(end)))
+
+    if engine not in ['pandas', 'dask']:
+        raise ValueError(f'Engine "{engine}" is not supported, choose "pandas" or "dask"')
+    _require_pyarrow()
+    if engine == 'dask':
+        # One lazy partition per file. The run_id and window partitions are always read with the
+        # types they are written with, a numeric looking run_id stays a string.
+        import dask
+        import dask.dataframe as dd
+        dataset = _prediction_dataset(root)
+        meta = dataset.schema.empty_table().to_pandas()
+        paths = [fragment.path for fragment in dataset.get_fragments(filter=_filter_expression(filters))]
+        if not paths:
+            return dd.from_pandas(meta, npartitions=1)
+        return dd.from_delayed([dask.delayed(_read_files)(root, [path], filters) for path in paths], meta=meta)
+    return _read_files(root, None, filters)
+
+
+def read_window_metadata(output_dir, run_id):
+    # Metadata of every window written by a run, keyed by window
+    directory = os.path.join(output_dir, 'predictions', '_windows', f'run_id={run_id}')
+    windows = dict()
+    for name in os.listdir(directory):
+        with open(os.path.join(directory, name)) as f:
+            metadata = json.load(f)
+        windows[metadata['k']] = metadata
+    return dict(sorted(windows.items()))
+
+
+def _read_files(root, paths, filters):
+    # Reads the dataset at root, or only the given files of it, as one frame
+    return _prediction_dataset(root, paths).to_table(filter=_filter_expression(filters)).to_pandas()
+
+
+def _prediction_dataset(root, paths=None):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    partitioning = ds.partitioning(pa.schema([('run_id', pa.string()), ('window', pa.int64())]), flavor='hive')
+    return ds.dataset(paths or root, format='parquet', partitioning=partitioning, partition_base_dir=root)
+
+
+def _filter_expression(filters):
+    from pyarrow.parquet import filters_to_expression
+    return filters_to_expression(filters) if filters else None
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError('The Parquet prediction sink needs pyarrow, install it with "pip install modelforge[parquet]"') from None
+
+
+def _to_pandas(chunk):
+    if isinstance(chunk, (pd.DataFrame, pd.Series)):
+        return chunk
+    return pd.DataFrame(chunk)
@@ -0,0 +1,54 @@
+import hashlib
+import itertools
+import json
+import math
+import random
+
+SWEEP_METHODS = ['grid', 'random']
+
+
+def expand_sweep(model_params, sweep):
+    # Expand the 'sweep' section of a run config into a list of full model_params dicts.
+    #   {'method': 'grid', 'params': {'alpha': [0.1, 1.0], 'depth': [3, 5]}}
+    #   {'method': 'random', 'n_iter': 20, 'seed': 0,
+    #    'params': {'alpha': {'distribution': 'loguniform', 'low': 1e-3, 'high': 1.0},
+    #               'depth': {'distribution': 'int', 'low': 2, 'high': 8}, 'loss': ['l1', 'l2']}}
+    # Swept values override the same keys of model_params.
+    method = sweep.get('method', 'grid')
+    space = sweep.get('params', {})
+    if not space:
+        raise ValueError('sweep config has no "params" to sweep over')
+
+    if method == 'grid':
+        for name, values in space.items():
+            if not isinstance(values, list):
+                raise ValueError(f'grid sweep parameter "{name}" must be a list of values')
+        names = list(space)
+        combos = [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+    elif method == 'random':
+        rng = random.Random(sweep.get('seed'))
+        combos = [{name: _sample(rng, name, values) for name, values in space.items()} for _ in range(sweep.get('n_iter', 10))]
+    else:
+        raise ValueError(f'Sweep method "{method}" is not supported, choose one of {SWEEP_METHODS}')
+
+    return [dict(model_params, **combo) for combo in combos]
+
+
+def combo_fingerprint(window_fingerprint, params):
+    # Fingerprint of one parameter set on one window, see modelforge.core.manifest
+    data = json.dumps({'window': window_fingerprint, 'params': params}, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def _sample(rng, name, values):
+    if isinstance(values, list):
+        return rng.choice(values)
+    distribution = values.get('distribution', 'uniform')
+    low, high = values['low'], values['high']
+    if distribution == 'uniform':
+        return rng.uniform(low, high)
+    if distribution == 'loguniform':
+        return math.exp(rng.uniform(math.log(low), math.log(high)))
+    if distribution == 'int':
+        return rng.randint(low, high)
+    raise ValueError(f'Unknown distribution "{distribution}" for sweep parameter "{name}"')
@@ -0,0 +1,143 @@
+import os
+import sqlite3
+import threading
+
+from contextlib import contextmanager
+
+REGISTRY_FILE = 'registry.db'
+
+# Declared registry schema. Each entry is one migration, applied in order and tracked in
+# PRAGMA user_version, so existing registries are upgraded in place on first connection.
+MIGRATIONS = [
+    [
+        'CREATE TABLE IF NOT EXISTS models (name TEXT, url TEXT, class_name TEXT)',
+        'CREATE TABLE IF NOT EXISTS datasources (name TEXT, url TEXT, class_name TEXT)',
+        'CREATE TABLE IF NOT EXISTS runs (run_id TEXT, run_config_data TEXT, status TEXT, start_time TEXT, output_path TEXT)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS models_name ON models (name)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS datasources_name ON datasources (name)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS runs_run_id ON runs (run_id)',
+        'CREATE INDEX IF NOT EXISTS runs_status ON runs (status)',
+    ],
+    [
+        'ALTER TABLE runs ADD COLUMN end_time TEXT',
+        'CREATE TABLE IF NOT EXISTS run_intervals (run_id TEXT NOT NULL, k INTEGER NOT NULL, fit_start TEXT, fit_end TEXT, '
+        'eval_start TEXT, eval_end TEXT, status TEXT, start_time TEXT, end_time TEXT, duration REAL, worker TEXT, error TEXT, '
+        'PRIMARY KEY (run_id, k))',
+        'CREATE INDEX IF NOT EXISTS run_intervals_status ON run_intervals (run_id, status)',
+    ],
+    [
+        'CREATE TABLE IF NOT EXISTS sweep_results (run_id TEXT NOT NULL, combo INTEGER NOT NULL, k INTEGER NOT NULL, params TEXT, '
+        'status TEXT, duration REAL, worker TEXT, output_path TEXT, error TEXT, PRIMARY KEY (run_id, combo, k))',
+    ],
+    [
+        'ALTER TABLE runs ADD COLUMN job TEXT',
+    ],
+    [
+        'ALTER TABLE run_intervals ADD COLUMN timings TEXT',
+        'ALTER TABLE run_intervals ADD COLUMN peak_memory INTEGER',
+        'ALTER TABLE run_intervals ADD COLUMN profile_path TEXT',
+    ],
+    [
+        'ALTER TABLE run_intervals ADD COLUMN artifact TEXT',
+        'ALTER TABLE run_intervals ADD COLUMN artifact_path TEXT',
+    ],
+    [
+        'ALTER TABLE run_intervals ADD COLUMN metrics TEXT',
+        'ALTER TABLE sweep_results ADD COLUMN metrics TEXT',
+        'ALTER TABLE runs ADD COLUMN metrics TEXT',
+    ],
+]
+
+# Columns made unique by the first migration
+UNIQUE_KEYS = {'models': 'name', 'datasources': 'name', 'runs': 'run_id'}
+
+# One connection per registry file per thread, reused for the life of the process
+_local = threading.local()
+
+
+def registry_file(db_path):
+    # Accept either the database directory or the registry file itself
+    if db_path.endswith('.db'):
+        return db_path
+    return os.path.join(db_path, REGISTRY_FILE)
+
+
+def get_connection(db_path):
+    path = os.path.abspath(registry_file(db_path))
+    connections = getattr(_local, 'connections', None)
+    if connections is None or _local.pid != os.getpid():
+        # Connections must not be shared with forked children
+        connections = _local.connections = dict()
+        _local.pid = os.getpid()
+    if path not in connections:
+        print(f'Connecting to database: {path}')
+        conn = sqlite3.connect(path, timeout=30)
+        # WAL lets readers continue while runs write their status
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        migrate(conn)
+        connections[path] = conn
+    return connections[path]
+
+
+def close_connections():
+    for conn in getattr(_local, 'connections', {}).values():
+        conn.close()
+    _local.connections = dict()
+
+
+@contextmanager
+def transaction(db_path):
+    # Commits on success and rolls back on error
+    conn = get_connection(db_path)
+    with conn:
+        yield conn
+
+
+def migrate(conn):
+    # Each migration runs in its own write transaction. The version is read again once the
+    # write lock is held, so processes opening a fresh registry together apply every step once.
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    while version < len(MIGRATIONS):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version < len(MIGRATIONS):
+                if version == 0:
+                    _check_unique(conn)
+                for statement in MIGRATIONS[version]:
+                    conn.execute(statement)
+                version += 1
+                conn.execute(f'PRAGMA user_version={version}')
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+
+def _check_unique(conn):
+    # Registries created before migrations may hold duplicate names, which the unique indexes
+    # of the first migration reject. They are reported rather than silently dropped.
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    duplicates = []
+    for table_name, column in UNIQUE_KEYS.items():
+        if table_name in tables:
+            rows = conn.execute(f'SELECT {column}, COUNT(*) FROM {table_name} GROUP BY {column} HAVING COUNT(*) > 1').fetchall()
+            duplicates += [f'{table_name}.{column}="{value}" ({count} rows)' for value, count in rows]
+    if duplicates:
+        raise ValueError('The registry can not be upgraded, these entries are not unique: ' + ', '.join(duplicates) +
+                         '. Remove or rename the duplicates and connect again.')
+
+
+def insert_many(db_path, table_name, columns, rows):
+    # Insert all rows in a single transaction
+    placeholders = ', '.join('?' for _ in columns)
+    with transaction(db_path) as conn:
+        conn.executemany(f'INSERT INTO {table_name} ({", ".join(columns)}) VALUES ({placeholders})', rows)
+
+
+def update_many(db_path, table_name, columns, key_column, rows):
+    # Each row holds the new values for columns followed by the value of key_column
+    assignments = ', '.join(f'{column}=?' for column in columns)
+    with transaction(db_path) as conn:
+        conn.executemany(f'UPDATE {table_name} SET {assignments} WHERE {key_column}=?', rows)
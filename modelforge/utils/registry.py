@@ -1,15 +1,17 @@
-import importlib
 import json
 import os
-import sqlite3
-
-import git
-import pandas as pd
 
 from datetime import datetime
 from pathlib import Path
 
-from modelforge.utils.repo import check_class, check_repo, get_github_file_url
+from modelforge.utils.database import get_connection, insert_many, update_many
+from modelforge.utils.repo import check_class, check_remote, check_repo, get_github_file_url, parse_file_url, same_repo
+
+# GitPython, pandas and the code store are imported where they are used to keep CLI startup fast
+
+
+TIME_FORMAT = "%d/%m/%Y %H:%M:%S"
+RUN_INTERVAL_COLUMNS = ['run_id', 'k', 'fit_start', 'fit_end', 'eval_start', 'eval_end', 'status', 'start_time', 'end_time', 'duration', 'worker', 'error', 'timings', 'peak_memory', 'profile_path', 'artifact', 'artifact_path', 'metrics']
 
 
 def relative_path(path1, path2):
@@ -18,17 +20,16 @@ def relative_path(path1, path2):
     return os.path.relpath(path2, path1)
 
 def connect_db(db_path):
-    print(f'Connecting to database: {db_path}')
-    conn = sqlite3.connect(os.path.join(db_path, 'registry.db'))
-    return conn
+    # Pooled connection to the registry, see modelforge.utils.database
+    return get_connection(db_path)
 
 def add_to_db(file, class_name, table_name, register_name, class_type, db_path):
     # Add a new model/ds to the registry
+    import git
     file = os.path.join(os.getcwd(), file)
     print(f'attempting to register {file}')
     conn = connect_db(db_path)
     c = conn.cursor()
-    c.execute(f'CREATE TABLE IF NOT EXISTS {table_name} (name TEXT, url TEXT, class_name TEXT)')
 
     # Check if datasource already exists in registry
     ds_check = c.execute(f'SELECT * FROM {table_name} WHERE name=?', (register_name,)).fetchone()
@@ -46,9 +47,8 @@ def add_to_db(file, class_name, table_name, register_name, class_type, db_path):
     file_path = relative_path(repo.working_dir, file).replace('\\','/')
     full_url = get_github_file_url(url, file_path, commit_hash)
 
-    c.execute(f'INSERT INTO {table_name} (name, url, class_name) VALUES (?, ?, ?)', (register_name, full_url, class_name))
-    conn.commit()
-    conn.close()
+    with conn:
+        c.execute(f'INSERT INTO {table_name} (name, url, class_name) VALUES (?, ?, ?)', (register_name, full_url, class_name))
 
 def read_from_db(table_name, register_name, db_path):
     # Read a model/ds from the registry
@@ -60,11 +60,11 @@ def read_from_db(table_name, register_name, db_path):
         print(f'Model "{register_name}" not found in registry.')
         return
     url, class_name = row[1], row[2]
-    conn.close()
     return url, class_name
 
 def update_db(file, class_name, table_name, register_name, class_type, db_path):
     # Update an existing model/ds in the registry
+    import git
     conn = connect_db(db_path)
     c = conn.cursor()
     c.execute(f'SELECT * FROM {table_name} WHERE name=?', (register_name,))
@@ -73,88 +73,249 @@ def update_db(file, class_name, table_name, register_name, class_type, db_path):
         print(f'Model "{register_name}" not found in registry.')
         return
     existing_url, existing_class_name = row[1], row[2]
-    existing_commit = existing_url.split('/')[-6]
-    existing_repo_url = existing_url.split('/blob')[0] + '.git'
+    existing_repo_url, existing_commit, _ = parse_file_url(existing_url)
     repo = git.Repo(file, search_parent_directories=True)
     url = repo.remote().url
     commit_hash = repo.head.object.hexsha
 
     check_class(file, class_name, class_type)
-    check_repo(repo, file, url, register_name)
+    # An entry is only ever updated from the repository it was registered from
+    check_repo(repo, file, existing_repo_url, register_name)
 
     file_path = relative_path(repo.working_dir, file).replace('\\','/')
     full_url = get_github_file_url(url, file_path, commit_hash)
 
-    if (existing_class_name == class_name) and (existing_commit == commit_hash) and (existing_repo_url == url):
+    if (existing_class_name == class_name) and (existing_commit == commit_hash) and same_repo(existing_repo_url, url):
         print(f'Model "{register_name}" is already up to date with the latest version on the remote repository.')
         return
     
-    c.execute(f'UPDATE {table_name} SET url=?, class_name=? WHERE name=?', (full_url, class_name, register_name))
-    conn.commit()
-    conn.close()
+    with conn:
+        c.execute(f'UPDATE {table_name} SET url=?, class_name=? WHERE name=?', (full_url, class_name, register_name))
     print(f'Model "{register_name}" updated in registry with URL "{full_url}" and commit hash "{commit_hash}".')
 
+def register_many(entries, table_name, class_type, db_path, update=False, max_workers=8):
+    # Add (or with update, update) many models/ds at once. entries are dicts with name, file and class_name.
+    # Every distinct repo is checked and fetched once, classes are checked in a thread pool and all
+    # rows are written in one transaction. Nothing is written unless every entry passes.
+    import git
+    from concurrent.futures import ThreadPoolExecutor
+
+    names = [entry['name'] for entry in entries]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f'Names registered more than once in the manifest: {duplicates}')
+    conn = connect_db(db_path)
+    existing = {row[0]: (row[1], row[2]) for row in conn.execute(f'SELECT name, url, class_name FROM {table_name}')}
+    errors = []
+    for name in names:
+        if update and name not in existing:
+            errors.append(f'"{name}" not found in registry.')
+        elif not update and name in existing:
+            errors.append(f'"{name}" already exists in registry.')
+    if errors:
+        raise ValueError('\n'.join(errors))
+
+    files = {entry['name']: os.path.abspath(entry['file']) for entry in entries}
+    repos = dict()
+    for entry in entries:
+        repo = git.Repo(files[entry['name']], search_parent_directories=True)
+        repos.setdefault(repo.working_dir, (repo, []))[1].append(entry)
+        if update:
+            # As in update_db, entries are only updated from the repository they were registered from
+            try:
+                check_remote(repo, files[entry['name']], parse_file_url(existing[entry['name']][0])[0], entry['name'])
+            except ValueError as e:
+                errors.append(f'"{entry["name"]}": {e}')
+    if errors:
+        raise ValueError('\n'.join(errors))
+
+    def verify_repo(item):
+        repo, repo_entries = item
+        url = repo.remote().url
+        check_repo(repo, files[repo_entries[0]['name']], url, repo_entries[0]['name'])
+        return url, repo.head.object.hexsha
+
+    def verify_class(entry):
+        check_class(files[entry['name']], entry['class_name'], class_type)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        repo_futures = {working_dir: pool.submit(verify_repo, item) for working_dir, item in repos.items()}
+        class_futures = {entry['name']: pool.submit(verify_class, entry) for entry in entries}
+
+    rows = []
+    for working_dir, (repo, repo_entries) in repos.items():
+        try:
+            url, commit_hash = repo_futures[working_dir].result()
+        except Exception as e:
+            errors.append(f'{working_dir}: {e}')
+            continue
+        for entry in repo_entries:
+            try:
+                class_futures[entry['name']].result()
+            except Exception as e:
+                errors.append(f'"{entry["name"]}": {e}')
+                continue
+            file_path = relative_path(working_dir, files[entry['name']]).replace('\\','/')
+            rows.append((entry['name'], get_github_file_url(url, file_path, commit_hash), entry['class_name']))
+    if errors:
+        raise ValueError('\n'.join(errors))
+
+    if update:
+        changed = [(full_url, class_name, name) for name, full_url, class_name in rows if existing[name] != (full_url, class_name)]
+        update_many(db_path, table_name, ['url', 'class_name'], 'name', changed)
+        print(f'Updated {len(changed)} of {len(rows)} entries in {table_name}, the others are up to date.')
+    else:
+        insert_many(db_path, table_name, ['name', 'url', 'class_name'], rows)
+        print(f'Registered {len(rows)} entries in {table_name} from {len(repos)} repositories.')
+
 def list_db(table_name, db_path):
     # List all models in the registry
+    import pandas as pd
     conn = connect_db(db_path)
     df = pd.read_sql(f'SELECT * FROM {table_name}',conn)
     js = df.to_dict(orient='records')
     for x in js:
         print(x)
 
-def object_from_registry(name,table_name,db_path):
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-    c.execute(f'SELECT url, class_name FROM {table_name} WHERE name=?', (name,))
-    row = c.fetchone()
+def object_from_registry(name,table_name,db_path,store_path=None,**store_options):
+    conn = connect_db(db_path)
+    row = conn.execute(f'SELECT url, class_name FROM {table_name} WHERE name=?', (name,)).fetchone()
     if row is None:
         raise ValueError(f'Error: "{name}" not found in registry under table "{table_name}"')
-    url, class_name = row
-    conn.close()
-
-    base_url = '/'.join(url.split('/')[:-3])
-    repo_name = base_url.split('/')[-1]
-    commit_sha = url.split('/')[-2]
-
-    # Clone the repository to a local directory
-    repo_dir = f'{os.getcwd()}/{repo_name}'
-    if not os.path.exists(repo_dir):
-        repo = git.Repo.clone_from(base_url, repo_dir)
-        print(f'Cloned repository to {repo_dir}')
-    else:
-        repo = git.Repo(repo_dir)
-    repo.git.checkout(commit_sha)
+    return class_from_url(*row, store_path=store_path, **store_options)
 
-    module_path = url.split(f'{commit_sha}/')[-1].replace('.py', '').replace('/', '.')
-    module = importlib.import_module(f'{repo_name}.{module_path}')
+def class_from_url(url,class_name,store_path=None,**store_options):
+    # Each commit is extracted once into the local code store and resolved classes are memoized.
+    # store_options go to resolve_class, e.g. max_commits=None to never evict extracted commits.
+    from modelforge.utils.store import resolve_class
+    repo_url, commit_sha, file_path = parse_file_url(url)
+    return resolve_class(repo_url, commit_sha, file_path, class_name, store_path=store_path, **store_options)
 
-    # Get the model class from the module
-    cls = getattr(module, class_name)
-
-    return cls
+def read_components(model,datasource,db_path):
+    # The (url, class_name) of a model and a datasource in one query, raises ValueError naming any that are missing
+    rows = connect_db(db_path).execute(
+        "SELECT 'models', name, url, class_name FROM models WHERE name=? "
+        "UNION ALL SELECT 'datasources', name, url, class_name FROM datasources WHERE name=?", (model, datasource)).fetchall()
+    found = {table: (url, class_name) for table, _, url, class_name in rows}
+    missing = [f'{table[:-1]} "{name}"' for table, name in [('models', model), ('datasources', datasource)] if table not in found]
+    if missing:
+        raise ValueError(f'Not found in registry: {", ".join(missing)}')
+    return found
 
 
 def add_run(run_id,run_config,db_path):
     # Add a new run to the registry
-    conn = connect_db(db_path)
-    c = conn.cursor()
-    # create table with fields:
-    # run_id, run_config_data, status, fit_intervals, eval_intervals, start_time, output_path
     # run_id is a unique identifier for the run
     # run_config_data is the json data for the run config
     # status is the status of the run (running, completed, failed)
     # start_time is the start time of the run
     # output_path is the path to the output of the run
-    c.execute(f'CREATE TABLE IF NOT EXISTS runs (run_id TEXT, run_config_data TEXT, status TEXT, start_time TEXT, output_path TEXT)')
+    conn = connect_db(db_path)
     # Check if run already exists in registry
-    run_id = run_config['run_id']
-    run_check = c.execute(f'SELECT * FROM runs WHERE run_id=?', (run_id,)).fetchone()
+    run_check = conn.execute(f'SELECT run_id FROM runs WHERE run_id=?', (run_id,)).fetchone()
     if run_check is not None:
         raise ValueError(f'Run "{run_id}" already exists in registry.')
     # Insert run into registry
     run_config_data = json.dumps(run_config)
     now = datetime.now()
-    start_time = now.strftime("%d/%m/%Y %H:%M:%S")
-    c.execute(f'INSERT INTO runs (run_id, run_config_data, status, start_time) VALUES (?, ?, ?, ?)', (run_id, run_config_data, 'running', start_time))
-    conn.commit()
-    conn.close()
+    start_time = now.strftime(TIME_FORMAT)
+    output_path = run_config.get('user_config', {}).get('output_dir')
+    with conn:
+        conn.execute(f'INSERT INTO runs (run_id, run_config_data, status, start_time, output_path) VALUES (?, ?, ?, ?, ?)', (run_id, run_config_data, 'running', start_time, output_path))
+
+def get_run_config(run_id,db_path):
+    # The config a run was registered with
+    row = connect_db(db_path).execute('SELECT run_config_data FROM runs WHERE run_id=?', (run_id,)).fetchone()
+    if row is None:
+        raise ValueError(f'Run "{run_id}" not found in registry.')
+    return json.loads(row[0])
+
+def update_run_status(run_id,status,db_path):
+    # Move a run to a new status, finished runs also get an end time
+    end_time = datetime.now().strftime(TIME_FORMAT) if status in ('completed', 'failed') else None
+    with connect_db(db_path) as conn:
+        conn.execute('UPDATE runs SET status=?, end_time=? WHERE run_id=?', (status, end_time, run_id))
+
+def set_run_metrics(run_id,metrics,db_path):
+    # Run-level metrics, see modelforge.core.metrics
+    with connect_db(db_path) as conn:
+        conn.execute('UPDATE runs SET metrics=? WHERE run_id=?', (json.dumps(metrics), run_id))
+
+def set_run_job(run_id,job,db_path):
+    # Where a submitted run executes, e.g. 'dask:<key>@<scheduler>' or 'pid:<pid>'
+    with connect_db(db_path) as conn:
+        conn.execute('UPDATE runs SET job=? WHERE run_id=?', (job, run_id))
+
+def add_run_intervals(run_id,intervals,db_path,keep=()):
+    # Register every window of a run as pending, intervals maps k -> {'fit': (start, end), 'eval': (start, end)}.
+    # Windows in keep (skipped on resume) keep the timings, artifacts and metrics they were stored with,
+    # the records of every other window are replaced.
+    keep = {int(k) for k in keep}
+    rows = [(run_id, int(k), str(v['fit'][0]), str(v['fit'][1]), str(v['eval'][0]), str(v['eval'][1]), 'pending')
+            for k, v in intervals.items()]
+    with connect_db(db_path) as conn:
+        conn.executemany('INSERT OR REPLACE INTO run_intervals (run_id, k, fit_start, fit_end, eval_start, eval_end, status) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?)', [row for row in rows if row[1] not in keep])
+        conn.executemany('INSERT INTO run_intervals (run_id, k, fit_start, fit_end, eval_start, eval_end, status) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (run_id, k) DO UPDATE SET fit_start=excluded.fit_start, '
+                         'fit_end=excluded.fit_end, eval_start=excluded.eval_start, eval_end=excluded.eval_end, status=excluded.status',
+                         [row for row in rows if row[1] in keep])
+
+def update_run_intervals(run_id,ks,db_path,**fields):
+    # Set the same fields (status, start_time, end_time, duration, worker, error, timings, ...) on windows ks
+    assignments = ', '.join(f'{column}=?' for column in fields)
+    rows = [(*fields.values(), run_id, int(k)) for k in ks]
+    with connect_db(db_path) as conn:
+        conn.executemany(f'UPDATE run_intervals SET {assignments} WHERE run_id=? AND k=?', rows)
+
+def list_runs(db_path,status=None):
+    # One row per run with its window counts by status
+    query = ('SELECT r.run_id, r.status, r.start_time, r.end_time, r.output_path, r.job, COUNT(i.k) AS windows, '
+             "SUM(i.status = 'completed') AS completed, SUM(i.status = 'failed') AS failed "
+             'FROM runs r LEFT JOIN run_intervals i ON i.run_id = r.run_id')
+    params = ()
+    if status is not None:
+        query += ' WHERE r.status=?'
+        params = (status,)
+    query += ' GROUP BY r.run_id ORDER BY r.rowid'
+    cursor = connect_db(db_path).execute(query, params)
+    columns = [d[0] for d in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def get_run_status(run_id,db_path):
+    # The run record and every window record of a run
+    conn = connect_db(db_path)
+    cursor = conn.execute('SELECT run_id, status, start_time, end_time, output_path, job, metrics FROM runs WHERE run_id=?', (run_id,))
+    row = cursor.fetchone()
+    if row is None:
+        raise ValueError(f'Run "{run_id}" not found in registry.')
+    run = dict(zip([d[0] for d in cursor.description], row))
+    if run['metrics'] is not None:
+        run['metrics'] = json.loads(run['metrics'])
+    cursor = conn.execute(f'SELECT {", ".join(RUN_INTERVAL_COLUMNS)} FROM run_intervals WHERE run_id=? ORDER BY k', (run_id,))
+    run['intervals'] = [dict(zip(RUN_INTERVAL_COLUMNS, row)) for row in cursor.fetchall()]
+    for interval in run['intervals']:
+        for column in ['timings', 'metrics']:
+            if interval[column] is not None:
+                interval[column] = json.loads(interval[column])
+    return run
+
+def add_sweep_results(run_id,rows,db_path):
+    # rows of (combo, k, params, status, duration, worker, output_path, error, metrics), one per fit
+    rows = [(run_id, int(i), int(k), json.dumps(params, default=str), *rest, None if metrics is None else json.dumps(metrics))
+            for i, k, params, *rest, metrics in rows]
+    with connect_db(db_path) as conn:
+        conn.executemany('INSERT OR REPLACE INTO sweep_results (run_id, combo, k, params, status, duration, worker, output_path, error, metrics) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+def get_sweep_results(run_id,db_path):
+    conn = connect_db(db_path)
+    cursor = conn.execute('SELECT combo, k, params, status, duration, worker, output_path, error, metrics FROM sweep_results '
+                          'WHERE run_id=? ORDER BY combo, k', (run_id,))
+    columns = [d[0] for d in cursor.description]
+    results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    for result in results:
+        result['params'] = json.loads(result['params'])
+        if result['metrics'] is not None:
+            result['metrics'] = json.loads(result['metrics'])
+    return results
@@ -1,5 +1,20 @@
+import hashlib
 import importlib
 import os
+import threading
+
+from collections import OrderedDict
+
+# Modules executed by check_class keyed by the sha256 of their file, least recently used first,
+# and the classes that passed the check keyed by (file sha256, class name, expected base class).
+# Only the last MAX_CACHED_MODULES files are kept, clear_check_cache empties both.
+MAX_CACHED_MODULES = 32
+_MODULES = OrderedDict()
+_CHECKED_CLASSES = set()
+# One lock per file digest, so different files are executed in parallel and each only once,
+# _module_locks_lock guards the caches and the locks
+_module_locks = dict()
+_module_locks_lock = threading.Lock()
 
 def get_github_file_url(remote_url, file_path, commit_sha):
     # Remove '.git' from the remote URL, if present
@@ -19,11 +34,25 @@ def get_gitlab_file_url(remote_url, file_path, commit_sha):
     file_url = f"{remote_url}/-/blob/{commit_sha}/{file_path}"
     return file_url
 
+def parse_file_url(file_url):
+    # Split a github or gitlab file url into (repo url, commit sha, file path)
+    separator = '/-/blob/' if '/-/blob/' in file_url else '/blob/'
+    repo_url, rest = file_url.split(separator, 1)
+    commit_sha, file_path = rest.split('/', 1)
+    return repo_url, commit_sha, file_path
+
+def same_repo(url1, url2):
+    # Remote urls and the repo part of registered file urls differ by the '.git' suffix
+    return url1.rstrip('/').removesuffix('.git') == url2.rstrip('/').removesuffix('.git')
+
+def check_remote(repo,file,url,name):
+    if not same_repo(repo.remotes.origin.url, url):
+        raise ValueError(f'Remote URL of module "{file}" does not match the URL of the remote repository for the existing model "{name}". Please push changes to the correct repository before updating the registry.')
+
 def check_repo(repo,file,url,name):
     if repo.is_dirty():
         raise ValueError(f'Module "{file}" has uncommitted changes. Please commit changes and push to the remote repository before updating the registry.')
-    if not repo.remotes.origin.url == url:
-        raise ValueError(f'Remote URL of module "{file}" does not match the URL of the remote repository for the existing model "{name}". Please push changes to the correct repository before updating the registry.')
+    check_remote(repo, file, url, name)
 
     origin = repo.remote('origin')
     origin.fetch()
@@ -34,11 +63,12 @@ def check_repo(repo,file,url,name):
         raise ValueError(f'Module "{file}" is not up to date with the latest version on the remote repository. Please pull changes and update to the latest version before adding to the registry.')
         
 def check_class(file, class_name, class_type):
+    digest = file_digest(file)
+    key = (digest, class_name, class_type)
+    if key in _CHECKED_CLASSES:
+        return
     try:
-        module_name = file.split('/')[-1].split('.py')[0]
-        spec = importlib.util.spec_from_file_location(module_name, file)
-        module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(module)
+        module = _load_module(file, digest)
         cls = getattr(module, class_name)
         if not issubclass(cls, class_type):
             raise TypeError(f'Class "{class_name}" in module "{file}" is not a subclass of {class_type.__name__}.')
@@ -46,3 +76,37 @@ def check_class(file, class_name, class_type):
         raise ModuleNotFoundError(f'Module "{file}" not found.')
     except AttributeError:
         raise AttributeError(f'Class "{class_name}" not found in module "{file}".')
+    with _module_locks_lock:
+        if digest in _MODULES:
+            _CHECKED_CLASSES.add(key)
+
+def clear_check_cache():
+    with _module_locks_lock:
+        _MODULES.clear()
+        _CHECKED_CLASSES.clear()
+        _module_locks.clear()
+
+def file_digest(file):
+    with open(file, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def _load_module(file, digest):
+    # Each version of a file is executed once, also when several threads check classes in it
+    with _module_locks_lock:
+        lock = _module_locks.setdefault(digest, threading.Lock())
+    with lock:
+        with _module_locks_lock:
+            if digest in _MODULES:
+                _MODULES.move_to_end(digest)
+                return _MODULES[digest]
+        module_name = file.split('/')[-1].split('.py')[0]
+        spec = importlib.util.spec_from_file_location(module_name, file)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        with _module_locks_lock:
+            _MODULES[digest] = module
+            while len(_MODULES) > MAX_CACHED_MODULES:
+                evicted, _ = _MODULES.popitem(last=False)
+                _module_locks.pop(evicted, None)
+                _CHECKED_CLASSES.difference_update([key for key in _CHECKED_CLASSES if key[0] == evicted])
+        return module
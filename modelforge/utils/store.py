@@ -0,0 +1,258 @@
+import hashlib
+import importlib
+import os
+import re
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+
+import git
+
+from pathlib import Path
+
+# Local, content-addressed store of registered code. Each repo is mirrored once and every
+# commit that is used is extracted once into its own read-only tree:
+#   <store>/<repo_name>-<url hash>/mirror.git
+#   <store>/<repo_name>-<url hash>/commits/<commit_sha>/<repo_name>/...
+# Every commit is imported as its own package, <repo_name>_<sha[:12]>, so classes of one repo at
+# different commits can be used side by side. Relative imports stay within their commit, absolute
+# imports of the repo's own name resolve to the first commit the process imported.
+# A process holds a shared lock on the in-use file of every commit it imports from for as long as
+# it lives, eviction only removes commits it can lock exclusively. Without fcntl (Windows) commits
+# used within MIN_IDLE_SECONDS are kept instead.
+DEFAULT_STORE_PATH = os.path.join(os.path.expanduser('~'), '.modelforge', 'store')
+DEFAULT_MAX_COMMITS = 64
+LAST_USED_FILE = '.last_used'
+IN_USE_FILE = '.in_use'
+MIN_IDLE_SECONDS = 3600
+EXTRACT_ATTEMPTS = 3
+
+# Resolved classes, keyed by (repo url, commit sha, module name, class name)
+_CLASS_CACHE = dict()
+# Open in-use files of the commits this process imports from, keyed by commit dir
+_IN_USE = dict()
+
+
+def resolve_class(repo_url, commit_sha, file_path, class_name, store_path=None, max_commits=DEFAULT_MAX_COMMITS):
+    repo_name = repo_url.rstrip('/').split('/')[-1]
+    module_path = file_path[:-3] if file_path.endswith('.py') else file_path
+    module_name = f'{repo_name}.{module_path.replace("/", ".")}'
+    key = (repo_url, commit_sha, module_name, class_name)
+    if key in _CLASS_CACHE:
+        return _CLASS_CACHE[key]
+
+    commit_dir = materialize_commit(repo_url, commit_sha, store_path or DEFAULT_STORE_PATH, max_commits)
+    module = import_from_commit(commit_dir, repo_name, module_name)
+    cls = getattr(module, class_name)
+    _CLASS_CACHE[key] = cls
+    return cls
+
+
+def materialize_commit(repo_url, commit_sha, store_path, max_commits=DEFAULT_MAX_COMMITS):
+    # Returns the directory holding the extracted tree of commit_sha, extracting it on first use.
+    # max_commits=None never evicts.
+    repo_name = repo_url.rstrip('/').split('/')[-1]
+    repo_dir = os.path.join(store_path, f'{repo_name}-{hashlib.sha1(repo_url.encode()).hexdigest()[:8]}')
+    commit_dir = os.path.join(repo_dir, 'commits', commit_sha)
+
+    # Another process may evict the commit between the check and the lock, then extract again
+    for attempt in range(1, EXTRACT_ATTEMPTS + 1):
+        if commit_dir in _IN_USE:
+            break
+        try:
+            if not os.path.isdir(commit_dir):
+                mirror = _get_mirror(repo_url, repo_dir, commit_sha)
+                _extract_commit(mirror, commit_sha, repo_name, commit_dir)
+                print(f'Extracted {repo_name}@{commit_sha[:8]} to {commit_dir}')
+            _hold_commit(commit_dir)
+        except OSError:
+            if attempt == EXTRACT_ATTEMPTS:
+                raise
+            print(f'Extracting {repo_name}@{commit_sha[:8]} failed (attempt {attempt}), retrying')
+    if commit_dir not in _IN_USE:
+        raise RuntimeError(f'{repo_name}@{commit_sha[:8]} was evicted from the code store {EXTRACT_ATTEMPTS} times while being extracted')
+
+    Path(commit_dir, LAST_USED_FILE).touch()
+    if max_commits is not None:
+        evict_commits(store_path, max_commits, keep=commit_dir)
+    return commit_dir
+
+
+def import_from_commit(commit_dir, repo_name, module_name):
+    # Imports module_name (<repo_name>.<module path>) from the package of commit_dir
+    package_name = commit_package(repo_name, os.path.basename(commit_dir))
+    package = sys.modules.get(package_name)
+    if package is None:
+        package = _load_package(package_name, os.path.join(commit_dir, repo_name))
+    sys.modules.setdefault(repo_name, package)
+    module = importlib.import_module(package_name + module_name[len(repo_name):])
+    try:
+        # Ship the code with pickled classes so workers do not need the store
+        import cloudpickle
+        cloudpickle.register_pickle_by_value(package)
+    except (ImportError, AttributeError, ValueError):
+        pass
+    return module
+
+
+def commit_package(repo_name, commit_sha):
+    # Repo names may contain characters that are not valid in module names
+    return re.sub(r'\W', '_', repo_name) + '_' + commit_sha[:12]
+
+
+def evict_commits(store_path, max_commits, keep=None):
+    # Remove the least recently used extracted commits beyond max_commits, skipping commits
+    # that any process still imports from
+    commit_dirs = []
+    for repo in os.listdir(store_path):
+        commits = os.path.join(store_path, repo, 'commits')
+        if os.path.isdir(commits):
+            commit_dirs += [os.path.join(commits, sha) for sha in os.listdir(commits) if not sha.startswith('.')]
+    if len(commit_dirs) <= max_commits:
+        return
+    commit_dirs.sort(key=_last_used)
+    for commit_dir in commit_dirs[:len(commit_dirs) - max_commits]:
+        if commit_dir != keep and _remove_unused(commit_dir):
+            print(f'Evicted {commit_dir} from the code store')
+
+
+def clear_class_cache():
+    _CLASS_CACHE.clear()
+
+
+def _get_mirror(repo_url, repo_dir, commit_sha):
+    mirror_dir = os.path.join(repo_dir, 'mirror.git')
+    if not os.path.isdir(mirror_dir):
+        os.makedirs(repo_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=repo_dir, prefix='.mirror-')
+        git.Repo.clone_from(repo_url, tmp_dir, mirror=True)
+        try:
+            os.rename(tmp_dir, mirror_dir)
+            print(f'Mirrored {repo_url} to {mirror_dir}')
+        except OSError:
+            # Another process mirrored it first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    mirror = git.Repo(mirror_dir)
+    if not _has_commit(mirror, commit_sha):
+        mirror.remote().fetch()
+        if not _has_commit(mirror, commit_sha):
+            raise ValueError(f'Commit "{commit_sha}" not found in repository {repo_url}')
+    return mirror
+
+
+def _extract_commit(mirror, commit_sha, repo_name, commit_dir):
+    # Extract into a temporary directory first so readers never see a partial tree
+    os.makedirs(os.path.dirname(commit_dir), exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(commit_dir), prefix=f'.{commit_sha[:8]}-')
+    archive = os.path.join(tmp_dir, 'tree.tar')
+    with open(archive, 'wb') as f:
+        mirror.archive(f, treeish=commit_sha, format='tar')
+    with tarfile.open(archive) as tar:
+        _extract_tar(tar, os.path.join(tmp_dir, repo_name))
+    os.remove(archive)
+    try:
+        os.rename(tmp_dir, commit_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        # Only losing the race to another process is expected
+        if not os.path.isdir(commit_dir):
+            raise
+
+
+def _load_package(package_name, path):
+    init = os.path.join(path, '__init__.py')
+    if os.path.isfile(init):
+        spec = importlib.util.spec_from_file_location(package_name, init, submodule_search_locations=[path])
+    else:
+        # Namespace package, the repo has no __init__.py
+        spec = importlib.machinery.ModuleSpec(package_name, None, is_package=True)
+        spec.submodule_search_locations = [path]
+    package = importlib.util.module_from_spec(spec)
+    package.__path__ = [path]
+    sys.modules[package_name] = package
+    try:
+        if spec.loader is not None:
+            spec.loader.exec_module(package)
+    except BaseException:
+        del sys.modules[package_name]
+        raise
+    return package
+
+
+def _extract_tar(tar, path):
+    # Members must stay inside path, the 'data' filter also drops devices and unsafe links
+    if hasattr(tarfile, 'data_filter'):
+        tar.extractall(path, filter='data')
+        return
+    root = os.path.realpath(path)
+    for member in tar.getmembers():
+        target = os.path.realpath(os.path.join(path, member.name))
+        linked = os.path.realpath(os.path.join(os.path.dirname(target), member.linkname)) if member.issym() or member.islnk() else target
+        if not (member.isfile() or member.isdir() or member.issym() or member.islnk()) or \
+                os.path.commonpath([root, target]) != root or os.path.commonpath([root, linked]) != root:
+            raise ValueError(f'Refusing to extract unsafe archive member "{member.name}"')
+    tar.extractall(path)
+
+
+def _hold_commit(commit_dir):
+    # Takes the shared in-use lock of commit_dir, gives up if the commit is gone meanwhile
+    try:
+        f = open(os.path.join(commit_dir, IN_USE_FILE), 'a')
+    except FileNotFoundError:
+        return
+    try:
+        import fcntl
+        fcntl.flock(f, fcntl.LOCK_SH)
+    except ImportError:
+        pass
+    if os.path.isdir(commit_dir):
+        _IN_USE[commit_dir] = f
+    else:
+        # Evicted while waiting for the lock
+        f.close()
+
+
+def _remove_unused(commit_dir):
+    # Returns whether commit_dir was removed. It is moved aside under the exclusive lock first,
+    # so no process can start using it while it is being deleted.
+    try:
+        import fcntl
+    except ImportError:
+        fcntl = None
+    if fcntl is None and time.time() - _last_used(commit_dir) < MIN_IDLE_SECONDS:
+        return False
+    try:
+        f = open(os.path.join(commit_dir, IN_USE_FILE), 'a')
+    except FileNotFoundError:
+        return False
+    with f:
+        if fcntl is not None:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return False
+        trash_dir = tempfile.mkdtemp(dir=os.path.dirname(commit_dir), prefix='.evicted-')
+        try:
+            os.rename(commit_dir, os.path.join(trash_dir, 'tree'))
+        except OSError:
+            shutil.rmtree(trash_dir, ignore_errors=True)
+            return False
+    shutil.rmtree(trash_dir, ignore_errors=True)
+    return True
+
+
+def _has_commit(repo, commit_sha):
+    try:
+        repo.commit(commit_sha)
+        return True
+    except (ValueError, git.BadName):
+        return False
+
+
+def _last_used(commit_dir):
+    try:
+        return os.path.getmtime(os.path.join(commit_dir, LAST_USED_FILE))
+    except OSError:
+        return 0
@@ -5,6 +5,7 @@ setup(
     version='0.1.0',
     packages=find_packages(),
     include_package_data=True,
+    python_requires='>=3.9',
     install_requires=[
         'Click',
         'GitPython',
@@ -13,9 +14,12 @@ setup(
         'dask',
         'dask[distributed]',
     ],
+    extras_require={
+        'parquet': ['pyarrow'],
+    },
     entry_points={
         'console_scripts': [
-            'modelforge = modelforge.cli',
+            'modelforge = modelforge.cli:modelforge',
         ],
     },
 )
\ No newline at end of file
@@ -0,0 +1,20 @@
+import pytest
+
+from modelforge.benchmarks.suite import make_workspace, rolling_config
+from modelforge.utils.database import close_connections
+from modelforge.utils.store import clear_class_cache
+
+SMALL = {'n_windows': 4, 'train_period': 10, 'eval_period': 3, 'rows_per_day': 8, 'n_features': 3}
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    # A registry holding the synthetic components of modelforge.benchmarks, see make_workspace
+    yield make_workspace(str(tmp_path))
+    close_connections()
+    clear_class_cache()
+
+
+@pytest.fixture
+def run_config(workspace):
+    return rolling_config(workspace, SMALL, 'run')
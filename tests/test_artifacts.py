@@ -0,0 +1,90 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import cloudpickle
+import numpy as np
+import pandas as pd
+import pytest
+
+from modelforge.core.artifacts import artifact_store, load_artifact, match_artifacts, save_artifact
+from modelforge.core.runner import MFRunner
+from modelforge.utils.registry import add_run, get_run_status
+
+
+def test_identical_models_are_stored_once(tmp_path):
+    first = save_artifact({'coef': np.arange(10.0)}, str(tmp_path))
+    second = save_artifact({'coef': np.arange(10.0)}, str(tmp_path))
+    assert first == second
+    assert len(list(tmp_path.rglob('*.joblib'))) == 1
+
+
+def test_models_load_memory_mapped(tmp_path):
+    artifact = save_artifact({'coef': np.arange(10.0)}, str(tmp_path))
+    assert isinstance(load_artifact(artifact['path'])['coef'], np.memmap)
+    assert not isinstance(load_artifact(artifact['path'], mmap=False)['coef'], np.memmap)
+
+
+def test_functions_are_stored_by_value(tmp_path):
+    artifact = save_artifact({'scale': lambda x: 2 * x}, str(tmp_path))
+    assert artifact['format'] == 'joblib'
+    assert load_artifact(artifact['path'])['scale'](2) == 4
+
+
+def test_registered_code_is_not_needed_to_load(tmp_path, monkeypatch):
+    code = tmp_path / 'code'
+    code.mkdir()
+    (code / 'shipped_model.py').write_text('class Model:\n    def __init__(self, coef):\n        self.coef = coef\n')
+    monkeypatch.syspath_prepend(str(code))
+    import shipped_model
+    cloudpickle.register_pickle_by_value(shipped_model)
+    try:
+        artifact = save_artifact(shipped_model.Model(np.arange(5.0)), str(tmp_path / 'store'))
+    finally:
+        cloudpickle.unregister_pickle_by_value(shipped_model)
+        del sys.modules['shipped_model']
+    script = textwrap.dedent(f'''
+        import sys
+        import numpy as np
+        from modelforge.core.artifacts import load_artifact
+        model = load_artifact({artifact['path']!r})
+        assert isinstance(model.coef, np.memmap) and 'shipped_model' not in sys.modules
+        print(type(model).__name__, model.coef.sum())
+    ''')
+    out = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True)
+    assert out.stdout.split() == ['Model', '10.0']
+
+
+def test_artifact_store_path():
+    assert artifact_store({'output_dir': 'out'}) is None
+    assert artifact_store({'output_dir': 'out', 'artifacts': True}) == os.path.join('out', 'artifacts')
+    assert artifact_store({'output_dir': 'out', 'artifacts': {'path': 'shared'}}) == 'shared'
+
+
+def test_match_modes():
+    source = [{'k': k, 'fit_start': f'2020-01-{1 + k:02d}', 'fit_end': f'2020-01-{10 + k:02d}',
+               'artifact': f'digest{k}', 'artifact_path': f'path{k}'} for k in range(3)]
+    intervals = {0: {'fit': (pd.Timestamp('2020-01-02'), pd.Timestamp('2020-01-11')), 'eval': (pd.Timestamp('2020-01-20'), pd.Timestamp('2020-01-21'))}}
+    assert match_artifacts(intervals, source, 'window')[0]['source_k'] == 0
+    assert match_artifacts(intervals, source, 'fit')[0]['source_k'] == 1
+    assert match_artifacts(intervals, source, 'asof')[0]['source_k'] == 2
+    with pytest.raises(ValueError, match='No stored model'):
+        match_artifacts({5: intervals[0]}, source, 'window')
+
+
+def test_predict_only_run_reuses_stored_models(workspace, run_config):
+    source = dict(run_config, run_id='source', artifacts=True)
+    add_run('source', {'user_config': source}, source['database_path'])
+    MFRunner(source).train()
+    assert 'coef.npy' not in os.listdir(os.path.join(source['output_dir'], 'eval_0'))
+
+    config = dict(run_config, run_id='scored', output_dir=run_config['output_dir'] + '-scored',
+                  predict_only={'source_run': 'source'}, metrics=['rmse'])
+    add_run('scored', {'user_config': config}, config['database_path'])
+    runner = MFRunner(config)
+    runner.train()
+    stored = {w['k']: w['artifact'] for w in get_run_status('source', config['database_path'])['intervals']}
+    scored = {w['k']: w['artifact'] for w in get_run_status('scored', config['database_path'])['intervals']}
+    assert scored == stored
+    assert runner.metrics['values']['rmse'] < 1
@@ -0,0 +1,37 @@
+import json
+import os
+
+import pytest
+
+from modelforge.benchmarks.suite import BENCHMARKS, compare_results, run_suite, write_results
+
+TINY = {'n_windows': 3, 'train_period': 10, 'eval_period': 2, 'rows_per_day': 5, 'n_features': 3,
+        'registry_rows': 50, 'prediction_rows': 1000, 'repeat': 1}
+
+
+def test_suite_runs_every_benchmark_offline(tmp_path):
+    results = run_suite('small', workdir=str(tmp_path), **TINY)
+    assert list(results['results']) == BENCHMARKS
+    assert results['params']['n_windows'] == 3
+    assert results['results']['planning']['windows'] == 3
+    assert results['results']['windows']['windows_per_second'] > 0
+    # The scratch workspace is removed
+    assert os.listdir(tmp_path) == []
+
+    output = os.path.join(tmp_path, 'results.json')
+    write_results(results, output)
+    with open(output) as f:
+        assert json.load(f)['results'] == json.loads(json.dumps(results['results'], default=str))
+
+
+def test_unknown_size_or_benchmark():
+    with pytest.raises(ValueError, match='size'):
+        run_suite('huge')
+    with pytest.raises(ValueError, match='Unknown benchmark'):
+        run_suite('small', benchmarks=['planning', 'training'])
+
+
+def test_compare_results_matches_shared_numbers():
+    baseline = {'results': {'windows': {'total': 2.0, 'windows_per_second': 10.0, 'skipped': 0.0}, 'planning': {'per_window': 1.0}}}
+    current = {'results': {'windows': {'total': 1.0, 'windows_per_second': 20.0, 'skipped': 1.0}, 'registry': {'get_run_status': 1.0}}}
+    assert compare_results(baseline, current) == [('windows.total', 2.0, 1.0, 0.5), ('windows.windows_per_second', 10.0, 20.0, 2.0)]
@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pandas as pd
+
+from modelforge.benchmarks.synthetic import SyntheticDatasource
+from modelforge.core.cache import CachedDatasource, MFDataCache, datasource_key
+
+
+def make_datasource(cache):
+    params = {'n_features': 2, 'rows_per_day': 4}
+    return CachedDatasource(SyntheticDatasource(params), cache, datasource_key(SyntheticDatasource, params))
+
+
+def rolling_intervals(n_windows, length, step):
+    starts = pd.date_range('2020-01-01', periods=n_windows, freq=f'{step}D')
+    return [(start, start + pd.Timedelta(days=length - 1)) for start in starts]
+
+
+def test_tick_chunks_lie_on_a_global_grid():
+    cache = MFDataCache(chunk_freq='7D')
+    first = cache.chunk_bounds('2020-01-03', '2020-01-20')
+    second = cache.chunk_bounds('2020-01-05', '2020-01-25')
+    assert set(first) & set(second)
+    for chunk_start, _ in first + second:
+        assert chunk_start == chunk_start.floor('7D')
+
+
+def test_overlapping_windows_hit_the_cache():
+    for chunk_freq in ['7D', 'D', 'MS']:
+        cache = MFDataCache(chunk_freq=chunk_freq)
+        datasource = make_datasource(cache)
+        for start, end in rolling_intervals(6, 28, 3):
+            datasource.set_interval(start, end)
+            datasource.get_data()
+        assert cache.hits > cache.misses, chunk_freq
+
+
+def test_cached_data_matches_the_datasource():
+    cache = MFDataCache(chunk_freq='7D')
+    datasource = make_datasource(cache)
+    plain = SyntheticDatasource({'n_features': 2, 'rows_per_day': 4})
+    for start, end in rolling_intervals(4, 10, 2):
+        datasource.set_interval(start, end)
+        plain.set_interval(start, end)
+        pd.testing.assert_frame_equal(datasource.get_data(), plain.get_data())
+        pd.testing.assert_frame_equal(pd.concat(datasource.iter_data()), plain.get_data())
+
+
+def test_eviction_keeps_the_budget():
+    cache = MFDataCache(chunk_freq='D', max_bytes=1)
+    datasource = make_datasource(cache)
+    datasource.set_interval('2020-01-01', '2020-01-10')
+    datasource.get_data()
+    assert len(cache._chunks) == 1
+
+
+def test_returned_data_is_not_the_cached_object():
+    for chunk_freq in [None, '7D']:
+        cache = MFDataCache(chunk_freq=chunk_freq)
+        datasource = make_datasource(cache)
+        datasource.set_interval('2020-01-06', '2020-01-19')
+        expected = datasource.get_data()
+        for data in [datasource.get_data(), *datasource.iter_data()]:
+            data.iloc[:, 0] = 0.0
+        pd.testing.assert_frame_equal(datasource.get_data(), expected)
+
+
+class SlowDatasource(SyntheticDatasource):
+    def get_data(self, training=False):
+        time.sleep(0.01)
+        return super().get_data(training=training)
+
+
+def test_threads_share_the_cache_consistently():
+    cache = MFDataCache(chunk_freq='D', max_bytes=20000)
+    params = {'n_features': 2, 'rows_per_day': 4}
+
+    def train_windows():
+        datasource = CachedDatasource(SlowDatasource(params), cache, datasource_key(SyntheticDatasource, params))
+        for start, end in rolling_intervals(6, 10, 2):
+            datasource.set_interval(start, end)
+            datasource.get_data()
+
+    threads = [threading.Thread(target=train_windows) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.nbytes == sum(size for _, size in cache._chunks.values()) <= 20000
+    # Every day of the 20 the windows span is loaded once, every other read is a hit
+    assert cache.misses == 20
+    assert cache.hits == 4 * 6 * 10 - 20
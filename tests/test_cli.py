@@ -0,0 +1,22 @@
+from click.testing import CliRunner
+
+from modelforge import cli
+from modelforge.utils.database import close_connections
+from modelforge.utils.registry import add_run, add_run_intervals, connect_db, update_run_intervals
+
+
+def test_status_orders_times_across_months(tmp_path, monkeypatch):
+    db_path = str(tmp_path)
+    monkeypatch.setattr(cli, 'database_path', lambda: db_path)
+    add_run('months', {'user_config': {}}, db_path)
+    intervals = {k: {'fit': ('2024-01-01', '2024-01-10'), 'eval': ('2024-01-11', '2024-01-12')} for k in range(2)}
+    add_run_intervals('months', intervals, db_path)
+    with connect_db(db_path) as conn:
+        conn.execute("UPDATE runs SET start_time='31/01/2024 23:00:00' WHERE run_id='months'")
+    # As strings '31/01' sorts after '01/02', as times the second window finished last
+    update_run_intervals('months', [0], db_path, status='completed', duration=1.0, end_time='31/01/2024 23:30:00')
+    update_run_intervals('months', [1], db_path, status='completed', duration=1.0, end_time='01/02/2024 00:00:00')
+    result = CliRunner().invoke(cli.modelforge, ['run', 'status', '-r', 'months'])
+    close_connections()
+    assert result.exit_code == 0, result.output
+    assert 'throughput: 2.0 windows/hour' in result.output
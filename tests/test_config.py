@@ -0,0 +1,71 @@
+import pytest
+
+from modelforge.core.config import ConfigError, validate_config
+from modelforge.core.planning import plan_from_config, session_counts
+from modelforge.core.runner import MFRunner
+
+
+def test_valid_config_passes(run_config):
+    validate_config(run_config)
+
+
+def test_every_problem_is_reported(run_config):
+    config = dict(run_config, train_period='10', recalibration_freq=0, scheduler={'backend': 'spark'})
+    del config['model']
+    with pytest.raises(ConfigError) as e:
+        validate_config(config)
+    assert len(e.value.errors) == 4
+
+
+def test_required_fields_depend_on_the_train_mode(run_config):
+    config = dict(run_config, train_mode='single_window')
+    with pytest.raises(ConfigError, match='train_start_date'):
+        validate_config(config)
+
+
+def test_bool_is_not_a_count(run_config):
+    with pytest.raises(ConfigError, match='train_period'):
+        validate_config(dict(run_config, train_period=True))
+
+
+def test_unknown_fields_are_errors(run_config):
+    with pytest.raises(ConfigError) as e:
+        validate_config(dict(run_config, comment='nightly', scheduler={'workers': 2}))
+    assert e.value.errors == ['unknown field "scheduler.workers"', 'unknown field "comment"']
+
+
+def test_holidays_must_be_dates(run_config):
+    with pytest.raises(ConfigError) as e:
+        validate_config(dict(run_config, calendar='C', holidays=['2020-01-20', 'someday']))
+    assert e.value.errors == ['"holidays[1]" must be a date, got \'someday\'']
+
+
+def test_validation_returns_the_plan(run_config):
+    assert validate_config(run_config).equals(plan_from_config(run_config))
+
+
+def test_empty_plan_is_a_config_error(run_config):
+    config = dict(run_config, start_date='2020-01-01', end_date='2020-01-05', train_period=10)
+    with pytest.raises(ConfigError, match='no windows'):
+        validate_config(config)
+    with pytest.raises(ConfigError, match='no windows'):
+        MFRunner(config).dry_run()
+
+
+def test_session_counts_of_an_empty_plan(run_config):
+    plan = plan_from_config(run_config).iloc[:0]
+    counts, spanned = session_counts(plan)
+    assert counts.empty and spanned == 0
+
+
+def test_dry_run_reports_the_plan(workspace, run_config):
+    report = MFRunner(run_config).dry_run()
+    assert report['windows'] == report['tasks'] == len(report['plan']) > 0
+    assert report['components']['models'][1] == 'SyntheticModel'
+    assert report['eval_sessions'] == int(report['plan']['eval_sessions'].sum())
+
+
+def test_dry_run_bounds_warm_start_tasks(workspace, run_config):
+    report = MFRunner(dict(run_config, warm_start={'chain_length': 2})).dry_run()
+    assert report['tasks'] == report['windows'] == 4
+    assert report['chains'] == 2
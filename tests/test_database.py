@@ -0,0 +1,55 @@
+import sqlite3
+import threading
+
+import pytest
+
+from modelforge.utils.database import MIGRATIONS, close_connections, get_connection, migrate
+
+
+@pytest.fixture(autouse=True)
+def connections():
+    yield
+    close_connections()
+
+
+def test_fresh_registry_is_fully_migrated(tmp_path):
+    conn = get_connection(str(tmp_path))
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == len(MIGRATIONS)
+    migrate(conn)
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == len(MIGRATIONS)
+
+
+def test_concurrent_connections_migrate_once(tmp_path):
+    db_path = str(tmp_path / 'registry.db')
+    barrier = threading.Barrier(8)
+    errors = []
+
+    def connect():
+        barrier.wait()
+        try:
+            conn = sqlite3.connect(db_path, timeout=30)
+            migrate(conn)
+            conn.close()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=connect) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert get_connection(db_path).execute('PRAGMA user_version').fetchone()[0] == len(MIGRATIONS)
+
+
+def test_duplicate_names_are_reported(tmp_path):
+    db_path = str(tmp_path / 'registry.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE models (name TEXT, url TEXT, class_name TEXT)')
+    conn.executemany('INSERT INTO models VALUES (?, ?, ?)', [('m', 'a', 'A'), ('m', 'b', 'B')])
+    conn.commit()
+    with pytest.raises(ValueError, match='models.name="m"'):
+        migrate(conn)
+    # Nothing of the failed migration is kept
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == 0
+    conn.close()
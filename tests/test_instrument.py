@@ -0,0 +1,85 @@
+import threading
+import time
+import tracemalloc
+
+import pytest
+
+from modelforge.core.instrument import NULL_INSTRUMENT, MFInstrument, get_instrument
+
+
+def test_disabled_runs_get_the_null_instrument(tmp_path):
+    assert get_instrument({'output_dir': str(tmp_path)}, 0) is NULL_INSTRUMENT
+    assert get_instrument({'output_dir': str(tmp_path), 'instrument': True}, 0).enabled
+
+
+def test_span_cpu_only_counts_its_own_thread(tmp_path):
+    instrument = MFInstrument({'log': False}, 0, str(tmp_path))
+    stop = threading.Event()
+
+    def spin():
+        while not stop.is_set():
+            pass
+
+    thread = threading.Thread(target=spin)
+    thread.start()
+    try:
+        with instrument.span('wait'):
+            time.sleep(0.3)
+    finally:
+        stop.set()
+        thread.join()
+    assert instrument.spans['wait']['wall'] >= 0.3
+    assert instrument.spans['wait']['cpu'] < 0.1
+
+
+def test_memory_defaults_to_rss(tmp_path):
+    instrument = MFInstrument({'log': False}, 0, str(tmp_path))
+    with instrument.window():
+        assert not tracemalloc.is_tracing()
+    assert instrument.memory == 'rss' and instrument.peak_memory > 0
+
+
+def test_memory_peak_is_per_window(tmp_path):
+    peaks = []
+    for size in [50 * 2**20, 2**20]:
+        instrument = MFInstrument({'log': False, 'memory': 'tracemalloc'}, 0, str(tmp_path))
+        with instrument.window():
+            data = bytearray(size)
+            del data
+        peaks.append(instrument.peak_memory)
+    assert peaks[0] >= 50 * 2**20
+    assert peaks[1] < 10 * 2**20
+    assert not tracemalloc.is_tracing()
+
+
+def test_overlapping_windows_report_no_peak(tmp_path):
+    first = MFInstrument({'log': False, 'memory': 'tracemalloc'}, 0, str(tmp_path))
+    second = MFInstrument({'log': False, 'memory': 'tracemalloc'}, 1, str(tmp_path))
+    third = MFInstrument({'log': False, 'memory': 'tracemalloc'}, 2, str(tmp_path))
+    with second.window():
+        with first.window():
+            pass
+        assert tracemalloc.is_tracing()
+    with third.window():
+        data = bytearray(20 * 2**20)
+        del data
+    assert first.peak_memory is None and second.peak_memory is None
+    assert third.peak_memory >= 20 * 2**20
+    assert not tracemalloc.is_tracing()
+
+
+def test_dask_runs_can_not_trace_memory(workspace, run_config):
+    from modelforge.core.runner import MFRunner
+    with pytest.raises(ValueError, match='one at a time'):
+        MFRunner(dict(run_config, instrument={'memory': 'tracemalloc'}, scheduler={'backend': 'dask'}))
+    MFRunner(dict(run_config, instrument={'memory': 'tracemalloc'}, scheduler={'backend': 'process'}))
+
+
+def test_window_log_and_profile(tmp_path):
+    instrument = MFInstrument({'profile': {'windows': [3]}}, 3, str(tmp_path))
+    with instrument.window():
+        with instrument.span('train'):
+            sum(range(1000))
+    assert set(instrument.spans) == {'window', 'train'}
+    assert (tmp_path / 'instrument.jsonl').read_text().count('\n') == 1
+    assert instrument.profile_path.endswith('window_3.prof')
@@ -0,0 +1,59 @@
+import os
+
+import pandas as pd
+
+from modelforge.core.manifest import is_complete, remove_manifest, window_fingerprint, write_manifest
+from modelforge.core.runner import MFRunner
+
+INTERVAL = {'fit': (pd.Timestamp('2020-01-01'), pd.Timestamp('2020-01-10')), 'eval': (pd.Timestamp('2020-01-11'), pd.Timestamp('2020-01-12'))}
+
+
+def test_fingerprint_ignores_settings_that_do_not_change_outputs():
+    config = {'model_params': {'alpha': 1}, 'run_id': 'a', 'scheduler': {'backend': 'local'}}
+    fingerprint = window_fingerprint(config, INTERVAL, 'model@1', 'datasource@1')
+    for changed in [dict(run_id='b', scheduler={'backend': 'dask'}, resume=True), dict(end_date='2021-01-01', start_date='2019-01-01'),
+                    dict(data_cache={'chunk_freq': 'D'}, stream_chunk_size=100)]:
+        assert window_fingerprint(dict(config, **changed), INTERVAL, 'model@1', 'datasource@1') == fingerprint
+    assert window_fingerprint(dict(config, prediction_sink='parquet'), INTERVAL, 'model@1', 'datasource@1') != fingerprint
+    assert window_fingerprint(dict(config, model_params={'alpha': 2}), INTERVAL, 'model@1', 'datasource@1') != fingerprint
+    assert window_fingerprint(config, INTERVAL, 'model@2', 'datasource@1') != fingerprint
+    assert window_fingerprint(config, INTERVAL, 'model@1', 'datasource@1', artifact='digest') != fingerprint
+
+
+def test_manifest_detects_changed_and_missing_outputs(tmp_path):
+    (tmp_path / 'pred.h5').write_bytes(b'predictions')
+    extra = tmp_path.parent / f'{tmp_path.name}-sink.parquet'
+    extra.write_bytes(b'sink')
+    write_manifest(str(tmp_path), 'fp', [str(extra)])
+    assert is_complete(str(tmp_path), 'fp')
+    assert not is_complete(str(tmp_path), 'other')
+    extra.write_bytes(b'changed')
+    assert not is_complete(str(tmp_path), 'fp')
+    extra.write_bytes(b'sink')
+    os.remove(tmp_path / 'pred.h5')
+    assert not is_complete(str(tmp_path), 'fp')
+    remove_manifest(str(tmp_path))
+    remove_manifest(str(tmp_path))
+    assert not is_complete(str(tmp_path), 'fp')
+
+
+def test_resume_only_reruns_incomplete_windows(workspace, run_config):
+    MFRunner(run_config).train()
+    os.remove(os.path.join(run_config['output_dir'], 'eval_2', 'pred.h5'))
+    runner = MFRunner(dict(run_config, resume=True))
+    runner.train()
+    assert runner.pending == [2]
+    assert [k for k, interval in runner.intervals.items() if interval.get('skipped')] == [0, 1, 3]
+
+    changed = MFRunner(dict(run_config, resume=True, model_params={'changed': True}))
+    changed.train()
+    assert changed.pending == [0, 1, 2, 3]
+
+
+def test_extending_the_backtest_only_runs_new_windows(workspace, run_config):
+    MFRunner(run_config).train()
+    end_date = pd.Timestamp(run_config['end_date']) + pd.Timedelta(days=2 * run_config['recalibration_freq'])
+    runner = MFRunner(dict(run_config, end_date=str(end_date.date()), data_cache={'chunk_freq': '7D'}, stream_chunk_size=5, resume=True))
+    runner.train()
+    assert [k for k, interval in runner.intervals.items() if interval.get('skipped')] == [0, 1, 2, 3]
+    assert runner.pending == [4, 5]
@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from modelforge.benchmarks.synthetic import SyntheticDatasource, SyntheticModel
+from modelforge.core.instrument import NULL_INSTRUMENT
+from modelforge.core.metrics import MFRunMetrics, MFWindowMetrics, metrics_from_stats
+from modelforge.core.runner import _predict_window
+
+NAMES = ['rmse', 'mae', 'ic', 'rank_ic', 'hit_rate']
+
+
+def series(seed, n=200):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2020-01-01', periods=n, freq='h')
+    label = pd.Series(rng.normal(size=n), index=index)
+    return label + 0.5 * rng.normal(size=n), label
+
+
+def test_chunked_updates_match_a_single_update():
+    predictions, label = series(0)
+    whole = MFWindowMetrics(NAMES, label)
+    whole.update(predictions)
+    chunked = MFWindowMetrics(NAMES, label)
+    list(chunked.tap(predictions.iloc[i:i + 30] for i in range(0, len(predictions), 30)))
+    for name, value in whole.result()['values'].items():
+        assert chunked.result()['values'][name] == pytest.approx(value)
+
+
+def test_run_metrics_are_exact_over_windows():
+    run = MFRunMetrics(['rmse', 'ic'])
+    predictions, labels = [], []
+    for seed in range(4):
+        p, l = series(seed, 50 + 10 * seed)
+        window = MFWindowMetrics(['rmse', 'ic'], l)
+        window.update(p)
+        run.add(window.result())
+        predictions.append(p)
+        labels.append(l)
+    y_pred, y_true = pd.concat(predictions).to_numpy(), pd.concat(labels).to_numpy()
+    result = run.result()
+    assert result['windows'] == 4
+    assert result['values']['rmse'] == pytest.approx(np.sqrt(np.mean((y_pred - y_true) ** 2)))
+    assert result['values']['ic'] == pytest.approx(np.corrcoef(y_pred, y_true)[0, 1])
+
+
+def test_empty_window_has_nan_metrics():
+    assert np.isnan(metrics_from_stats(MFWindowMetrics(['rmse'], []).stats, ['rmse'])['rmse'])
+
+
+class StreamingDatasource(SyntheticDatasource):
+    # The label is only available per chunk, reading it whole fails the test
+    @property
+    def label(self):
+        raise AssertionError('the whole label was loaded')
+
+
+class StreamingModel:
+    coef = np.ones(2)
+
+    def predict_stream(self, datasource, chunk_size=None):
+        for chunk in datasource.iter_data(chunk_size=chunk_size):
+            yield pd.DataFrame({'prediction': chunk[datasource.features].to_numpy() @ self.coef}, index=chunk.index)
+
+
+class RecordingSink:
+    def write(self, k, predictions, metadata=None):
+        self.predictions = predictions if isinstance(predictions, pd.DataFrame) else pd.concat(list(predictions))
+        return []
+
+
+def test_streamed_windows_are_scored_chunk_by_chunk(monkeypatch):
+    sink = RecordingSink()
+    monkeypatch.setattr('modelforge.core.runner.get_sink', lambda config: sink)
+    datasource = StreamingDatasource({'n_features': 2, 'rows_per_day': 24})
+    config = {'metrics': ['rmse', 'rank_ic'], 'stream_chunk_size': 16}
+    interval = {'fit': None, 'eval': (pd.Timestamp('2020-01-01'), pd.Timestamp('2020-01-05'))}
+    _, streamed = _predict_window(config, StreamingModel(), datasource, interval, 0, NULL_INSTRUMENT)
+
+    datasource.set_interval(*interval['eval'])
+    label = datasource.get_data()['y']
+    expected = MFWindowMetrics(['rmse', 'rank_ic'], label)
+    expected.update(sink.predictions)
+    assert streamed['stats']['n'] == len(label)
+    for name, value in expected.result()['values'].items():
+        assert streamed['values'][name] == pytest.approx(value)
+
+
+class CountingDatasource(SyntheticDatasource):
+    reads = 0
+
+    def get_data(self, training=False):
+        self.reads += 1
+        return super().get_data(training=training)
+
+
+def test_batch_windows_are_scored_from_the_loaded_frame(monkeypatch):
+    sink = RecordingSink()
+    monkeypatch.setattr('modelforge.core.runner.get_sink', lambda config: sink)
+    datasource = CountingDatasource({'n_features': 2, 'rows_per_day': 24})
+    model = SyntheticModel({})
+    model.coef = np.ones(2)
+    interval = {'fit': None, 'eval': (pd.Timestamp('2020-01-01'), pd.Timestamp('2020-01-05'))}
+    _, scored = _predict_window({'metrics': ['rmse']}, model, datasource, interval, 0, NULL_INSTRUMENT)
+    assert datasource.reads == 1
+    label = datasource.get_data()['y']
+    assert scored['stats']['n'] == len(label)
+    assert scored['values']['rmse'] == pytest.approx(np.sqrt(np.mean((sink.predictions['prediction'] - label) ** 2)))
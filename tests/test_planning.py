@@ -0,0 +1,70 @@
+import pandas as pd
+import pytest
+
+from modelforge.core.planning import plan_from_config, plan_to_intervals, plan_windows, session_counts
+
+
+def dates(values):
+    return list(pd.to_datetime(values))
+
+
+def test_daily_windows():
+    plan = plan_windows('2020-01-01', '2020-01-20', train_period=5, gap_period=1, eval_period=2, recalibration_freq=3)
+    assert list(plan['fit_start']) == dates(['2020-01-01', '2020-01-04', '2020-01-07', '2020-01-10', '2020-01-13'])
+    assert list(plan['eval_start']) == dates(['2020-01-07', '2020-01-10', '2020-01-13', '2020-01-16', '2020-01-19'])
+    # The last window reaches end_date and is cut there
+    assert plan['eval_end'].iloc[-1] == pd.Timestamp('2020-01-20')
+    assert list(plan['eval_length']) == [3, 3, 3, 3, 2]
+
+
+def test_business_day_windows_skip_weekends():
+    plan = plan_windows('2020-01-03', '2020-01-20', 3, 0, 2, 2, calendar='B')
+    assert (plan[['fit_start', 'fit_end', 'eval_start', 'eval_end']].apply(lambda column: column.dt.dayofweek) < 5).all().all()
+    assert list(plan['fit_end']) == dates(['2020-01-08', '2020-01-10', '2020-01-14', '2020-01-16'])
+
+
+def test_holidays_are_not_sessions():
+    plan = plan_windows('2020-01-01', '2020-01-31', 2, 0, 1, 1, calendar='C', holidays=['2020-01-06'])
+    assert pd.Timestamp('2020-01-06') not in set(plan['fit_end']) | set(plan['eval_end'])
+
+
+def test_expanding_windows_keep_the_start():
+    plan = plan_windows('2020-01-01', '2020-01-20', 5, 1, 2, 3, window_type='expanding', truncate_eval=False)
+    assert (plan['fit_start'] == pd.Timestamp('2020-01-01')).all()
+    assert plan['eval_end'].iloc[-1] == pd.Timestamp('2020-01-21')
+
+
+def test_short_eval_windows_are_dropped():
+    plan = plan_windows('2020-01-01', '2020-01-20', 5, 1, 2, 3, min_eval_length=3)
+    assert list(plan['eval_length']) == [3, 3, 3, 3]
+    assert list(plan.index) == [0, 1, 2, 3]
+
+
+def test_invalid_parameters():
+    with pytest.raises(ValueError, match='recalibration_freq'):
+        plan_windows('2020-01-01', '2020-01-20', 5, 1, 2, 0)
+    with pytest.raises(ValueError, match='end_date'):
+        plan_windows('2020-01-20', '2020-01-01', 5, 1, 2, 1)
+    with pytest.raises(ValueError, match='Calendar'):
+        plan_windows('2020-01-01', '2020-01-20', 5, 1, 2, 1, calendar='W')
+
+
+def test_long_plans_are_vectorized():
+    plan = plan_windows('2000-01-01', '2020-01-01', 250, 0, 5, 1, calendar='B')
+    assert len(plan) > 4900
+    assert plan['fit_start'].is_monotonic_increasing and plan['fit_start'].is_unique
+
+
+def test_single_window_config():
+    plan = plan_from_config({'train_mode': 'single_window', 'train_start_date': '2020-01-01', 'train_end_date': '2020-01-10',
+                             'eval_start_date': '2020-01-11', 'eval_end_date': '2020-01-15'})
+    intervals = plan_to_intervals(plan)
+    assert intervals == {0: {'fit': (pd.Timestamp('2020-01-01'), pd.Timestamp('2020-01-10')),
+                             'eval': (pd.Timestamp('2020-01-11'), pd.Timestamp('2020-01-15'))}}
+
+
+def test_eval_length_counts_sessions_like_session_counts():
+    for calendar, holidays in [('D', None), ('B', None), ('C', ['2020-01-06', '2020-01-20'])]:
+        plan = plan_windows('2020-01-01', '2020-02-01', 5, 1, 4, 3, calendar=calendar, holidays=holidays)
+        counts, _ = session_counts(plan, calendar, holidays)
+        assert (plan['eval_length'] == counts['eval_sessions']).all(), calendar
@@ -0,0 +1,92 @@
+import os
+import shutil
+import threading
+import time
+
+import git
+import pytest
+
+from modelforge.core.components import MFDatasource, MFModel
+from modelforge.utils import repo as repo_utils
+from modelforge.utils.registry import read_from_db, register_many, update_db
+
+SYNTHETIC = os.path.join(os.path.dirname(repo_utils.__file__), '..', 'benchmarks', 'synthetic.py')
+
+
+def make_repo(root, name):
+    # A bare "remote" and a pushed clone holding the synthetic components
+    git.Repo.init(os.path.join(root, name), bare=True)
+    clone_dir = os.path.join(root, f'{name}-clone')
+    repo = git.Repo.clone_from(os.path.join(root, name), clone_dir)
+    shutil.copy(SYNTHETIC, os.path.join(clone_dir, 'synthetic.py'))
+    repo.index.add(['synthetic.py'])
+    author = git.Actor('test', 'test@example.com')
+    repo.index.commit('Add synthetic components', author=author, committer=author)
+    repo.git.push('--set-upstream', 'origin', repo.active_branch.name)
+    return os.path.join(clone_dir, 'synthetic.py')
+
+
+def test_register_many_inserts_every_entry(workspace):
+    module_file = os.path.join(workspace['root'], 'clone', 'synthetic.py')
+    entries = [{'name': f'model_{i}', 'file': module_file, 'class_name': 'SyntheticModel'} for i in range(5)]
+    register_many(entries, 'models', MFModel, workspace['database_path'])
+    url, class_name = read_from_db('models', 'model_3', workspace['database_path'])
+    assert class_name == 'SyntheticModel' and url.endswith('/synthetic.py')
+
+
+def test_register_many_rejects_failing_manifests(workspace):
+    module_file = os.path.join(workspace['root'], 'clone', 'synthetic.py')
+    with pytest.raises(ValueError, match='more than once'):
+        register_many([{'name': 'a', 'file': module_file, 'class_name': 'SyntheticModel'}] * 2, 'models', MFModel, workspace['database_path'])
+    with pytest.raises(ValueError, match='not a subclass'):
+        register_many([{'name': 'b', 'file': module_file, 'class_name': 'SyntheticDatasource'}], 'models', MFModel, workspace['database_path'])
+    assert read_from_db('models', 'b', workspace['database_path']) is None
+
+
+def test_updates_stay_in_the_registered_repository(workspace, tmp_path):
+    other_file = make_repo(str(tmp_path), 'other')
+    entry = {'name': 'bench_datasource', 'file': other_file, 'class_name': 'SyntheticDatasource'}
+    before = read_from_db('datasources', 'bench_datasource', workspace['database_path'])
+    with pytest.raises(ValueError, match='does not match the URL'):
+        register_many([entry], 'datasources', MFDatasource, workspace['database_path'], update=True)
+    with pytest.raises(ValueError, match='does not match the URL'):
+        update_db(other_file, 'SyntheticDatasource', 'datasources', 'bench_datasource', MFDatasource, workspace['database_path'])
+    assert read_from_db('datasources', 'bench_datasource', workspace['database_path']) == before
+
+
+def test_update_from_the_same_repository(workspace):
+    module_file = os.path.join(workspace['root'], 'clone', 'synthetic.py')
+    entry = {'name': 'bench_model', 'file': module_file, 'class_name': 'SyntheticModel'}
+    register_many([entry], 'models', MFModel, workspace['database_path'], update=True)
+    update_db(module_file, 'SyntheticModel', 'models', 'bench_model', MFModel, workspace['database_path'])
+
+
+def test_modules_are_executed_in_parallel(tmp_path):
+    files = []
+    for i in range(4):
+        path = tmp_path / f'slow_{i}.py'
+        path.write_text(f'import time\ntime.sleep(0.3)\nfrom modelforge.core.components import MFModel\nclass Slow{i}(MFModel):\n    pass\n')
+        files.append(str(path))
+    threads = [threading.Thread(target=repo_utils.check_class, args=(file, f'Slow{i}', MFModel)) for i, file in enumerate(files)]
+    t0 = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.perf_counter() - t0 < 1.0
+
+
+def test_check_cache_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(repo_utils, 'MAX_CACHED_MODULES', 2)
+    repo_utils.clear_check_cache()
+    files = []
+    for i in range(3):
+        path = tmp_path / f'model_{i}.py'
+        path.write_text(f'from modelforge.core.components import MFModel\nclass Model{i}(MFModel):\n    pass\n')
+        files.append(str(path))
+        repo_utils.check_class(files[-1], f'Model{i}', MFModel)
+    digests = [repo_utils.file_digest(file) for file in files]
+    assert list(repo_utils._MODULES) == digests[1:]
+    assert {key[0] for key in repo_utils._CHECKED_CLASSES} == set(digests[1:])
+    repo_utils.clear_check_cache()
+    assert not repo_utils._MODULES and not repo_utils._CHECKED_CLASSES
@@ -0,0 +1,30 @@
+from modelforge.core.runner import MFRunner
+from modelforge.utils.registry import add_run, get_run_status
+
+
+def test_resume_keeps_the_records_of_skipped_windows(workspace, run_config):
+    config = dict(run_config, run_id='resumed', artifacts=True, metrics=['rmse', 'ic'], instrument=True)
+    add_run('resumed', {'user_config': config}, config['database_path'])
+    MFRunner(config).train()
+    first = {w['k']: w for w in get_run_status('resumed', config['database_path'])['intervals']}
+    assert all(w['artifact'] and w['metrics'] and w['timings'] for w in first.values())
+
+    runner = MFRunner(dict(config, resume=True))
+    runner.train()
+    second = {w['k']: w for w in get_run_status('resumed', config['database_path'])['intervals']}
+    assert runner.pending == []
+    for k, window in second.items():
+        assert window['status'] == 'skipped'
+        for column in ['artifact', 'artifact_path', 'metrics', 'timings', 'duration', 'worker']:
+            assert window[column] == first[k][column]
+    assert runner.metrics['windows'] == len(first)
+
+
+def test_rerun_windows_replace_their_records(workspace, run_config):
+    config = dict(run_config, run_id='rerun', artifacts=True)
+    add_run('rerun', {'user_config': config}, config['database_path'])
+    MFRunner(config).train()
+    MFRunner(dict(config, artifacts=False)).train()
+    for window in get_run_status('rerun', config['database_path'])['intervals']:
+        assert window['status'] == 'completed'
+        assert window['artifact'] is None
@@ -0,0 +1,95 @@
+import os
+
+import pytest
+
+from modelforge.core.scheduler import MFScheduler
+
+def square(x):
+    return x * x
+
+
+def fail_once(key, marker_dir):
+    # Fails on the first attempt of every key, also across processes
+    marker = os.path.join(marker_dir, str(key))
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        raise RuntimeError(f'first attempt of {key}')
+    return key
+
+
+def always_fail(x):
+    raise ValueError('broken')
+
+
+@pytest.mark.parametrize('backend', ['local', 'process'])
+def test_results_are_gathered_by_key(backend):
+    scheduler = MFScheduler(backend=backend, max_workers=2, max_in_flight=3)
+    submitted, completed = [], []
+    results = scheduler.run(square, {k: (k,) for k in range(10)},
+                            on_submit=lambda key, attempt: submitted.append(key),
+                            on_complete=lambda key, record: completed.append(key))
+    assert {k: r['result'] for k, r in results.items()} == {k: k * k for k in range(10)}
+    assert sorted(submitted) == sorted(completed) == list(range(10))
+    for record in results.values():
+        assert record['error'] is None and record['attempts'] == 1 and record['wall_time'] >= 0
+
+
+@pytest.mark.parametrize('backend', ['local', 'process'])
+def test_failed_tasks_are_retried(backend, tmp_path):
+    results = MFScheduler(backend=backend, max_workers=2, retries=1).run(fail_once, {k: (k, str(tmp_path)) for k in range(3)})
+    assert all(r['error'] is None and r['attempts'] == 2 for r in results.values())
+
+
+def test_failures_are_recorded_not_raised():
+    results = MFScheduler(retries=2).run(always_fail, {'a': (1,)})
+    assert results['a']['attempts'] == 3
+    assert 'ValueError: broken' in results['a']['error']
+
+
+def test_dask_backend_needs_a_client():
+    with pytest.raises(ValueError, match='client'):
+        MFScheduler(backend='dask')
+    with pytest.raises(ValueError, match='not supported'):
+        MFScheduler(backend='spark')
+
+
+def test_rolling_windows_run_in_parallel(workspace, run_config):
+    from modelforge.core.runner import MFRunner
+    runner = MFRunner(dict(run_config, scheduler={'backend': 'process', 'max_workers': 2}))
+    runner.train()
+    assert len(runner.intervals) == 4
+    assert all(interval['error'] is None and interval['model'] is not None for interval in runner.intervals.values())
+
+
+@pytest.fixture(scope='module')
+def dask_client():
+    from dask.distributed import Client, LocalCluster
+    with LocalCluster(n_workers=1, threads_per_worker=4, processes=False, dashboard_address=None) as cluster, Client(cluster) as client:
+        yield client
+
+
+def test_dask_backend_caps_tasks_in_flight(dask_client):
+    in_flight, peak = [0], [0]
+
+    def submitted(key, attempt):
+        in_flight[0] += 1
+        peak[0] = max(peak[0], in_flight[0])
+
+    def completed(key, record):
+        in_flight[0] -= 1
+
+    results = MFScheduler(backend='dask', client=dask_client, max_in_flight=2).run(
+        square, {k: (k,) for k in range(8)}, on_submit=submitted, on_complete=completed)
+    assert {k: r['result'] for k, r in results.items()} == {k: k * k for k in range(8)}
+    assert peak[0] == 2 and in_flight[0] == 0
+
+
+def test_dask_backend_retries_failed_tasks(dask_client, tmp_path):
+    attempts = []
+    results = MFScheduler(backend='dask', client=dask_client, retries=1).run(
+        fail_once, {k: (k, str(tmp_path)) for k in range(3)}, on_submit=lambda key, attempt: attempts.append((key, attempt)))
+    assert sorted(attempts) == [(k, attempt) for k in range(3) for attempt in (1, 2)]
+    assert all(r['error'] is None and r['attempts'] == 2 for r in results.values())
+
+    results = MFScheduler(backend='dask', client=dask_client, retries=1).run(always_fail, {'a': (1,)})
+    assert results['a']['attempts'] == 2 and 'ValueError: broken' in results['a']['error']
@@ -0,0 +1,53 @@
+import pytest
+
+from modelforge.core.runner import MFRunner
+from modelforge.core.session import close_clients, get_run_future, submit_run
+from modelforge.utils.registry import add_run, get_run_status
+
+
+@pytest.fixture
+def cluster():
+    from dask.distributed import LocalCluster
+    cluster = LocalCluster(n_workers=1, threads_per_worker=2, processes=False, dashboard_address=None)
+    yield cluster
+    close_clients()
+    cluster.close()
+
+
+def test_configured_cluster_runs_the_windows(workspace, run_config, cluster):
+    config = dict(run_config, dask_scheduler_address=cluster.scheduler_address)
+    del config['scheduler']
+    runner = MFRunner(config)
+    assert runner.backend == 'dask'
+    runner.train()
+    assert runner.client.scheduler.address == cluster.scheduler_address
+    assert all(interval['error'] is None for interval in runner.intervals.values())
+
+
+def test_submitted_run_uses_the_cluster(workspace, run_config, cluster):
+    config = dict(run_config, run_id='submitted')
+    del config['scheduler']
+    add_run('submitted', {'user_config': config}, config['database_path'])
+    job = submit_run(config, cluster.scheduler_address)
+    assert job.startswith('dask:')
+    assert get_run_future('submitted', cluster.scheduler_address).result(timeout=120) == 'submitted'
+    run = get_run_status('submitted', config['database_path'])
+    assert run['status'] == 'completed'
+    assert all(window['status'] == 'completed' for window in run['intervals'])
+    # Every window was its own task on the cluster, not a loop inside the run's task
+    assert 'timed_call' in cluster.scheduler.task_prefixes
+
+
+def test_failed_run_is_resubmitted(workspace, run_config, cluster):
+    config = dict(run_config, run_id='resubmitted')
+    del config['scheduler']
+    add_run('resubmitted', {'user_config': config}, config['database_path'])
+    first = submit_run(dict(config, model='missing_model'), cluster.scheduler_address)
+    with pytest.raises(Exception, match='missing_model'):
+        get_run_future('resubmitted', cluster.scheduler_address).result(timeout=120)
+    assert get_run_status('resubmitted', config['database_path'])['status'] == 'failed'
+
+    second = submit_run(dict(config, resume=True), cluster.scheduler_address)
+    assert second != first
+    assert get_run_future('resubmitted', cluster.scheduler_address).result(timeout=120) == 'resubmitted'
+    assert get_run_status('resubmitted', config['database_path'])['status'] == 'completed'
@@ -0,0 +1,76 @@
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modelforge.core.runner import MFRunner
+from modelforge.core.sinks import ParquetSink, get_sink, read_predictions, read_window_metadata
+
+
+def predictions(k, rows=48):
+    index = pd.date_range('2020-01-01', periods=rows, freq='h', name='date') + pd.Timedelta(days=k)
+    return pd.DataFrame({'prediction': np.arange(rows, dtype=float) + 100 * k}, index=index)
+
+
+def test_windows_are_written_to_their_own_partition(tmp_path):
+    sink = ParquetSink(str(tmp_path), 'run')
+    for k in range(3):
+        sink.write(k, predictions(k), metadata={'fit': None, 'eval': None})
+    data = read_predictions(str(tmp_path), run_id='run')
+    assert len(data) == 3 * 48
+    assert sorted(data['window'].unique()) == [0, 1, 2]
+    assert sorted(read_window_metadata(str(tmp_path), 'run')) == [0, 1, 2]
+
+
+def test_reads_are_filtered(tmp_path):
+    sink = ParquetSink(str(tmp_path), 'run')
+    for k in range(3):
+        sink.write(k, predictions(k), metadata={})
+    ParquetSink(str(tmp_path), 'other').write(0, predictions(0), metadata={})
+    assert len(read_predictions(str(tmp_path), run_id='run', windows=[1])) == 48
+    dated = read_predictions(str(tmp_path), run_id='run', start='2020-01-02', end='2020-01-02 23:00')
+    assert len(dated) == 48 and dated['date'].min() == pd.Timestamp('2020-01-02')
+    assert len(read_predictions(str(tmp_path))) == 4 * 48
+
+
+def test_rewritten_windows_replace_their_partition(tmp_path):
+    sink = ParquetSink(str(tmp_path), 'run')
+    sink.write(0, (predictions(0).iloc[i:i + 10] for i in range(0, 48, 10)), metadata={})
+    sink.write(0, predictions(0, rows=5), metadata={})
+    assert len(read_predictions(str(tmp_path), run_id='run')) == 5
+
+
+def test_dask_reads_numeric_run_ids_as_strings(tmp_path):
+    for run_id in ['123', 'other']:
+        sink = ParquetSink(str(tmp_path), run_id)
+        for k in range(2):
+            sink.write(k, predictions(k), metadata={})
+    data = read_predictions(str(tmp_path), run_id='123', engine='dask')
+    assert data.npartitions == 2
+    data = data.compute()
+    assert list(data['run_id'].unique()) == ['123']
+    assert sorted(data['window'].unique()) == [0, 1]
+    pd.testing.assert_frame_equal(data.reset_index(drop=True), read_predictions(str(tmp_path), run_id='123'))
+    assert len(read_predictions(str(tmp_path), run_id='missing', engine='dask').compute()) == 0
+
+
+def test_missing_pyarrow_is_reported(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+    with pytest.raises(ImportError, match='modelforge\\[parquet\\]'):
+        ParquetSink(str(tmp_path), 'run').write(0, predictions(0), metadata={})
+    with pytest.raises(ImportError, match='needs pyarrow'):
+        read_predictions(str(tmp_path))
+
+
+def test_unknown_sinks_are_rejected(tmp_path):
+    with pytest.raises(ValueError, match='not supported'):
+        get_sink({'output_dir': str(tmp_path), 'prediction_sink': 'csv'})
+
+
+def test_run_with_the_parquet_sink(workspace, run_config):
+    config = dict(run_config, run_id='parquet', prediction_sink='parquet')
+    runner = MFRunner(config)
+    runner.train()
+    data = read_predictions(config['output_dir'], run_id='parquet')
+    assert sorted(data['window'].unique()) == sorted(runner.intervals)
@@ -0,0 +1,27 @@
+import subprocess
+import sys
+
+from modelforge.benchmarks.startup import FORBIDDEN_MODULES, import_times
+
+
+def test_cli_import_loads_no_heavy_dependency():
+    code = ('import sys, modelforge.cli; '
+            f'print(sorted(name for name in {FORBIDDEN_MODULES!r} if name in sys.modules))')
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == '[]'
+
+
+def test_import_times_report_the_module():
+    times = import_times('modelforge.cli')
+    assert times['modelforge.cli'] > 0
+    assert not [name for name in times if name.split('.')[0] in FORBIDDEN_MODULES]
+
+
+def test_help_does_not_import_the_runner():
+    code = ('import sys\n'
+            'from click.testing import CliRunner\n'
+            'from modelforge.cli import modelforge\n'
+            'assert CliRunner().invoke(modelforge, ["--help"]).exit_code == 0\n'
+            'print("modelforge.core.runner" in sys.modules, "pandas" in sys.modules)')
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ['False', 'False']
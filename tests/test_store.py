@@ -0,0 +1,127 @@
+import io
+import os
+import tarfile
+
+import git
+import pytest
+
+from modelforge.utils import store
+
+
+@pytest.fixture
+def repo(tmp_path):
+    repo_dir = tmp_path / 'mfrepo'
+    repo = git.Repo.init(repo_dir)
+    with repo.config_writer() as config:
+        config.set_value('user', 'name', 'test')
+        config.set_value('user', 'email', 'test@example.com')
+    shas = []
+    for i in range(3):
+        (repo_dir / 'module.py').write_text(f'VALUE = {i}\n')
+        repo.index.add(['module.py'])
+        shas.append(repo.index.commit(f'commit {i}').hexsha)
+    yield str(repo_dir), shas
+    for commit_dir in [d for d in store._IN_USE if d.startswith(str(tmp_path))]:
+        store._IN_USE.pop(commit_dir).close()
+
+
+def release(commit_dir):
+    store._IN_USE.pop(commit_dir).close()
+
+
+def test_commits_are_extracted_once(repo, tmp_path):
+    url, shas = repo
+    store_path = str(tmp_path / 'store')
+    commit_dir = store.materialize_commit(url, shas[0], store_path)
+    assert open(os.path.join(commit_dir, 'mfrepo', 'module.py')).read() == 'VALUE = 0\n'
+    assert store.materialize_commit(url, shas[0], store_path) == commit_dir
+
+
+def test_unused_commits_are_evicted(repo, tmp_path):
+    url, shas = repo
+    store_path = str(tmp_path / 'store')
+    first = store.materialize_commit(url, shas[0], store_path, max_commits=1)
+    release(first)
+    second = store.materialize_commit(url, shas[1], store_path, max_commits=1)
+    assert not os.path.exists(first)
+    assert os.path.isdir(second)
+
+
+def test_commits_in_use_are_not_evicted(repo, tmp_path):
+    url, shas = repo
+    store_path = str(tmp_path / 'store')
+    first = store.materialize_commit(url, shas[0], store_path, max_commits=1)
+    store.materialize_commit(url, shas[1], store_path, max_commits=1)
+    assert os.path.isdir(first)
+
+
+def test_no_max_commits_never_evicts(repo, tmp_path):
+    url, shas = repo
+    store_path = str(tmp_path / 'store')
+    commit_dirs = []
+    for sha in shas:
+        commit_dirs.append(store.materialize_commit(url, sha, store_path, max_commits=None))
+        release(commit_dirs[-1])
+    assert all(os.path.isdir(commit_dir) for commit_dir in commit_dirs)
+
+
+def test_failed_extraction_is_retried_then_raised(repo, tmp_path, monkeypatch):
+    url, shas = repo
+    attempts = []
+
+    def broken_extract(*args):
+        attempts.append(args)
+        raise OSError('disk full')
+
+    monkeypatch.setattr(store, '_extract_commit', broken_extract)
+    with pytest.raises(OSError, match='disk full'):
+        store.materialize_commit(url, shas[0], str(tmp_path / 'store'))
+    assert len(attempts) == store.EXTRACT_ATTEMPTS
+
+
+def test_commit_evicted_on_every_attempt(repo, tmp_path, monkeypatch):
+    url, shas = repo
+    monkeypatch.setattr(store, '_hold_commit', lambda commit_dir: None)
+    with pytest.raises(RuntimeError, match='evicted'):
+        store.materialize_commit(url, shas[0], str(tmp_path / 'store'))
+
+
+def test_commits_of_one_repo_are_imported_side_by_side(tmp_path):
+    repo_dir = tmp_path / 'sidebyside'
+    repo = git.Repo.init(repo_dir)
+    with repo.config_writer() as config:
+        config.set_value('user', 'name', 'test')
+        config.set_value('user', 'email', 'test@example.com')
+    (repo_dir / 'model.py').write_text('class Model:\n    def value(self):\n        from . import helper\n        return helper.VALUE\n')
+    shas = []
+    for i in range(2):
+        (repo_dir / 'helper.py').write_text(f'VALUE = {i}\n')
+        repo.index.add(['model.py', 'helper.py'])
+        shas.append(repo.index.commit(f'commit {i}').hexsha)
+    store_path = str(tmp_path / 'store')
+    try:
+        first = store.resolve_class(str(repo_dir), shas[0], 'model.py', 'Model', store_path=store_path)
+        second = store.resolve_class(str(repo_dir), shas[1], 'model.py', 'Model', store_path=store_path)
+        assert first is not second
+        # The lazy imports of each class still find their own commit
+        assert (second().value(), first().value()) == (1, 0)
+    finally:
+        store.clear_class_cache()
+        for commit_dir in [d for d in store._IN_USE if d.startswith(str(tmp_path))]:
+            release(commit_dir)
+
+
+@pytest.mark.parametrize('data_filter', [True, False])
+def test_archive_members_must_stay_inside_the_tree(tmp_path, monkeypatch, data_filter):
+    if not data_filter:
+        monkeypatch.delattr(tarfile, 'data_filter', raising=False)
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as tar:
+        member = tarfile.TarInfo('../escaped.py')
+        member.size = 0
+        tar.addfile(member, io.BytesIO())
+    buffer.seek(0)
+    with tarfile.open(fileobj=buffer) as tar:
+        with pytest.raises(Exception):
+            store._extract_tar(tar, str(tmp_path / 'tree'))
+    assert not (tmp_path / 'escaped.py').exists()
@@ -0,0 +1,91 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from modelforge.benchmarks.synthetic import SyntheticDatasource, SyntheticModel
+from modelforge.core.instrument import NULL_INSTRUMENT
+from modelforge.core.runner import MFRunner, _predict_window
+from modelforge.core.sinks import HDFSink
+
+
+def test_default_iter_data_slices_the_interval():
+    datasource = SyntheticDatasource({'n_features': 2, 'rows_per_day': 10})
+    datasource.set_interval('2020-01-01', '2020-01-03')
+    chunks = list(datasource.iter_data(chunk_size=7))
+    assert max(len(chunk) for chunk in chunks) == 7
+    pd.testing.assert_frame_equal(pd.concat(chunks), datasource.get_data())
+    datasource.chunk_size = 12
+    assert len(next(datasource.iter_data())) == 12
+    datasource.chunk_size = None
+    assert len(list(datasource.iter_data())) == 1
+
+
+def test_hdf_sink_appends_chunks(tmp_path):
+    os.makedirs(tmp_path / 'eval_0')
+    frame = pd.DataFrame({'prediction': np.arange(100.0)}, index=pd.date_range('2020-01-01', periods=100, freq='h'))
+    paths = HDFSink(str(tmp_path)).write(0, (frame.iloc[i:i + 30] for i in range(0, 100, 30)), metadata={})
+    pd.testing.assert_frame_equal(pd.read_hdf(paths[0]), frame, check_freq=False)
+
+
+def test_streamed_run_writes_the_same_predictions(workspace, run_config):
+    batch = dict(run_config, output_dir=run_config['output_dir'] + '-batch')
+    streamed = dict(run_config, output_dir=run_config['output_dir'] + '-streamed', stream_chunk_size=5)
+    MFRunner(batch).train()
+    runner = MFRunner(streamed)
+    runner.train()
+    for k in runner.intervals:
+        expected = pd.read_hdf(os.path.join(batch['output_dir'], f'eval_{k}', 'pred.h5'))
+        written = pd.read_hdf(os.path.join(streamed['output_dir'], f'eval_{k}', 'pred.h5'))
+        pd.testing.assert_frame_equal(written, expected, check_freq=False)
+
+
+class IncrementalDatasource(SyntheticDatasource):
+    # Streams the eval interval day by day and refuses to load it whole
+    def get_data(self, training=False):
+        if not training and not getattr(self, 'streaming', False):
+            raise AssertionError('the eval interval was loaded whole')
+        return super().get_data(training=training)
+
+    def iter_data(self, training=False, chunk_size=None):
+        start, end = self.interval
+        self.streaming = True
+        try:
+            for day in pd.date_range(pd.Timestamp(start).normalize(), end, freq='D'):
+                self.interval = (max(day, pd.Timestamp(start)), min(day + pd.Timedelta(days=1) - pd.Timedelta(seconds=1), pd.Timestamp(end)))
+                yield self.get_data(training=training)
+        finally:
+            self.interval, self.streaming = (start, end), False
+
+
+class StreamingModel(SyntheticModel):
+    def predict_stream(self, datasource, chunk_size=None):
+        for chunk in datasource.iter_data(chunk_size=chunk_size):
+            yield pd.DataFrame({'prediction': chunk[datasource.features].to_numpy() @ self.coef}, index=chunk.index)
+
+
+def test_hdf_sink_writes_an_empty_stream(tmp_path):
+    os.makedirs(tmp_path / 'eval_0')
+    paths = HDFSink(str(tmp_path)).write(0, iter([]), metadata={})
+    assert pd.read_hdf(paths[0]).empty
+
+
+def test_models_predict_chunk_by_chunk(tmp_path):
+    params = {'n_features': 2, 'rows_per_day': 10}
+    interval = {'fit': (pd.Timestamp('2020-01-01'), pd.Timestamp('2020-01-10')),
+                'eval': (pd.Timestamp('2020-01-11'), pd.Timestamp('2020-01-14'))}
+    plain = SyntheticDatasource(params)
+    plain.set_interval(*interval['eval'])
+    for model_class in [SyntheticModel, StreamingModel]:
+        output_dir = str(tmp_path / model_class.__name__)
+        config = {'output_dir': output_dir, 'stream_chunk_size': 10, 'metrics': ['rmse']}
+        os.makedirs(os.path.join(output_dir, 'eval_0'))
+        datasource = IncrementalDatasource(params)
+        datasource.set_interval(*interval['fit'])
+        model = model_class({})
+        model.train(datasource)
+
+        written, metrics = _predict_window(config, model, datasource, interval, 0, NULL_INSTRUMENT)
+        predictions = pd.read_hdf(written[0])
+        pd.testing.assert_frame_equal(predictions, model.predict_batch(plain), check_freq=False)
+        assert metrics['stats']['n'] == len(plain.get_data())
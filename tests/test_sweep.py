@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+from modelforge.core.runner import MFRunner, sweep_output_dir
+from modelforge.core.sweep import combo_fingerprint, expand_sweep
+from modelforge.utils.registry import add_run, get_sweep_results
+
+
+def test_grid_sweep_overrides_model_params():
+    param_sets = expand_sweep({'alpha': 0.5, 'loss': 'l2'}, {'params': {'alpha': [0.1, 1.0], 'depth': [3, 5]}})
+    assert param_sets == [{'alpha': 0.1, 'loss': 'l2', 'depth': 3}, {'alpha': 0.1, 'loss': 'l2', 'depth': 5},
+                          {'alpha': 1.0, 'loss': 'l2', 'depth': 3}, {'alpha': 1.0, 'loss': 'l2', 'depth': 5}]
+
+
+def test_random_sweep_is_seeded_and_in_range():
+    sweep = {'method': 'random', 'n_iter': 20, 'seed': 3,
+             'params': {'alpha': {'distribution': 'loguniform', 'low': 1e-3, 'high': 1.0},
+                        'depth': {'distribution': 'int', 'low': 2, 'high': 8}, 'loss': ['l1', 'l2']}}
+    param_sets = expand_sweep({}, sweep)
+    assert param_sets == expand_sweep({}, sweep)
+    assert len(param_sets) == 20
+    for params in param_sets:
+        assert 1e-3 <= params['alpha'] <= 1.0
+        assert params['depth'] in range(2, 9)
+        assert params['loss'] in ['l1', 'l2']
+
+
+@pytest.mark.parametrize('sweep, message', [
+    ({'params': {}}, 'no "params"'),
+    ({'params': {'alpha': 0.1}}, 'must be a list'),
+    ({'method': 'bayes', 'params': {'alpha': [0.1]}}, 'not supported'),
+    ({'method': 'random', 'params': {'alpha': {'distribution': 'beta', 'low': 0, 'high': 1}}}, 'Unknown distribution'),
+])
+def test_invalid_sweeps(sweep, message):
+    with pytest.raises(ValueError, match=message):
+        expand_sweep({}, sweep)
+
+
+def test_combo_fingerprint_depends_on_window_and_params():
+    fingerprint = combo_fingerprint('window', {'alpha': 0.1})
+    assert fingerprint == combo_fingerprint('window', {'alpha': 0.1})
+    assert fingerprint != combo_fingerprint('window', {'alpha': 1.0})
+    assert fingerprint != combo_fingerprint('other', {'alpha': 0.1})
+
+
+def test_sweep_run_records_every_combo_and_window(workspace, run_config):
+    config = dict(run_config, run_id='swept', metrics=['rmse'], sweep={'params': {'scale': [1, 2, 3]}, 'batch_size': 2})
+    add_run('swept', {'user_config': config}, config['database_path'])
+    runner = MFRunner(config)
+    runner.train()
+    windows = list(runner.intervals)
+    assert all(interval['error'] is None for interval in runner.intervals.values())
+
+    results = get_sweep_results('swept', config['database_path'])
+    assert [(r['combo'], r['k']) for r in results] == [(i, k) for i in range(3) for k in sorted(windows)]
+    for result in results:
+        assert result['status'] == 'completed'
+        assert result['params']['scale'] == result['combo'] + 1
+        assert set(result['metrics']['values']) == {'rmse'}
+        assert result['output_path'] == sweep_output_dir(config, result['combo'])
+        assert os.path.isdir(os.path.join(result['output_path'], f'eval_{result["k"]}'))
@@ -0,0 +1,91 @@
+import os
+
+import pandas as pd
+
+from modelforge.benchmarks.synthetic import SyntheticDatasource, SyntheticModel
+from modelforge.core.planning import plan_from_config, plan_to_intervals
+from modelforge.core.manifest import MANIFEST_FILE
+from modelforge.core.runner import MFRunner, train_chain
+
+
+class WarmModel(SyntheticModel):
+    supports_warm_start = True
+
+    def train_from(self, previous, datasource, new_interval):
+        self.train(datasource)
+        self.previous = previous
+        self.new_interval = new_interval
+
+
+def test_chain_warm_starts_each_window_from_the_previous(run_config):
+    intervals = plan_to_intervals(plan_from_config(run_config))
+    windows = sorted(intervals.items())
+    results = train_chain(run_config, SyntheticDatasource, WarmModel, windows)
+    assert list(results) == [k for k, _ in windows]
+    assert all(results[k]['error'] is None and results[k]['attempts'] == 1 for k, _ in windows)
+    models = [results[k]['result']['model'] for k, _ in windows]
+    assert not hasattr(models[0], 'previous')
+    for (k, interval), model, previous in zip(windows[1:], models[1:], models):
+        assert model.previous is previous
+        # Only the sessions after the previous fit are new
+        assert model.new_interval == (windows[k - 1][1]['fit'][1] + pd.Timedelta(days=1), interval['fit'][1])
+
+
+def test_models_without_warm_start_train_from_scratch(workspace, run_config, capsys):
+    runner = MFRunner(dict(run_config, warm_start={'chain_length': 2}))
+    runner.train()
+    assert 'does not support warm starts' in capsys.readouterr().out
+    assert all(interval['error'] is None for interval in runner.intervals.values())
+
+
+def test_chains_split_by_chain_length(run_config):
+    runner = MFRunner(dict(run_config, warm_start={'chain_length': 3}))
+    runner.pending = list(range(7))
+    assert runner._chains() == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+class FailingModel(WarmModel):
+    # Fails to warm start the window whose fit ends at fail_at, the first fail_times times
+    fail_times = 1
+    failures = 0
+
+    def train_from(self, previous, datasource, new_interval):
+        if self.params.get('fail_at') == new_interval[1] and FailingModel.failures < self.fail_times:
+            FailingModel.failures += 1
+            raise RuntimeError('broken window')
+        super().train_from(previous, datasource, new_interval)
+
+
+def chain_windows(config):
+    intervals = plan_to_intervals(plan_from_config(config))
+    return [(k, dict(interval, fingerprint=f'window {k}')) for k, interval in sorted(intervals.items())]
+
+
+def test_failed_window_stops_its_chain(run_config, monkeypatch):
+    monkeypatch.setattr(FailingModel, 'fail_times', 10)
+    monkeypatch.setattr(FailingModel, 'failures', 0)
+    windows = chain_windows(run_config)
+    config = dict(run_config, warm_start=True, model_params=dict(run_config['model_params'], fail_at=windows[2][1]['fit'][1]))
+    results = train_chain(config, SyntheticDatasource, FailingModel, windows)
+    assert list(results) == [0, 1, 2]
+    assert 'broken window' in results[2]['error']
+    for k in [0, 1]:
+        assert results[k]['error'] is None
+        assert os.path.isfile(os.path.join(config['output_dir'], f'eval_{k}', MANIFEST_FILE))
+
+    runner = MFRunner(config)
+    runner.pending = [k for k, _ in windows]
+    runner.run_id = runner.run_metrics = None
+    runner._on_chain_complete(0, {'result': results, 'start_time': None, 'end_time': 0.0, 'wall_time': 1.0,
+                                  'worker': 'test', 'attempts': 1, 'error': None})
+    assert [runner.intervals[k]['error'] is None for k in runner.pending] == [True, True, False, False]
+    assert 'window 2 of its warm-start chain failed' in runner.intervals[3]['error']
+
+
+def test_failed_window_is_retried_within_its_chain(run_config, monkeypatch):
+    monkeypatch.setattr(FailingModel, 'failures', 0)
+    windows = chain_windows(run_config)
+    config = dict(run_config, scheduler={'retries': 1}, model_params=dict(run_config['model_params'], fail_at=windows[2][1]['fit'][1]))
+    results = train_chain(config, SyntheticDatasource, FailingModel, windows)
+    assert [results[k]['attempts'] for k, _ in windows] == [1, 1, 2, 1]
+    assert all(result['error'] is None for result in results.values())